@@ -0,0 +1,86 @@
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+
+from doimgr import __version__
+from benchmarks.server import CrossrefServer
+from benchmarks.runner import BenchmarkRunner
+
+def compare(results, baseline):
+    """
+    Prints the change of throughput and p95 latency compared to the results
+    of a previous benchmark run.
+
+    """
+    previous = {(r['scenario'], r['size'], r['workers']): r for r in
+            baseline['results']}
+    print("Compared to doimgr {}:".format(baseline.get('doimgr', 'unknown')))
+    for r in results:
+        old = previous.get((r['scenario'], r['size'], r['workers']))
+        if old is None or not old['throughput'] or not r['throughput']:
+            continue
+        change = (r['throughput'] / old['throughput'] - 1) * 100
+        line = "{:10} size {:5d} workers {:3d}: throughput {:+7.1f}%".format(
+                r['scenario'], r['size'], r['workers'], change)
+        if old['latency_ms']['p95'] and r['latency_ms']['p95']:
+            line += ", p95 latency {:+7.1f}%".format(
+                (r['latency_ms']['p95'] / old['latency_ms']['p95'] - 1) * 100)
+        print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="""Benchmarks doimgr against
+a local stand-in for the Crossref API.""")
+    parser.add_argument('-s', '--scenarios', nargs='+',
+        choices=BenchmarkRunner.SCENARIOS,
+        default=list(BenchmarkRunner.SCENARIOS),
+        help='scenarios to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100],
+        help='number of operations per scenario')
+    parser.add_argument('-w', '--workers', type=int, nargs='+',
+        default=[1, 4], help='numbers of parallel workers')
+    parser.add_argument('--latency', type=float, default=0.01,
+        help='latency of the server per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+        help='fraction of requests answered with code 503')
+    parser.add_argument('--file-size', type=int, default=64,
+        help='size of the downloaded files in KiB')
+    parser.add_argument('-o', '--output', type=str, default=None,
+        help='write the results as JSON to this file')
+    parser.add_argument('--compare', type=argparse.FileType('r'),
+        help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    results = []
+    with CrossrefServer(latency=args.latency, error_rate=args.error_rate,
+            file_size=args.file_size * 1024) as server:
+        runner = BenchmarkRunner(server, retry_delay=0.01)
+        for scenario in args.scenarios:
+            for size in args.sizes:
+                for workers in args.workers:
+                    r = runner.run(scenario, size, workers)
+                    results.append(r)
+                    print("{:10} size {:5d} workers {:3d}: {:8.1f} ops/s, \
+p50 {:7.1f} ms, p95 {:7.1f} ms, p99 {:7.1f} ms, {:d} errors".format(
+                        scenario, size, workers, r['throughput'],
+                        r['latency_ms']['p50'] or 0,
+                        r['latency_ms']['p95'] or 0,
+                        r['latency_ms']['p99'] or 0, r['errors']))
+
+    report = {
+        'doimgr'   : __version__,
+        'python'   : platform.python_version(),
+        'created'  : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings' : {'latency': args.latency, 'error_rate': args.error_rate,
+            'file_size': args.file_size * 1024},
+        'results'  : results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        compare(results, json.load(args.compare))
@@ -0,0 +1,183 @@
+import os
+import sys
+import io
+import time
+import shutil
+import tempfile
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.search.request import Request
+from lib.search.asyncrequest import AsyncRequest
+from lib.asynctransport import AsyncTransport
+from lib.downloader import Downloader
+from lib.bulkconverter import BulkConverter
+from lib.bulkdownloader import BulkDownloader
+from lib.transport import Transport
+from lib.ratelimiter import RateLimiter
+from lib.retry import RetryPolicy
+from lib.helper import Helper
+
+class TimedRequest(Request):
+    """
+    Request which records the latency of every API request.
+
+    """
+    def __init__(self, address, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.URL_API_BASE = address
+        self.URL_SERVICE_DOIS = "{}/works".format(address)
+        self.latencies = []
+
+    def _request(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super()._request(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+class TimedAsyncRequest(AsyncRequest):
+    """
+    AsyncRequest which records the latency of every API request.
+
+    """
+    def __init__(self, address, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.URL_API_BASE = address
+        self.URL_SERVICE_DOIS = "{}/works".format(address)
+        self.latencies = []
+
+    async def _request(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super()._request(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+class TimedDownloader(Downloader):
+    """
+    Downloader which records the latency of every download.
+
+    """
+    latencies = []
+
+    def download(self, url, path, fallback_filename):
+        start = time.perf_counter()
+        try:
+            return super().download(url, path, fallback_filename)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+class BenchmarkRunner(object):
+    """
+    Runs the benchmark scenarios against a `CrossrefServer`. Every scenario
+    performs `size` operations with `workers` threads:
+
+    - search: independent searches of one page each
+    - cite: citations requested from the transform service
+    - cite-async: all citations requested at once from a single event loop
+      using `workers` connections
+    - bulk: a bulk conversion of a list of DOIs
+    - download: a bulk download of the full texts of a list of DOIs
+
+    """
+    SCENARIOS = ('search', 'cite', 'cite-async', 'bulk', 'download')
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, server, retry_delay=RetryPolicy.BASE_DELAY):
+        self.server = server
+        self.retry_delay = retry_delay
+
+    def run(self, scenario, size, workers):
+        """
+        @return: (dict) throughput, latency percentiles in milliseconds and
+            error counts of the scenario
+
+        """
+        if scenario not in self.SCENARIOS:
+            raise ValueError("Scenario {} is unknown. Valid scenarios are \
+{}".format(scenario, ", ".join(self.SCENARIOS)))
+
+        # every run starts with fresh connections and statistics
+        Transport.configure(cache=None)
+        RateLimiter.configure(limit=self.server.rate_limit)
+        retry = RetryPolicy.configure(base_delay=self.retry_delay)
+        requests_before = self.server.get_requests()
+        dois = ['10.5555/bench.{}.{:d}'.format(scenario, i) for i in
+                range(size)]
+
+        start = time.perf_counter()
+        latencies, errors = getattr(self, '_run_{}'.format(
+            scenario.replace('-', '_')))(dois, workers)
+        seconds = time.perf_counter() - start
+
+        result = {
+            'scenario'   : scenario,
+            'size'       : size,
+            'workers'    : workers,
+            'seconds'    : seconds,
+            'throughput' : size / seconds if seconds > 0 else None,
+            'errors'     : errors,
+            'requests'   : self.server.get_requests() - requests_before,
+            'retries'    : retry.get_stats()['retries'],
+            'latency_ms' : {},
+        }
+        for p in self.PERCENTILES:
+            value = Helper.percentile(latencies, p)
+            result['latency_ms']['p{:d}'.format(p)] = value * 1000 if \
+                    value is not None else None
+        return result
+
+    def _make_request(self):
+        return TimedRequest(self.server.get_address())
+
+    def _map(self, func, entries, workers):
+        errors = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(func, entry) for entry in entries]
+            for future in futures:
+                if future.exception() is not None:
+                    errors += 1
+        return errors
+
+    def _run_search(self, dois, workers):
+        req = self._make_request()
+        query = req.prepare_search_query("benchmark", rows=20)
+        errors = self._map(lambda doi: list(req.search_pages(query,
+            max_results=20)), dois, workers)
+        return req.latencies, errors
+
+    def _run_cite(self, dois, workers):
+        req = self._make_request()
+        errors = self._map(lambda doi: req.citation(
+            req.prepare_citation_query(doi), style='apa'), dois, workers)
+        return req.latencies, errors
+
+    def _run_cite_async(self, dois, workers):
+        async def run():
+            async with TimedAsyncRequest(self.server.get_address(),
+                    transport=AsyncTransport(max_connections=workers)) as req:
+                results = await asyncio.gather(*(req.citation(
+                    req.prepare_citation_query(doi), style='apa') for doi in
+                    dois), return_exceptions=True)
+            errors = sum(1 for r in results if isinstance(r, Exception))
+            return req.latencies, errors
+        return asyncio.run(run())
+
+    def _run_bulk(self, dois, workers):
+        req = self._make_request()
+        b = BulkConverter(req)
+        b.run(io.StringIO("\n".join(dois)), io.StringIO(), 'apa',
+                workers=workers)
+        return req.latencies, len(b.get_failed())
+
+    def _run_download(self, dois, workers):
+        destination = tempfile.mkdtemp()
+        TimedDownloader.latencies = []
+        try:
+            b = BulkDownloader(self._make_request(), TimedDownloader())
+            b.run(io.StringIO("\n".join(dois)), destination, workers=workers,
+                    per_host=workers)
+        finally:
+            shutil.rmtree(destination)
+        return TimedDownloader.latencies, len(b.get_failed())
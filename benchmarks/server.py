@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class CrossrefHandler(BaseHTTPRequestHandler):
+    """
+    Answers requests like the `api.crossref.org` endpoints used by doimgr:
+    `/works` (search, DOI filters and deep paging), `/works/{doi}`,
+    `/works/{doi}/transform`, `/types` and `/styles`. Full texts linked by
+    the works are served below `/files/`.
+
+    """
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, which would otherwise be
+    # delayed by the interplay of Nagle's algorithm and delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        server.count_request()
+        if server.latency > 0:
+            time.sleep(server.latency)
+        if server.inject_error():
+            self._send_json(503, {'status': 'error'})
+            return
+
+        parts = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(parts.path)
+        params = urllib.parse.parse_qs(parts.query)
+        if path == '/works':
+            self._send_message(server.search(params))
+        elif path.startswith('/works/') and path.endswith('/transform'):
+            doi = path[len('/works/'):-len('/transform')]
+            self._send(200, 'text/plain', server.citation(doi,
+                self.headers.get('Accept', '')))
+        elif path.startswith('/works/'):
+            self._send_message(server.work(path[len('/works/'):]))
+        elif path == '/types':
+            self._send_message({'items': [{'id': t} for t in server.TYPES]})
+        elif path == '/styles':
+            self._send_message({'items': list(server.STYLES)})
+        elif path.startswith('/files/'):
+            self._send(200, 'application/pdf', server.file_content)
+        else:
+            self._send_json(404, {'status': 'error'})
+
+    def _send_message(self, message):
+        self._send_json(200, {'status': 'ok', 'message': message})
+
+    def _send_json(self, status, content):
+        self._send(status, 'application/json', json.dumps(content))
+
+    def _send(self, status, content_type, body):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Rate-Limit-Limit', str(self.server.rate_limit))
+        self.send_header('X-Rate-Limit-Interval', '1s')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class CrossrefServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Crossref API with configurable latency (seconds
+    per request) and error injection (fraction of requests answered with
+    code 503). Works are generated from their DOI, so every DOI exists.
+
+    """
+    daemon_threads = True
+
+    TYPES  = ('book', 'book-chapter', 'journal-article', 'proceedings-article')
+    STYLES = ('apa', 'bibtex', 'harvard1', 'ieee', 'chicago-author-date')
+
+    TOTAL_RESULTS = 10000
+    RATE_LIMIT    = 100000
+
+    def __init__(self, latency=0.0, error_rate=0.0, file_size=64 * 1024,
+            rate_limit=RATE_LIMIT, seed=0):
+        super().__init__(('127.0.0.1', 0), CrossrefHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.file_content = bytes(range(256)) * (file_size // 256)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.thread = None
+
+    def get_address(self):
+        return "127.0.0.1:{:d}".format(self.server_port)
+
+    def get_requests(self):
+        return self.requests
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def inject_error(self):
+        if self.error_rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def work(self, doi):
+        number = sum(ord(c) for c in doi)
+        return {
+            'DOI': doi,
+            'URL': 'http://dx.doi.org/{}'.format(doi),
+            'title': ['Benchmark work {}'.format(doi)],
+            'author': [{'given': 'Ada', 'family': 'Lovelace'},
+                {'given': 'Charles', 'family': 'Babbage'}],
+            'issued': {'date-parts': [[1900 + number % 120]]},
+            'type': self.TYPES[number % len(self.TYPES)],
+            'publisher': 'Benchmark Press',
+            'container-title': ['Journal of Benchmarks'],
+            'volume': str(number % 50),
+            'issue': str(number % 12),
+            'page': '{:d}-{:d}'.format(number % 100, number % 100 + 10),
+            'score': 1.0,
+            'link': [{'URL': 'http://{}/files/{}.pdf'.format(
+                self.get_address(), doi), 'content-version': 'vor'}],
+        }
+
+    def search(self, params):
+        message = self._search(params)
+        if 'facet' in params:
+            message['facets'] = self.facets(params)
+        if 'select' in params:
+            fields = params['select'][0].split(',')
+            message['items'] = [{key: item[key] for key in fields if key in
+                item} for item in message['items']]
+        return message
+
+    def facets(self, params):
+        # every result is counted, the limits of the facets are ignored
+        names = [facet.partition(':')[0] for facet in
+                params['facet'][0].split(',')]
+        facets = {name: {} for name in names}
+        for i in range(self.TOTAL_RESULTS):
+            work = self.work('10.5555/bench.{:d}'.format(i))
+            values = {
+                'published'      : str(work['issued']['date-parts'][0][0]),
+                'type-name'      : work['type'],
+                'publisher-name' : work['publisher'],
+            }
+            for name in names:
+                counts = facets[name]
+                counts[values[name]] = counts.get(values[name], 0) + 1
+        return {name: {'value-count': len(counts), 'values': counts} for
+                name, counts in facets.items()}
+
+    def _search(self, params):
+        rows = int(params.get('rows', ['20'])[0])
+        filters = ','.join(params.get('filter', []))
+        dois = [f[len('doi:'):] for f in filters.split(',') if
+                f.startswith('doi:')]
+        if len(dois) > 0:
+            items = [self.work(doi) for doi in dois]
+            return {'total-results': len(items), 'items': items}
+
+        offset = 0
+        cursor = params.get('cursor', [None])[0]
+        if cursor not in (None, '*'):
+            offset = int(cursor)
+        items = [self.work('10.5555/bench.{:d}'.format(i)) for i in
+                range(offset, min(offset + rows, self.TOTAL_RESULTS))]
+        message = {'total-results': self.TOTAL_RESULTS, 'items': items}
+        if cursor is not None:
+            message['next-cursor'] = str(offset + len(items))
+        return message
+
+    def citation(self, doi, accept):
+        style = accept.rpartition('style=')[2] or 'bibtex'
+        work = self.work(doi)
+        return " Lovelace, A., & Babbage, C. ({}). {}. {} ({})\n".format(
+            work['issued']['date-parts'][0][0], work['title'][0], doi, style)
@@ -5,29 +5,249 @@
 # THIS SOFTWARE IS RELEASED UNDER THE MIT LICENSE.
 # FOR MORE INFORMATION SEE THE LINCENSE FILE.
 # -----------------------------------------------------------------------------
+import time
+STARTUP_TIMES = [('start', time.perf_counter())]
+
 import os
 import sys
 import argparse
 import logging
 import configparser
 
-from lib.search.request import Request
-from lib.downloader import Downloader
-from lib.api import API
-from lib.clipboard import Clipboard
-from lib.bulkconverter import BulkConverter
+# Modules of the subcommands are imported when the subcommand runs, since
+# loading the HTTP stack and the API data is not necessary for every call.
 
 # MAIN VERSION OF THIS PROGRAM
 __version_info__ = (0, 1, 2)
 __version__      = '.'.join(map(str, __version_info__))
 
-api = API()
+class LibraryValues(object):
+    """
+    Values defined by the library, e.g. the render modes of requests, to be
+    used as choices of arguments. They are loaded on first use, so building
+    the parser does not import the library.
+
+    """
+    def __init__(self, load):
+        self.load = load
+        self.values = None
+
+    def get_values(self):
+        if self.values is None:
+            self.values = tuple(self.load())
+        return self.values
+
+    def __contains__(self, value):
+        return value in self.get_values()
+
+    def __iter__(self):
+        return iter(self.get_values())
+
+    def __str__(self):
+        return ", ".join(self.get_values())
+
+def load_render_modes():
+    from lib.search.request import Request
+    return (Request.RENDER_LOCAL, Request.RENDER_REMOTE)
+
+def load_search_formats():
+    from lib.output import FORMATS
+    return ('text',) + tuple(FORMATS)
+
+def load_bulk_formats():
+    from lib.bulkconverter import BulkConverter
+    return BulkConverter.FORMATS
+
+def load_local_styles():
+    from lib.renderer import Renderer
+    return Renderer.STYLES
+
+def add_library_argument(parser, *args, choices, help_values=None, **kwargs):
+    """
+    Adds an argument, whose `choices` are LibraryValues. argparse formats the
+    choices when an argument is added, so they are set afterwards to not load
+    the library. The help can refer to further LibraryValues `help_values` by
+    their names, e.g. `%(local_styles)s`.
+
+    @return: (argparse.Action) the added argument
+
+    """
+    action = parser.add_argument(*args, **kwargs)
+    action.choices = choices
+    for name, values in (help_values or {}).items():
+        setattr(action, name, values)
+    return action
+
+RENDER_MODES   = LibraryValues(load_render_modes)
+SEARCH_FORMATS = LibraryValues(load_search_formats)
+BULK_FORMATS   = LibraryValues(load_bulk_formats)
+LOCAL_STYLES   = LibraryValues(load_local_styles)
+
+def mark_startup(phase):
+    """
+    Records the point in time, at which the given startup phase has finished.
+
+    """
+    STARTUP_TIMES.append((phase, time.perf_counter()))
+
+def print_startup_profile():
+    sys.stderr.write("Startup profile:\n")
+    for (_, start), (phase, end) in zip(STARTUP_TIMES, STARTUP_TIMES[1:]):
+        sys.stderr.write("  {:24} {:8.2f} ms\n".format(phase,
+            (end - start) * 1000))
+    sys.stderr.write("  {:24} {:8.2f} ms\n".format('total',
+        (STARTUP_TIMES[-1][1] - STARTUP_TIMES[0][1]) * 1000))
+
+def validate_style(api, parser, style):
+    """
+    Checks if the given style is valid. This is not done via argparse directly
+    due to the amount of possible parameters.
+
+    """
+    styles = api.get_valid_styles()
+    if style not in styles:
+        parser.error(styles.get_invalid_message(style, 'style'))
+
+def get_citation_cache(config):
+    """
+    Creates the citation cache as configured in the `cache` section of the
+    config file.
+
+    @return: (CitationCache) cache or None if caching is disabled
+
+    """
+    from lib.cache import CitationCache
+
+    if not config.getboolean('cache', 'enabled', fallback=True):
+        return None
+    return CitationCache(
+        path=config.get('cache', 'path', fallback=CitationCache.DEFAULT_PATH),
+        ttl=config.getint('cache', 'ttl-days',
+            fallback=CitationCache.DEFAULT_TTL // 86400) * 86400,
+        max_size=config.getint('cache', 'max-size-mb',
+            fallback=CitationCache.DEFAULT_MAX_SIZE // 1024**2) * 1024**2)
+
+def get_work_index(config):
+    """
+    Creates the local work index as configured in the `index` section of the
+    config file.
+
+    @return: (WorkIndex) index or None if indexing is disabled
+
+    """
+    from lib.index import WorkIndex
+
+    if not config.getboolean('index', 'enabled', fallback=True):
+        return None
+    return WorkIndex(path=config.get('index', 'path',
+        fallback=WorkIndex.DEFAULT_PATH))
+
+def get_index_lookups(config):
+    """
+    Works in the index do not expire, so metadata is only looked up in it
+    if this is enabled in the `index` section of the config file.
+
+    @return: (bool) True if the metadata of DOIs is looked up in the index
+
+    """
+    return config.getboolean('index', 'lookups', fallback=False)
+
+def configure_network(config):
+    """
+    Configures the timeouts and the retry policy of all requests as given in
+    the `network` section of the config file.
+
+    """
+    from lib.transport import Transport
+    from lib.retry import RetryPolicy, CircuitBreaker
+
+    Transport.configure(timeout=config.getfloat('network', 'timeout',
+        fallback=Transport.TIMEOUT))
+    RetryPolicy.configure(
+        max_attempts=config.getint('network', 'max-attempts',
+            fallback=RetryPolicy.MAX_ATTEMPTS),
+        base_delay=config.getfloat('network', 'backoff-base',
+            fallback=RetryPolicy.BASE_DELAY),
+        max_delay=config.getfloat('network', 'backoff-max',
+            fallback=RetryPolicy.MAX_DELAY),
+        breaker=CircuitBreaker(
+            threshold=config.getint('network', 'breaker-threshold',
+                fallback=CircuitBreaker.FAILURE_THRESHOLD),
+            pause=config.getfloat('network', 'breaker-pause',
+                fallback=CircuitBreaker.PAUSE)))
+
+def get_search_fields(config, args):
+    """
+    Determines the fields of the works, which are shown by a search with the
+    given arguments, so only these are requested from the API. If the work
+    index is enabled, the fields it needs are requested as well, so the
+    results can be found with `--offline` later on.
+
+    @return: (list) fields of the work JSON or None, if complete records are
+        requested
+
+    """
+    if not config.getboolean('search', 'select', fallback=True):
+        return None
+    from lib.search.result import SearchResult
+
+    if args.format != 'text':
+        from lib.output import SearchResultWriter
+        names = SearchResultWriter.FIELDS
+    else:
+        names = ['doi', 'score', 'year', 'title']
+        shown = [('authors', args.show_authors), ('type', args.show_type),
+                ('publisher', args.show_publisher), ('url', args.show_url)]
+        names.extend(name for name, show in shown if show)
+    fields = SearchResult.get_api_fields(names)
+    if config.getboolean('index', 'enabled', fallback=True):
+        from lib.index import WorkIndex
+        fields = sorted(set(fields).union(WorkIndex.FIELDS))
+    return fields
+
+def get_daemon(config, args):
+    """
+    @return: (DaemonClient) client of the running daemon or None, if no daemon
+        is running or its use is disabled
+
+    """
+    if args.no_daemon or not config.getboolean('daemon', 'enabled',
+            fallback=True):
+        return None
+    from lib.daemonclient import DaemonClient
+    return DaemonClient.find(config.get('daemon', 'address-file',
+        fallback=DaemonClient.ADDRESS_FILE))
+
+def call_daemon(config, args, parser, method, *params, **kwargs):
+    """
+    Runs the given method of the running daemon.
+
+    @return: (dict) result of the daemon or None, if no daemon is available
+        and the command has to be run locally
+
+    """
+    daemon = get_daemon(config, args)
+    if daemon is None:
+        return None
+    try:
+        result = getattr(daemon, method)(*params, **kwargs)
+    except OSError as e:
+        logging.debug("Daemon not reachable, running locally: {}".format(e))
+        return None
+    except ValueError as e:
+        parser.error(str(e))
+    mark_startup('daemon')
+    logging.debug("Served by the daemon")
+    return result
 
 def main(argv):
+    mark_startup('imports')
+
     config = configparser.ConfigParser()
     config_path = os.path.expanduser(os.path.join("~", ".doimgrrc"))
     if os.path.isfile(config_path):
         config.read(config_path)
+    mark_startup('config')
 
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -66,7 +286,29 @@ used to find a specific DOI or getting information about a keyword/topic.""")
         help='limit the year')
     parser_search.add_argument('--rows', type=int,
         default=config.getint('search', 'rows', fallback=20),
-        help='number of rows to load')
+        help='number of rows to load; together with --all or --max-results \
+this is the number of rows loaded per page')
+    parser_search.add_argument('--all', action='store_true',
+        help='load all results page by page instead of only the first page')
+    parser_search.add_argument('--max-results', type=int, default=None,
+        help='load results page by page until this number of results is \
+reached')
+    parser_search.add_argument('--offline', action='store_true',
+        help='search the local index of all works seen before instead of \
+crossref.org')
+    parser_search.add_argument('--facet', type=str, default=None,
+        help='comma separated list of facets out of year, type and publisher; \
+instead of the results, the number of results for each value of the facets \
+is shown', metavar='')
+    parser_search.add_argument('--facet-limit', type=int,
+        default=config.getint('search', 'facet-limit', fallback=None),
+        help='number of values counted per facet; by default all values up \
+to the limit of the API')
+    add_library_argument(parser_search, '--format', type=str,
+        choices=SEARCH_FORMATS,
+        default=config.get('search', 'format', fallback='text'),
+        help='output format; ndjson, csv and tsv write one record with all \
+fields per result for processing by other tools')
     parser_search.add_argument('--color', action="store_true",
         default=config.getboolean('search', 'color', fallback=False),
         help='if set, colored output is used')
@@ -83,13 +325,12 @@ used to find a specific DOI or getting information about a keyword/topic.""")
         choices=valid_colors, help='color for additional information such as \
 authors, URLs, etc.')
 
-    # receive allowed types via http://api.crossref.org/types
-    allowed_types = api.get_valid_types()
-    parser_search.add_argument('--type', type=str, choices=allowed_types,
+    # allowed types are received via http://api.crossref.org/types and
+    # checked when the search is run
+    parser_search.add_argument('--type', type=str,
         default=config.get('search', 'type', fallback=None),
-        help='selects a single type; allowed values are {}'.format(", "\
-            .join(allowed_types)),
-        metavar='')
+        help='selects a single type; allowed values are listed in \
+API/types.txt', metavar='')
     parser_search.set_defaults(which_parser='search')
 
     parser_cite = subparsers.add_parser('cite',
@@ -105,16 +346,36 @@ formats. A full list of supported formats can be found in the subfolder
     parser_cite.add_argument('-c', '--copy', action='store_true',
         default=config.get('cite', 'copy', fallback=False),
         help="""Copies the result to the system clipboard""")
+    add_library_argument(parser_cite, '--render', type=str,
+        choices=RENDER_MODES, help_values={'local_styles': LOCAL_STYLES},
+        default=config.get('cite', 'render', fallback='remote'),
+        help='render common styles (%(local_styles)s) locally from the \
+metadata of the DOI instead of using the citation service')
     parser_cite.set_defaults(which_parser='cite')
 
     parser_download = subparsers.add_parser('download',
         help='Download articles based on their DOI', 
         description="""Downloads articles, if a full text verison is provided
 by the authors.""")
-    parser_download.add_argument('identifier', type=str, help='DOI identifier')
+    parser_download.add_argument('identifier', type=str, nargs='?',
+        help='DOI identifier')
+    parser_download.add_argument('-f', '--from-file',
+        type=argparse.FileType('r'),
+        help='download the full texts of all DOIs listed in this file, one \
+DOI per line ("-" for stdin)')
     parser_download.add_argument('-d', '--destination', type=str,
         default=config.get('download', 'destination', fallback="."),
         help='download destination')
+    parser_download.add_argument('-w', '--workers', type=int,
+        default=config.getint('download', 'workers', fallback=4),
+        help='number of files that are downloaded in parallel')
+    parser_download.add_argument('--chunk-size', type=int,
+        default=config.getint('download', 'chunk-size', fallback=64),
+        help='size of the chunks in KiB, in which files are downloaded')
+    parser_download.add_argument('--per-host', type=int,
+        default=config.getint('download', 'per-host', fallback=2),
+        help='number of files that are downloaded in parallel from the same \
+host')
     parser_download.set_defaults(which_parser='download')
 
     parser_bulk = subparsers.add_parser('bulk',
@@ -122,11 +383,32 @@ by the authors.""")
         description="""Mass converting for multiple DOIs listed in a single file.""")
     parser_bulk.add_argument('input', type=argparse.FileType('r'), 
         help='input file path', nargs='?', default=sys.stdin)
-    parser_bulk.add_argument('output', type=argparse.FileType('w'),
-        help='output file path', nargs='?', default=sys.stdout)
+    parser_bulk.add_argument('output', type=str,
+        help='output file path; if omitted, stdout is used', nargs='?',
+        default=None)
     parser_bulk.add_argument('-s', '--style', type=str,
         default=config.get('bulk', 'style', fallback="bibtex"),
         help='Citation style')
+    parser_bulk.add_argument('-w', '--workers', type=int,
+        default=config.getint('bulk', 'workers', fallback=1),
+        help='number of citations that are requested in parallel')
+    add_library_argument(parser_bulk, '--render', type=str,
+        choices=RENDER_MODES, help_values={'local_styles': LOCAL_STYLES},
+        default=config.get('bulk', 'render', fallback='remote'),
+        help='render common styles (%(local_styles)s) locally from the \
+metadata of the DOIs instead of using the citation service')
+    parser_bulk.add_argument('--dedupe', action='store_true',
+        default=config.getboolean('bulk', 'dedupe', fallback=False),
+        help='convert DOIs listed more than once only at their first \
+occurrence; every distinct DOI of the input is kept in memory to find them')
+    parser_bulk.add_argument('--resume', action='store_true',
+        help='continue an interrupted run from its last checkpoint instead \
+of converting all DOIs again; requires an output file path')
+    add_library_argument(parser_bulk, '--format', type=str,
+        choices=BULK_FORMATS,
+        default=config.get('bulk', 'format', fallback='text'),
+        help='output format; ndjson writes a record with the DOI, style, \
+status, citation or error and the time spent for every DOI')
     parser_bulk.set_defaults(which_parser='bulk')
 
     parser_service = subparsers.add_parser('service',
@@ -138,8 +420,39 @@ rebuilding the database of valid types and styles""")
             help='Rebuild the types, that are accepted on API requests')
     parser_service.add_argument('--rebuild-api-styles', action='store_true',
             help='Rebuild the styles, that are accepted on API requests')
+    parser_service.add_argument('--cache-stats', action='store_true',
+            help='Show statistics about the citation cache')
+    parser_service.add_argument('--cache-purge', action='store_true',
+            help='Remove all entries from the citation cache')
+    parser_service.add_argument('--index-stats', action='store_true',
+            help='Show statistics about the local work index')
+    parser_service.add_argument('--index-purge', action='store_true',
+            help='Remove all works from the local work index')
+    parser_service.add_argument('--import-dump', type=str, metavar='PATH',
+            help='Import a Crossref metadata dump (a file or a directory of \
+gzipped JSON or JSONL files) into the local work index')
+    parser_service.add_argument('--import-workers', type=int, default=None,
+            help='number of processes parsing the dump; defaults to the \
+number of CPUs')
     parser_service.set_defaults(which_parser='service')
 
+    parser_serve = subparsers.add_parser('serve',
+        help='Runs a daemon, which answers cite, search and download calls \
+of other doimgr calls with warm connections and caches',
+        description="""Runs a long-running daemon, which keeps the loaded API
+data, open connections and recent results in memory. While it is running,
+cite, search and download use it automatically.""")
+    parser_serve.add_argument('--host', type=str,
+        default=config.get('daemon', 'host', fallback='127.0.0.1'),
+        help='address to listen on')
+    parser_serve.add_argument('--port', type=int,
+        default=config.getint('daemon', 'port', fallback=0),
+        help='port to listen on; 0 selects a free port')
+    parser_serve.add_argument('--socket', type=str,
+        default=config.get('daemon', 'socket', fallback=None),
+        help='listen on this Unix socket instead of a localhost port')
+    parser_serve.set_defaults(which_parser='serve')
+
     parser.add_argument('-q', '--quiet', action='store_true', 
         default=config.getboolean('general', 'quiet', fallback=False),
         help='turns off all unnecessary outputs; use this for scripting')
@@ -148,11 +461,26 @@ rebuilding the database of valid types and styles""")
         help='set the logging level')
     parser.add_argument('--version', action="store_true",
         help='shows the version of doimgr')
+    parser.add_argument('--profile', action="store_true",
+        help='reports the time spent for requests, connecting, decoding, \
+parsing and downloading with p50/p95/p99 on stderr at exit')
+    parser.add_argument('--metrics-file', type=str,
+        default=config.get('profile', 'metrics-file', fallback=None),
+        help='appends every timing measurement as a line of JSON to this \
+file')
+    parser.add_argument('--no-daemon', action="store_true",
+        help='runs the command in this process even if a daemon is running')
+    parser.add_argument('--startup-profile', action="store_true",
+        help='reports the time spent for imports and initialization on \
+stderr')
 
     args = parser.parse_args()
+    mark_startup('argument parsing')
 
     if args.version:
         print("doimgr version: {}".format(__version__))
+        if args.startup_profile:
+            print_startup_profile()
         sys.exit()
 
     # set the logging levels according to the users choice
@@ -166,10 +494,77 @@ rebuilding the database of valid types and styles""")
 
     logging.debug("doimgr version {}".format(__version__))
 
+    configure_network(config)
+    metrics = None
+    if args.profile or args.metrics_file is not None:
+        from lib.profiler import Profiler
+        if args.metrics_file is not None:
+            metrics = open(os.path.expanduser(args.metrics_file), 'a')
+        profiler = Profiler.configure(enabled=args.profile, metrics=metrics)
+
+    try:
+        run_command(args, config, parser)
+    finally:
+        if args.startup_profile:
+            print_startup_profile()
+        if args.profile:
+            sys.stderr.write("Profile:\n{}\n".format(
+                profiler.format_report()))
+        if metrics is not None:
+            metrics.close()
+
+def run_command(args, config, parser):
     if hasattr(args, 'which_parser'):
-        if args.which_parser == 'search':
-            logging.debug('Arguments match to perform search')
+        if args.which_parser == 'search' and args.facet is not None:
+            logging.debug('Arguments match to count search results')
+            if args.offline:
+                parser.error("--facet cannot be used together with --offline")
+            if args.format != 'text':
+                parser.error("--facet only supports the text format")
+            from lib.search.request import Request
+            from lib.api import API
+            mark_startup('command imports')
+
+            if args.type is not None and \
+                    args.type not in API().get_valid_types():
+                parser.error("Given type \"{}\" is not valid. Aborting."\
+                        .format(args.type))
             req = Request()
+            mark_startup('initialization')
+            if sys.stdout.isatty():
+                req.set_colored_output(args.color, more=args.color_more)
+            facets = [facet.strip() for facet in args.facet.split(',') if
+                    len(facet.strip()) > 0]
+            limit = args.facet_limit if args.facet_limit is not None else \
+                    Request.FACET_LIMIT
+            try:
+                query = req.prepare_facet_query(args.query, facets, args.year,
+                        args.type, limit)
+            except ValueError as e:
+                parser.error(str(e))
+            req.print_facet_content(req.search_facets(query), facets)
+
+        elif args.which_parser == 'search':
+            logging.debug('Arguments match to perform search')
+            select = get_search_fields(config, args)
+            harvest = args.all or args.max_results is not None
+            # harvests are streamed page by page, which the daemon does not do
+            results = None if harvest else call_daemon(config, args, parser,
+                'search', args.query, args.sort, args.order, args.year,
+                args.type, args.rows, args.offline, select)
+            from lib.search.request import Request
+            from lib.api import API
+            mark_startup('command imports')
+
+            if results is None and args.type is not None and \
+                    args.type not in API().get_valid_types():
+                parser.error("Given type \"{}\" is not valid. Aborting."\
+                        .format(args.type))
+            index = get_work_index(config) if results is None else None
+            if results is None and args.offline and index is None:
+                parser.error("--offline requires the work index to be enabled")
+            req = Request(index=index)
+            mark_startup('initialization')
             if sys.stdout.isatty():
                 # only allow colors when the script's output is not redirected
                 req.set_colored_output(args.color, doi=args.color_doi,
@@ -177,23 +572,49 @@ rebuilding the database of valid types and styles""")
             else:
                 logging.debug('Colors have been disabled due to detected \
 reconnect')
-            results = req.search(req.prepare_search_query(args.query,
-                args.sort, args.order, args.year, args.type, args.rows))
-            req.print_search_content(results, args.show_authors,
-                    args.show_type, args.show_publisher, args.show_url)
+            query = req.prepare_search_query(args.query, args.sort,
+                args.order, args.year, args.type, args.rows, select)
+            if results is not None:
+                pass
+            elif args.offline:
+                rows = args.max_results if harvest else args.rows
+                results = index.search(args.query, args.sort, args.order,
+                    args.year, args.type, rows)
+            elif harvest:
+                results = req.search_all(query, max_results=args.max_results)
+            else:
+                results = req.search(query)
+            if args.format != 'text':
+                from lib.output import SearchResultWriter
+                SearchResultWriter.get_writer(args.format, sys.stdout)\
+                        .write_all(results)
+            else:
+                req.print_search_content(results, args.show_authors,
+                        args.show_type, args.show_publisher, args.show_url)
 
         elif args.which_parser == 'cite':
             logging.debug('Arguments match to request single DOI')
 
-            # check if given style is valid
-            # this is not done via argparse directly due to the amount of
-            # possible parameters
-            styles = api.get_valid_styles()
-            if args.style not in styles:
-                raise ValueError("Given style \"{}\" is not valid. \
-    Aborting.".format(args.style))
+            result = call_daemon(config, args, parser, 'cite',
+                    args.identifier, args.style, args.render)
+            if result is not None:
+                print(result['text'])
+                if args.copy:
+                    from lib.clipboard import Clipboard
+                    Clipboard.copy_to(result['citation'])
+                return
 
-            req = Request()
+            from lib.search.request import Request
+            from lib.api import API
+            from lib.clipboard import Clipboard
+            mark_startup('command imports')
+
+            validate_style(API(), parser, args.style)
+            req = Request(cache=get_citation_cache(config),
+                    index=get_work_index(config),
+                    index_lookups=get_index_lookups(config),
+                    render=args.render)
+            mark_startup('initialization')
             result = req.citation(req.prepare_citation_query(args.identifier),
                     style=args.style)
             req.print_citation(result)
@@ -201,7 +622,15 @@ reconnect')
                 Clipboard.copy_to(result)
 
         elif args.which_parser == 'download':
-            logging.debug('Arguments match to download single DOI')
+            logging.debug('Arguments match to download DOIs')
+            from lib.search.request import Request
+            from lib.downloader import Downloader
+            from lib.bulkdownloader import BulkDownloader
+            mark_startup('command imports')
+
+            if (args.identifier is None) == (args.from_file is None):
+                parser.error("download requires either an identifier or \
+--from-file")
 
             try:
                 os.makedirs(os.path.expanduser(args.destination))
@@ -211,46 +640,161 @@ reconnect')
                 logging.debug("Destination dir {} does already exists".format(
                     args.destination))
 
-            req = Request()
-            links = req.get_download_links(args.identifier)
-            for link in links:
-                url = link.get_url()
-                d = Downloader()
-                filepath = d.download(url, 
-                    os.path.expanduser(args.destination),
-                    "{}.pdf".format(args.identifier.replace("/", "_")))
-                if filepath is not None:
-                    logging.info("Saved file as {}".format(filepath))
-
-            if len(links) == 0:
-                logging.info("No valid download URLs found. Aborting.")
+            req = Request(cache=get_citation_cache(config),
+                    index=get_work_index(config),
+                    index_lookups=get_index_lookups(config))
+            d = Downloader(chunk_size=args.chunk_size * 1024)
+            if args.from_file is not None:
+                b = BulkDownloader(req, d)
+                success = b.run(args.from_file,
+                        os.path.expanduser(args.destination),
+                        workers=args.workers, per_host=args.per_host)
+                print(b.format_summary())
+                if not success:
+                    for identifier, error in b.get_failed():
+                        sys.stderr.write("Failed to download {}: {}\n".format(
+                            identifier, error))
+                    sys.exit(1)
+            else:
+                result = call_daemon(config, args, parser,
+                        'get_download_links', args.identifier)
+                if result is not None:
+                    urls = [link['url'] for link in result['links']]
+                else:
+                    urls = [link.get_url() for link in
+                            req.get_download_links(args.identifier)]
+                jobs = [(url, os.path.expanduser(args.destination),
+                    BulkDownloader.get_filename(args.identifier, i)) for
+                    i, url in enumerate(urls)]
+                for filepath in d.download_all(jobs, workers=args.workers,
+                        per_host=args.per_host):
+                    if filepath is not None:
+                        logging.info("Saved file as {}".format(filepath))
+
+                if len(urls) == 0:
+                    logging.info("No valid download URLs found. Aborting.")
 
         elif args.which_parser == 'bulk':
             logging.debug('Arguments match with bulk conversion')
 
-            # check if given style valid
-            # this is not done via argparse directly due to the amount of
-            # possible parameters
-            styles = api.get_valid_styles()
-            if args.style not in styles:
-                raise ValueError("Given style \"{}\" is not valid. \
-    Aborting.".format(args.style))
+            from lib.search.request import Request
+            from lib.api import API
+            from lib.bulkconverter import BulkConverter
+            mark_startup('command imports')
 
-            b = BulkConverter()
-            if args.output == sys.stdout:
+            validate_style(API(), parser, args.style)
+            b = BulkConverter(Request(cache=get_citation_cache(config),
+                index=get_work_index(config),
+                index_lookups=get_index_lookups(config),
+                render=args.render))
+            mark_startup('initialization')
+            if args.output is None:
+                if args.resume:
+                    parser.error("--resume requires an output file path")
                 # switch to quiet mode, since we do not want to place
                 # unneccesary messages on stdout
                 logging.getLogger().setLevel(logging.CRITICAL)
-            b.run(args.input, args.output, style=args.style)
+                output, journal = sys.stdout, None
+            else:
+                # the progress is checkpointed next to the output file
+                output = open(args.output, 'a' if args.resume else 'w')
+                journal = "{}.journal".format(args.output)
+            try:
+                success = b.run(args.input, output, style=args.style,
+                    workers=args.workers, journal=journal,
+                    resume=args.resume, format_=args.format,
+                    dedupe=args.dedupe)
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+            if not success:
+                for identifier, error in b.get_failed():
+                    sys.stderr.write("Failed to convert {}: {}\n".format(
+                        identifier, error))
+                sys.exit(1)
 
         elif args.which_parser == 'service':
             logging.debug('Arguments match with service call')
+            from lib.api import API
+            mark_startup('command imports')
 
+            api = API()
             if args.rebuild_api_types:
                 api.rebuild_valid_identifier(api.TYPE_TYPES)
 
             if args.rebuild_api_styles:
                 api.rebuild_valid_identifier(api.TYPE_STYLES)
 
+            if args.cache_stats or args.cache_purge:
+                cache = get_citation_cache(config)
+                if cache is None:
+                    logging.info("The citation cache is disabled.")
+                elif args.cache_purge:
+                    logging.info("Removed {:d} citations from the cache."\
+                            .format(cache.purge()))
+                if cache is not None and args.cache_stats:
+                    stats = cache.get_stats()
+                    print("path     : {}".format(stats['path']))
+                    print("entries  : {:d}".format(stats['entries']))
+                    print("size     : {:.2f} MiB of {:.2f} MiB".format(
+                        stats['size'] / 1024**2, stats['max_size'] / 1024**2))
+                    print("ttl      : {:d} days".format(stats['ttl'] // 86400))
+
+            if args.index_stats or args.index_purge:
+                index = get_work_index(config)
+                if index is None:
+                    logging.info("The work index is disabled.")
+                elif args.index_purge:
+                    logging.info("Removed {:d} works from the index."\
+                            .format(index.purge()))
+                if index is not None and args.index_stats:
+                    stats = index.get_stats()
+                    print("path     : {}".format(stats['path']))
+                    print("works    : {:d}".format(stats['works']))
+
+            if args.import_dump is not None:
+                from lib.dumpimporter import DumpImporter
+                index = get_work_index(config)
+                if index is None:
+                    parser.error("--import-dump requires the work index to be \
+enabled")
+                importer = DumpImporter(index, workers=args.import_workers)
+                try:
+                    importer.run(os.path.expanduser(args.import_dump))
+                except ValueError as e:
+                    parser.error(str(e))
+                stats = importer.get_stats()
+                print("Imported {:d} of {:d} records from {:d} files in {:.1f} \
+s ({:.0f} records/s), {:d} skipped".format(stats['imported'],
+                    stats['records'], stats['files'], stats['seconds'],
+                    stats['rate'], stats['skipped']))
+
+        elif args.which_parser == 'serve':
+            logging.debug('Arguments match to run the daemon')
+            from lib.daemon import Daemon, DaemonService
+            from lib.daemonclient import DaemonClient
+            mark_startup('command imports')
+
+            service = DaemonService(cache=get_citation_cache(config),
+                    index=get_work_index(config),
+                    index_lookups=get_index_lookups(config))
+            daemon = Daemon(service, host=args.host, port=args.port,
+                    socket_path=args.socket,
+                    address_file=config.get('daemon', 'address-file',
+                        fallback=DaemonClient.ADDRESS_FILE)).start()
+            address = daemon.get_address()
+            logging.info("Daemon listening on {}".format(
+                address.get('socket') or "{}:{:d}".format(address['host'],
+                    address['port'])))
+            # stop cleanly on SIGTERM as well, so the address file is removed
+            import signal
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            try:
+                daemon.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                daemon.stop()
+
 if __name__ == "__main__":
     main(sys.argv)
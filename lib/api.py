@@ -3,6 +3,7 @@ import sys
 import logging
 
 from lib.search.request import Request
+from lib.registry import Registry
 
 class API(object):
     API_BASEPATH = os.path.join(os.path.dirname(__file__), '..', 'API')
@@ -20,13 +21,12 @@ class API(object):
 
         req = Request()
 
+        if type_ == self.TYPE_TYPES:
+            url = "http://{}/types".format(req.URL_API_BASE)
+        elif type_ == self.TYPE_STYLES:
+            url = "http://{}/styles".format(req.URL_API_BASE)
         if path is None:
-            if type_ == self.TYPE_TYPES:
-                path = os.path.join(self.API_BASEPATH, 'types.txt')
-                url = "http://{}/types".format(req.URL_API_BASE)
-            elif type_ == self.TYPE_STYLES:
-                path = os.path.join(self.API_BASEPATH, 'styles.txt')
-                url = "http://{}/styles".format(req.URL_API_BASE)
+            path = self.__get_path(type_)
 
         results = req._request(url)
         if type_ == self.TYPE_TYPES:
@@ -36,25 +36,25 @@ class API(object):
         with open(path, 'w') as f:
             for value in identifier:
                 f.write("{}\n".format(value))
+
+        # keep the binary snapshot in sync with the plain text file
+        Registry(identifier).save_snapshot(path)
+        Registry.invalidate(path)
         return path
 
     def get_valid_types(self):
-        path = os.path.join(self.API_BASEPATH, 'types.txt')
-        return self.__get_valid_API_values_from_file(path)
-
-    def get_valid_styles(self):
-        path = os.path.join(self.API_BASEPATH, 'styles.txt')
-        return self.__get_valid_API_values_from_file(path)
+        """
+        @return: (Registry) valid types
 
-    def __get_valid_API_values_from_file(self, filepath, format='plain'):
         """
-        Method to derive valid API identifiers.
+        return Registry.load(self.__get_path(self.TYPE_TYPES))
 
-        @return: (list) valid API identifiers
+    def get_valid_styles(self):
+        """
+        @return: (Registry) valid styles
 
         """
-        if format == 'plain':
-            with open(filepath, 'r') as f:
-                result = f.read().split('\n')
-            return result
-        raise ValueError('Format {} is not implemented'.format(format))
+        return Registry.load(self.__get_path(self.TYPE_STYLES))
+
+    def __get_path(self, type_):
+        return os.path.join(self.API_BASEPATH, '{}.txt'.format(type_))
@@ -0,0 +1,220 @@
+import os
+import sys
+import ssl
+import zlib
+import asyncio
+import logging
+import collections
+import urllib.parse
+
+class AsyncTransport(object):
+    """
+    Minimal HTTP/1.1 client for asyncio. Connections are kept alive and pooled
+    per host; the number of connections per host is bounded, so any number of
+    coroutines can issue requests at the same time and simply wait for a free
+    connection.
+
+    Pools belong to the event loop they were created in, so a transport must
+    only be used from a single event loop and closed by `close` before the
+    loop ends.
+
+    """
+    TIMEOUT         = 30
+    MAX_CONNECTIONS = 32
+    MAX_REDIRECTIONS = 5
+    MAX_LINE        = 64 * 1024
+    USER_AGENT      = "doimgr"
+
+    def __init__(self, timeout=TIMEOUT, max_connections=MAX_CONNECTIONS):
+        if max_connections < 1:
+            raise ValueError("Number of connections must be at least 1.")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.idle = collections.defaultdict(list)
+        self.slots = {}
+        self.ssl_context = None
+        self.stats = {
+            'requests'           : 0,
+            'connections_opened' : 0,
+            'connections_reused' : 0,
+        }
+
+    def get_stats(self):
+        """
+        @return: (dict) counters about requests and connection reuse
+
+        """
+        stats = dict(self.stats)
+        stats['idle_connections'] = sum(len(idle) for idle in
+                self.idle.values())
+        return stats
+
+    async def request(self, url, method="GET", headers=None):
+        """
+        Performs a request and follows redirections.
+
+        @return: (tuple) response headers as dict with lower case names and
+            the `status`, and the decoded body as bytes
+
+        """
+        for _ in range(self.MAX_REDIRECTIONS + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise ValueError("URL scheme {} is not supported.".format(
+                    parts.scheme))
+            key = (parts.scheme, parts.netloc)
+            path = urllib.parse.urlunsplit(('', '', parts.path or '/',
+                parts.query, ''))
+
+            if key not in self.slots:
+                self.slots[key] = asyncio.Semaphore(self.max_connections)
+            async with self.slots[key]:
+                resp, content = await asyncio.wait_for(self._exchange(key,
+                    method, path, headers or {}), self.timeout)
+
+            location = resp.get('location')
+            if int(resp['status']) in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+                logging.debug("Redirected to {}".format(url))
+                continue
+            return resp, content
+        raise RuntimeError("Too many redirections for URL {}".format(url))
+
+    async def close(self):
+        """
+        Closes all idle connections.
+
+        """
+        for idle in self.idle.values():
+            for _, writer in idle:
+                writer.close()
+        self.idle.clear()
+
+    async def _exchange(self, key, method, path, headers):
+        connection, reused = await self._acquire_connection(key)
+        try:
+            resp, content, keep_alive = await self._send(connection, key,
+                    method, path, headers)
+        except (OSError, asyncio.IncompleteReadError):
+            connection[1].close()
+            if not reused:
+                raise
+            # the server has closed the idle connection in the meantime
+            connection, _ = await self._acquire_connection(key, reuse=False)
+            try:
+                resp, content, keep_alive = await self._send(connection, key,
+                        method, path, headers)
+            except BaseException:
+                connection[1].close()
+                raise
+        except BaseException:
+            # e.g. cancelled by the timeout, the response state is unknown
+            connection[1].close()
+            raise
+
+        if keep_alive:
+            self.idle[key].append(connection)
+        else:
+            connection[1].close()
+        return resp, content
+
+    async def _acquire_connection(self, key, reuse=True):
+        self.stats['requests'] += 1
+        idle = self.idle[key]
+        while reuse and len(idle) > 0:
+            reader, writer = idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            self.stats['connections_reused'] += 1
+            return (reader, writer), True
+
+        scheme, netloc = key
+        parts = urllib.parse.urlsplit("//" + netloc)
+        context = None
+        if scheme == 'https':
+            if self.ssl_context is None:
+                self.ssl_context = ssl.create_default_context()
+            context = self.ssl_context
+        port = parts.port or (443 if scheme == 'https' else 80)
+        reader, writer = await asyncio.open_connection(parts.hostname, port,
+                ssl=context, limit=self.MAX_LINE)
+        self.stats['connections_opened'] += 1
+        return (reader, writer), False
+
+    async def _send(self, connection, key, method, path, headers):
+        reader, writer = connection
+        lines = ["{} {} HTTP/1.1".format(method, path),
+                "Host: {}".format(key[1])]
+        names = set(name.lower() for name in headers)
+        if 'user-agent' not in names:
+            lines.append("User-Agent: {}".format(self.USER_AGENT))
+        if 'accept-encoding' not in names:
+            lines.append("Accept-Encoding: gzip, deflate")
+        for name, value in headers.items():
+            lines.append("{}: {}".format(name, value))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        try:
+            version, status, _ = status_line.decode('latin-1').split(' ', 2)
+            status = int(status)
+        except ValueError:
+            raise ConnectionError("Invalid status line {!r}".format(
+                status_line))
+
+        resp = {'status': str(status)}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if line == b'':
+                raise asyncio.IncompleteReadError(line, None)
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            # repeated headers are combined like in http.client
+            resp[name] = "{}, {}".format(resp[name], value) if name in resp \
+                    else value
+
+        keep_alive = version == 'HTTP/1.1' and \
+                resp.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            content = b''
+        elif resp.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self._read_chunked(reader)
+        elif 'content-length' in resp:
+            content = await reader.readexactly(int(resp['content-length']))
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        encoding = resp.get('content-encoding', '').lower()
+        try:
+            if encoding == 'gzip':
+                content = zlib.decompress(content, 16 + zlib.MAX_WBITS)
+            elif encoding == 'deflate':
+                content = zlib.decompress(content)
+        except zlib.error as e:
+            raise ConnectionError("Invalid {} content: {}".format(encoding, e))
+        return resp, content, keep_alive
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            line = await reader.readline()
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise ConnectionError("Invalid chunk size {!r}".format(line))
+            if size == 0:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        # skip trailers
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+        return b''.join(chunks)
@@ -1,26 +1,331 @@
 import sys
 import os
+import json
+import time
 import logging
+import collections
+from concurrent.futures import ThreadPoolExecutor
 
 from lib.search.request import Request
+from lib.doi import DOI
+from lib.transport import Transport
+from lib.ratelimiter import RateLimiter
+from lib.retry import RetryPolicy
+from lib.coalescer import Coalescer
+from lib.output import format_bulk_record
 
 class BulkConverter():
-    def __init__(self):
+    CHECKPOINT_INTERVAL = 10
+
+    FORMAT_TEXT   = 'text'
+    FORMAT_NDJSON = 'ndjson'
+    FORMATS       = (FORMAT_TEXT, FORMAT_NDJSON)
+
+    # result of a DOI, which has been listed before
+    DUPLICATE     = object()
+
+    def __init__(self, request=None):
         self.input_file = None
         self.output_file = None
+        self.request = request if request is not None else Request()
+        self.failed = []
+        self.duplicates = 0
+
+    def get_failed(self):
+        """
+        @return: (list) tuples of (identifier, error message) for all DOIs
+            that could not be converted during the last run
+
+        """
+        return self.failed
+
+    def get_duplicates(self):
+        """
+        @return: (int) number of DOIs skipped during the last run, because
+            they have been listed before
+
+        """
+        return self.duplicates
+
+    def run(self, in_, out_, style, workers=1, journal=None, resume=False,
+            format_=FORMAT_TEXT, dedupe=False):
+        """
+        Converts all DOIs listed in `in_` and writes the citations to `out_`.
+
+        The input is streamed line by line. Citations are fetched by up to
+        `workers` threads, but are always written in the order of the input.
+        A DOI that cannot be converted is reported and skipped without
+        stopping the run. Memory use does not grow with the length of the
+        input, unless `dedupe` is set.
+
+        With `dedupe` set, DOIs listed more than once are only converted at
+        their first occurrence; DOIs are compared case-insensitively and
+        without the `http://dx.doi.org/` prefix. This keeps every distinct
+        DOI of the input in memory until the run has finished, roughly 100
+        bytes each.
+
+        If a `journal` path is given, the progress is checkpointed to this
+        file while converting. With `resume` set, a previous run is continued
+        from its last checkpoint; `out_` must then be opened for appending.
+        The journal is removed once the run has finished.
 
-    def run(self, in_, out_, style):
+        With `format_` set to `ndjson`, every DOI is written as a line of
+        JSON with its status, the citation or the error and the time spent
+        converting it, so failed and duplicate DOIs show up in the output as
+        well.
+
+        @return: (bool) True if all DOIs have been converted
+
+        """
+        if workers < 1:
+            raise ValueError("Number of workers must be at least 1.")
+        if format_ not in self.FORMATS:
+            raise ValueError("Format {} is not supported. Valid formats are: \
+{}".format(format_, ", ".join(self.FORMATS)))
         logging.info('Starting with bulk convertation.')
 
-        req = Request()
+        self.failed = []
+        self.duplicates = 0
+        skip = 0
+        if resume:
+            if journal is None:
+                raise ValueError("Resuming requires a journal.")
+            skip = self._restore_checkpoint(journal, out_, style, format_)
+
+        entries = self._read_identifiers(in_, skip, dedupe)
+        convert = lambda entry: [self._convert(entry, style)]
+        if self.request.renders_locally(style):
+            # citations are rendered from work metadata, which is looked up
+            # for many DOIs with a single request
+            entries = self._chunk(entries, self.request.BATCH_SIZE)
+            convert = lambda chunk: self._convert_batch(chunk, style)
+
+        if workers == 1:
+            self._write_all(out_, map(convert, entries), style, journal,
+                    format_)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                self._write_all(out_, self._map_bounded(executor, convert,
+                    entries, workers), style, journal, format_)
+
+        if journal is not None and os.path.isfile(journal):
+            os.remove(journal)
 
-        for line in in_.readlines():
+        stats = Transport.get_instance().get_stats()
+        logging.info('Connections opened: {:d}, reused: {:d}'.format(
+            stats['connections_opened'], stats['connections_reused']))
+        stats = RateLimiter.get_instance().get_stats()
+        logging.info('Requests: {:d}, throttled: {:d}, waited for rate limit: \
+{:.1f} s'.format(stats['requests'], stats['throttled'], stats['waited']))
+        stats = Coalescer.get_instance().get_stats()
+        logging.info('Duplicate DOIs skipped: {:d}, requests coalesced: \
+{:d}'.format(self.duplicates, stats['coalesced']))
+        stats = RetryPolicy.get_instance().get_stats()
+        logging.info('Retries: {:d}, backed off: {:.1f} s, API outages: {:d}, \
+paused: {:.1f} s'.format(stats['retries'], stats['backoff'], stats['trips'],
+            stats['paused']))
+        if len(self.failed) > 0:
+            logging.error('{:d} DOIs could not be converted.'.format(
+                len(self.failed)))
+        return len(self.failed) == 0
+
+    def _read_identifiers(self, in_, skip=0, dedupe=False):
+        """
+        Generator over all DOIs of the input, which yields tuples of the
+        number of consumed input lines, the DOI and whether it has been
+        listed before, if `dedupe` is set.
+
+        """
+        seen = set()
+        for line_number, line in enumerate(in_, 1):
+            if not dedupe and line_number <= skip:
+                continue
             if line.startswith('#'):
                 continue
             identifier = line.strip()
+            if len(identifier) == 0:
+                continue
+            duplicate = False
+            if dedupe:
+                key = self._get_key(identifier)
+                duplicate = key in seen
+                seen.add(key)
+            # lines converted before resuming are read to know their DOIs
+            if line_number <= skip:
+                continue
+            yield (line_number, identifier, duplicate)
+
+    def _get_key(self, identifier):
+        """
+        @return: (str) the normalized DOI or, if it is not valid, the lower
+            cased identifier, which fails to convert later on
+
+        """
+        try:
+            return DOI(identifier).get_normalized_identifier()
+        except ValueError:
+            return identifier.lower()
+
+    def _chunk(self, entries, size):
+        chunk = []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+    def _map_bounded(self, executor, func, entries, workers):
+        """
+        Like `executor.map`, but only keeps a few pending entries per worker
+        in memory instead of consuming the whole input upfront.
+
+        """
+        pending = collections.deque()
+        for entry in entries:
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, entry))
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+    def _convert(self, entry, style):
+        """
+        @return: (tuple) line number, DOI, citation, error message and the
+            time spent in seconds
+
+        """
+        line_number, identifier, duplicate = entry
+        if duplicate:
+            return (line_number, identifier, self.DUPLICATE, None, 0.0)
+        logging.info('Converting DOI: {}'.format(identifier))
+        start = time.perf_counter()
+        try:
+            result = self.request.citation(
+                    self.request.prepare_citation_query(identifier),
+                    style=style)
+        except Exception as e:
+            return (line_number, identifier, None, str(e),
+                    time.perf_counter() - start)
+        return (line_number, identifier, result, None,
+                time.perf_counter() - start)
+
+    def _convert_batch(self, chunk, style):
+        # invalid DOIs are failed on their own, so they do not fail the
+        # lookup of the whole chunk
+        keys = {}
+        for line_number, identifier, duplicate in chunk:
+            if duplicate:
+                continue
+            try:
+                keys[line_number] = DOI(identifier).get_normalized_identifier()
+            except ValueError as e:
+                keys[line_number] = e
+        identifiers = [identifier for line_number, identifier, _ in chunk if
+                isinstance(keys.get(line_number), str)]
+
+        # every valid DOI is charged an equal share of the batched lookup
+        start = time.perf_counter()
+        lookup_error = None
+        works = {}
+        if len(identifiers) > 0:
+            try:
+                works = self.request.get_works(identifiers)
+            except Exception as e:
+                lookup_error = str(e)
+        lookup = (time.perf_counter() - start) / max(1, len(identifiers))
+
+        results = []
+        for line_number, identifier, duplicate in chunk:
+            if duplicate:
+                results.append((line_number, identifier, self.DUPLICATE,
+                    None, 0.0))
+                continue
+            key = keys[line_number]
+            if not isinstance(key, str):
+                results.append((line_number, identifier, None, str(key), 0.0))
+                continue
+            if lookup_error is not None:
+                results.append((line_number, identifier, None, lookup_error,
+                    lookup))
+                continue
             logging.info('Converting DOI: {}'.format(identifier))
-            result = req.citation(req.prepare_citation_query(
-                identifier), style=style)
+            start = time.perf_counter()
+            try:
+                if key not in works:
+                    raise ValueError("DOI is unknown.")
+                result = self.request.render_citation(works[key], style)
+            except Exception as e:
+                results.append((line_number, identifier, None, str(e),
+                    lookup + time.perf_counter() - start))
+                continue
+            results.append((line_number, identifier, result, None,
+                lookup + time.perf_counter() - start))
+        return results
+
+    def _write_all(self, out_, results, style, journal, format_):
+        converted = 0
+        for batch in results:
+            for line_number, identifier, result, error, seconds in batch:
+                self._write(out_, identifier, style, result, error, seconds,
+                        format_)
+                converted += 1
+                if journal is not None and \
+                        converted % self.CHECKPOINT_INTERVAL == 0:
+                    self._write_checkpoint(journal, out_, line_number, style,
+                            format_)
+
+    def _write(self, out_, identifier, style, result, error, seconds,
+            format_):
+        if result is self.DUPLICATE:
+            logging.info('Skipping duplicate DOI: {}'.format(identifier))
+            self.duplicates += 1
+            if format_ == self.FORMAT_NDJSON:
+                out_.write(format_bulk_record(identifier, style, None, None,
+                    seconds, duplicate=True))
+            return
+        if error is not None:
+            logging.error('DOI {} could not be converted: {}'.format(
+                identifier, error))
+            self.failed.append((identifier, error))
+        if format_ == self.FORMAT_NDJSON:
+            out_.write(format_bulk_record(identifier, style, result, error,
+                seconds))
+        elif error is None:
             out_.write("{}\n".format(result))
 
-        return True
+    def _write_checkpoint(self, journal, out_, line_number, style, format_):
+        out_.flush()
+        checkpoint = {'lines': line_number, 'offset': out_.tell(),
+                'style': style, 'format': format_}
+        with open(journal + '.tmp', 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(journal + '.tmp', journal)
+
+    def _restore_checkpoint(self, journal, out_, style, format_):
+        """
+        Truncates the output to the state of the last checkpoint.
+
+        @return: (int) number of input lines that are already converted
+
+        """
+        if not os.path.isfile(journal):
+            logging.info('No checkpoint found, starting from the beginning.')
+            checkpoint = {'lines': 0, 'offset': 0, 'style': style,
+                    'format': format_}
+        else:
+            with open(journal, 'r') as f:
+                checkpoint = json.load(f)
+        if checkpoint['style'] != style:
+            raise ValueError("Checkpoint was written for style \"{}\". \
+Aborting.".format(checkpoint['style']))
+        # journals of older versions were always written in text format
+        if checkpoint.get('format', self.FORMAT_TEXT) != format_:
+            raise ValueError("Checkpoint was written for format \"{}\". \
+Aborting.".format(checkpoint.get('format', self.FORMAT_TEXT)))
+        out_.seek(checkpoint['offset'])
+        out_.truncate()
+        logging.info('Resuming after line {:d} of the input.'.format(
+            checkpoint['lines']))
+        return checkpoint['lines']
@@ -0,0 +1,165 @@
+import sys
+import os
+import time
+import logging
+
+from lib.search.request import Request
+from lib.downloader import Downloader
+from lib.doi import DOI
+
+class BulkDownloader(object):
+    """
+    Downloads the full texts of all DOIs listed in a file.
+
+    The input is streamed and the download links are looked up for many DOIs
+    with a single request. The downloads are scheduled on a pool of workers,
+    which only loads a limited number of files from the same host at once.
+    Files which are already present in the destination are skipped; to find
+    them, files are always named after their DOI, see `get_filename`.
+
+    """
+    PER_HOST = 2
+
+    def __init__(self, request=None, downloader=None):
+        self.request = request if request is not None else Request()
+        self.downloader = downloader if downloader is not None else \
+                Downloader()
+        self.failed = []
+        self.summary = {}
+
+    def get_failed(self):
+        """
+        @return: (list) tuples of (identifier, error message) for all DOIs
+            or URLs that could not be downloaded during the last run
+
+        """
+        return self.failed
+
+    def get_summary(self):
+        """
+        @return: (dict) number of DOIs, downloaded, skipped and failed files,
+            downloaded bytes and duration in seconds of the last run
+
+        """
+        return self.summary
+
+    def run(self, in_, destination, workers=4, per_host=PER_HOST):
+        """
+        Downloads the full texts of all DOIs listed in `in_` into the
+        directory `destination`.
+
+        @return: (bool) True if all files have been downloaded
+
+        """
+        self.failed = []
+        self.summary = {'dois': 0, 'downloaded': 0, 'skipped': 0, 'failed':
+                0, 'bytes': 0, 'seconds': 0.0}
+        start = time.perf_counter()
+
+        jobs = self._get_jobs(self._read_identifiers(in_), destination)
+        for (identifier, url, path, filename), filepath in \
+                self.downloader.download_iter(jobs, workers, per_host,
+                    job=lambda entry: entry[1:], server_filenames=False):
+            if filepath is None:
+                self._fail(identifier, "{} could not be downloaded".format(
+                    url))
+                continue
+            logging.info("Saved file as {}".format(filepath))
+            self.summary['downloaded'] += 1
+            self.summary['bytes'] += os.path.getsize(filepath)
+
+        self.summary['seconds'] = time.perf_counter() - start
+        return len(self.failed) == 0
+
+    def format_summary(self):
+        """
+        @return: (str) human readable summary of the last run
+
+        """
+        s = self.summary
+        megabytes = s['bytes'] / 1024 / 1024
+        rate = megabytes / s['seconds'] if s['seconds'] > 0 else 0.0
+        return "{:d} DOIs: {:d} files downloaded ({:.1f} MiB in {:.1f} s, \
+{:.2f} MiB/s), {:d} skipped, {:d} failed".format(s['dois'], s['downloaded'],
+            megabytes, s['seconds'], rate, s['skipped'], s['failed'])
+
+    def _read_identifiers(self, in_):
+        for line in in_:
+            if line.startswith('#'):
+                continue
+            identifier = line.strip()
+            if len(identifier) == 0:
+                continue
+            yield identifier
+
+    def _get_jobs(self, identifiers, destination):
+        """
+        Generator over the downloads of all DOIs, which yields tuples of the
+        DOI followed by the arguments of `Downloader.download`.
+
+        """
+        for chunk in self._chunk(identifiers, self.request.BATCH_SIZE):
+            self.summary['dois'] += len(chunk)
+            valid = []
+            for identifier in chunk:
+                try:
+                    DOI(identifier)
+                except ValueError as e:
+                    self._fail(identifier, str(e))
+                    continue
+                valid.append(identifier)
+            if len(valid) == 0:
+                continue
+
+            try:
+                links = self.request.get_download_links_batch(valid)
+            except Exception as e:
+                for identifier in valid:
+                    self._fail(identifier, str(e))
+                continue
+
+            for identifier in valid:
+                key = DOI(identifier).get_normalized_identifier()
+                if key not in links:
+                    self._fail(identifier, "DOI is unknown.")
+                    continue
+                if len(links[key]) == 0:
+                    logging.info("No valid download URLs found for {}".format(
+                        identifier))
+                for i, link in enumerate(links[key]):
+                    filename = self.get_filename(identifier, i)
+                    if os.path.isfile(os.path.join(destination, filename)):
+                        logging.debug("File {} already exists".format(
+                            filename))
+                        self.summary['skipped'] += 1
+                        continue
+                    yield (identifier, link.get_url(), destination, filename)
+
+    @staticmethod
+    def get_filename(identifier, index=0):
+        """
+        @return: (str) filename of the `index`-th full text of a DOI; every
+            link needs its own filename, since the files are downloaded in
+            parallel
+
+        """
+        filename = identifier.replace("/", "_")
+        if index > 0:
+            filename += "_{:d}".format(index)
+        return "{}.pdf".format(filename)
+
+    def _chunk(self, entries, size):
+        chunk = []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+    def _fail(self, identifier, error):
+        logging.error('DOI {} could not be downloaded: {}'.format(identifier,
+            error))
+        self.failed.append((identifier, error))
+        self.summary['failed'] += 1
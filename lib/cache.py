@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+class CitationCache(object):
+    """
+    Persistent on-disk storage of citations, keyed by the normalized DOI and
+    the citation style.
+
+    Entries expire after `ttl` seconds. If the total size of all stored
+    citations exceeds `max_size` bytes, the least recently used entries are
+    evicted.
+
+    Besides citations, the work metadata of DOIs can be stored, which is used
+    to render citations locally. It is kept under the reserved style name
+    `WORK_STYLE` and shares expiry and eviction with the citations.
+
+    """
+    DEFAULT_PATH     = os.path.join('~', '.doimgr', 'cache.sqlite')
+    DEFAULT_TTL      = 30 * 24 * 60 * 60
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+    WORK_STYLE       = '@work'
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL,
+            max_size=DEFAULT_MAX_SIZE):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        self.size = 0
+
+    def get(self, doi, style):
+        """
+        @return: (str) cached citation or None if there is no valid entry
+
+        """
+        now = time.time()
+        with self.lock:
+            db = self._get_db()
+            row = db.execute("SELECT citation, created FROM citations WHERE \
+doi = ? AND style = ?", (doi, style)).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                self.misses += 1
+                return None
+            db.execute("UPDATE citations SET accessed = ? WHERE doi = ? AND \
+style = ?", (now, doi, style))
+            self.hits += 1
+            return row[0]
+
+    def put(self, doi, style, citation):
+        now = time.time()
+        size = len(citation.encode('utf-8'))
+        with self.lock:
+            db = self._get_db()
+            row = db.execute("SELECT size FROM citations WHERE doi = ? AND \
+style = ?", (doi, style)).fetchone()
+            self.size += size - (row[0] if row is not None else 0)
+            db.execute("INSERT OR REPLACE INTO citations (doi, style, \
+citation, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)", (doi, style,
+                citation, size, now, now))
+            if self.size > self.max_size:
+                self._evict(db, now)
+        return True
+
+    def get_work(self, doi):
+        """
+        @return: (dict) cached work metadata or None if there is no valid
+            entry
+
+        """
+        work = self.get(doi, self.WORK_STYLE)
+        return json.loads(work) if work is not None else None
+
+    def put_work(self, doi, work):
+        return self.put(doi, self.WORK_STYLE, json.dumps(work))
+
+    def purge(self):
+        """
+        Removes all entries from the cache.
+
+        @return: (int) number of removed entries
+
+        """
+        with self.lock:
+            db = self._get_db()
+            self.size = 0
+            return db.execute("DELETE FROM citations").rowcount
+
+    def get_stats(self):
+        """
+        @return: (dict) number of entries, their total size and the hits and
+            misses of this process
+
+        """
+        with self.lock:
+            db = self._get_db()
+            entries, size = db.execute("SELECT COUNT(*), \
+COALESCE(SUM(size), 0) FROM citations").fetchone()
+        return {
+            'path'     : self.path,
+            'entries'  : entries,
+            'size'     : size,
+            'max_size' : self.max_size,
+            'ttl'      : self.ttl,
+            'hits'     : self.hits,
+            'misses'   : self.misses,
+        }
+
+    def _evict(self, db, now):
+        db.execute("DELETE FROM citations WHERE created < ?",
+                (now - self.ttl,))
+        total, = db.execute("SELECT COALESCE(SUM(size), 0) FROM citations")\
+                .fetchone()
+        rows = db.execute("SELECT doi, style, size FROM citations ORDER BY \
+accessed ASC")
+        evict = []
+        for doi, style, size in rows:
+            if total <= self.max_size:
+                break
+            evict.append((doi, style))
+            total -= size
+        db.executemany("DELETE FROM citations WHERE doi = ? AND style = ?",
+                evict)
+        self.size = total
+        logging.debug("Evicted {:d} citations from the cache".format(
+            len(evict)))
+
+    def _get_db(self):
+        if self.db is None:
+            directory = os.path.dirname(self.path)
+            if directory != '' and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.db = sqlite3.connect(self.path, isolation_level=None,
+                    check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode = WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS citations (doi TEXT, \
+style TEXT, citation TEXT, size INTEGER, created REAL, accessed REAL, \
+PRIMARY KEY (doi, style))")
+            self.db.execute("CREATE INDEX IF NOT EXISTS citations_accessed \
+ON citations (accessed)")
+            self.size, = self.db.execute("SELECT COALESCE(SUM(size), 0) \
+FROM citations").fetchone()
+        return self.db
@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+
+class Coalescer(object):
+    """
+    Coalesces identical requests, which are in flight at the same time, into
+    a single call. The first caller of a key runs the call, all callers
+    arriving before it has finished wait for it and receive its result or its
+    error. Results are not kept once the call has finished, so this is no
+    cache.
+
+    Bulk workers and daemon threads share the coalescer of the process.
+
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """
+        @return: (Coalescer) the coalescer shared by the whole process
+
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        """
+        Replaces the coalescer shared by the whole process.
+
+        @return: (Coalescer) the new coalescer
+
+        """
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    def get_stats(self):
+        """
+        @return: (dict) number of calls run and of calls, which have been
+            answered by a call of another caller
+
+        """
+        with self.lock:
+            return dict(self.stats)
+
+    def call(self, key, func):
+        """
+        Runs `func`, unless a call of the same `key` is in flight already; in
+        that case its outcome is awaited instead.
+
+        @return: the return value of `func`
+
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.stats['calls'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+class _Call(object):
+    """
+    A call in flight and its outcome.
+
+    """
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import logging
+import threading
+import collections
+import socketserver
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lib.search.request import Request
+from lib.api import API
+from lib.doi import DOI
+from lib.daemonclient import DaemonClient
+from lib.coalescer import Coalescer
+
+class DaemonService(object):
+    """
+    Warm state of the daemon: requests with pooled connections, the loaded
+    registries of types and styles and an in-memory cache of recent
+    citations and download links.
+
+    """
+    MAX_ENTRIES = 10000
+
+    def __init__(self, cache=None, index=None, max_entries=MAX_ENTRIES,
+            index_lookups=False):
+        self.index = index
+        self.requests = {render: Request(cache=cache, render=render,
+            index=index, index_lookups=index_lookups) for render in
+            (Request.RENDER_LOCAL, Request.RENDER_REMOTE)}
+        api = API()
+        self.styles = api.get_valid_styles()
+        self.types = api.get_valid_types()
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def ping(self):
+        """
+        @return: (dict) status of the daemon and the number of requests sent
+            to the API and answered by identical requests in flight
+
+        """
+        stats = Coalescer.get_instance().get_stats()
+        return {'status': 'ok', 'requests': stats['calls'], 'coalesced':
+                stats['coalesced']}
+
+    def cite(self, doi, style='bibtex', render=Request.RENDER_REMOTE):
+        if style not in self.styles:
+            raise ValueError(self.styles.get_invalid_message(style, 'style'))
+        if render not in self.requests:
+            raise ValueError("Render mode {} is not supported.".format(
+                render))
+        req = self.requests[render]
+
+        def cite():
+            citation = req.citation(req.prepare_citation_query(doi),
+                    style=style)
+            return {'citation': citation, 'text': req.clean_citation(
+                citation)}
+        return self._memoize(('cite', DOI(doi).get_normalized_identifier(),
+            style, render), cite)
+
+    def search(self, query, sort='score', order='desc', year=None, type=None,
+            rows=20, offline=False, select=None):
+        """
+        Searches a single page of results. Harvests of all results are not
+        offered, since they are streamed page by page by the command itself.
+
+        """
+        if type is not None and type not in self.types:
+            raise ValueError(self.types.get_invalid_message(type, 'type'))
+
+        if offline:
+            if self.index is None:
+                raise ValueError("--offline requires the work index to be \
+enabled")
+            return {'items': self.index.search(query, sort, order, year, type,
+                rows)['items']}
+
+        req = self.requests[Request.RENDER_REMOTE]
+        prepared = req.prepare_search_query(query, sort, order, year, type,
+                rows, select.split(',') if select is not None else None)
+        return {'items': req.search(prepared).get('items', [])}
+
+    def get_download_links(self, doi):
+        req = self.requests[Request.RENDER_REMOTE]
+
+        def get_download_links():
+            return {'links': [{'url': link.get_url(), 'license':
+                link.get_license_url()} for link in
+                req.get_download_links(doi)]}
+        return self._memoize(('links', DOI(doi).get_normalized_identifier()),
+                get_download_links)
+
+    def _memoize(self, key, func):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        value = func()
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    """
+    Maps HTTP requests to the methods of `DaemonService`. Parameters are
+    given in the query string, responses are JSON.
+
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    ROUTES = {
+        '/ping'   : 'ping',
+        '/cite'   : 'cite',
+        '/search' : 'search',
+        '/links'  : 'get_download_links',
+    }
+    INT_PARAMS  = ('year', 'rows')
+    BOOL_PARAMS = ('offline',)
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        if parts.path not in self.ROUTES:
+            self._send(404, {'error': "Unknown path {}".format(parts.path)})
+            return
+
+        try:
+            params = self._get_params(parts.query)
+            result = getattr(self.server.service, self.ROUTES[parts.path])(
+                    **params)
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logging.error("Request {} failed: {}".format(self.path, e))
+            self._send(502, {'error': str(e)})
+            return
+        self._send(200, result)
+
+    def _get_params(self, query):
+        params = dict(urllib.parse.parse_qsl(query))
+        for key in self.INT_PARAMS:
+            if key in params:
+                params[key] = int(params[key])
+        for key in self.BOOL_PARAMS:
+            if key in params:
+                params[key] = params[key] not in ('0', 'false', '')
+        return params
+
+    def _send(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Daemon: " + format % args)
+
+class UnixDaemonHandler(DaemonHandler):
+    # TCP options do not apply to Unix sockets
+    disable_nagle_algorithm = False
+
+class UnixHTTPServer(socketserver.ThreadingMixIn,
+        socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # peers of Unix sockets have no address, but the request handler
+        # expects a host and a port
+        request, _ = super().get_request()
+        return request, ('local', 0)
+
+class Daemon(object):
+    """
+    Long-running process, which answers cite, search and link requests of
+    other doimgr calls via localhost HTTP or a Unix socket.
+
+    While running, its address is written to the address file, which is
+    used by `DaemonClient.find` to discover the daemon.
+
+    """
+    HOST = '127.0.0.1'
+
+    def __init__(self, service, host=HOST, port=0, socket_path=None,
+            address_file=DaemonClient.ADDRESS_FILE):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.socket_path = os.path.expanduser(socket_path) if socket_path \
+                is not None else None
+        self.address_file = os.path.expanduser(address_file)
+        self.server = None
+
+    def get_address(self):
+        """
+        @return: (dict) address of the daemon as written to the address file
+
+        """
+        address = {'pid': os.getpid()}
+        if self.socket_path is not None:
+            address['socket'] = self.socket_path
+        else:
+            address['host'], address['port'] = self.server.server_address[:2]
+        return address
+
+    def start(self):
+        if self.socket_path is not None:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.server = UnixHTTPServer(self.socket_path,
+                    UnixDaemonHandler)
+        else:
+            self.server = ThreadingHTTPServer((self.host, self.port),
+                    DaemonHandler)
+            self.server.daemon_threads = True
+        self.server.service = self.service
+
+        directory = os.path.dirname(self.address_file)
+        if directory != '' and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.address_file + '.tmp', 'w') as f:
+            json.dump(self.get_address(), f)
+        os.replace(self.address_file + '.tmp', self.address_file)
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.server_close()
+        self.server = None
+        try:
+            with open(self.address_file, 'r') as f:
+                owned = json.load(f).get('pid') == os.getpid()
+        except (OSError, ValueError):
+            owned = False
+        if owned:
+            os.remove(self.address_file)
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import socket
+import urllib.parse
+
+class DaemonClient(object):
+    """
+    Client of the daemon started with `doimgr serve`.
+
+    The address of a running daemon is read from its address file. Requests
+    are plain HTTP/1.0 over a socket, so loading the client is cheap compared
+    to the HTTP stack of the daemon.
+
+    Errors reported by the daemon are raised as `ValueError` for invalid
+    arguments and as `RuntimeError` otherwise. If the daemon cannot be
+    reached, `OSError` is raised. A daemon, which does not respond in time,
+    is busy rather than unavailable and reported as `RuntimeError`.
+
+    """
+    ADDRESS_FILE = os.path.join('~', '.doimgr', 'daemon.json')
+    TIMEOUT      = 60
+    BUFFER_SIZE  = 64 * 1024
+
+    @classmethod
+    def find(cls, address_file=ADDRESS_FILE):
+        """
+        @return: (DaemonClient) client of the running daemon or None if no
+            daemon is running
+
+        """
+        try:
+            with open(os.path.expanduser(address_file), 'r') as f:
+                address = json.load(f)
+            os.kill(address['pid'], 0)
+        except PermissionError:
+            # the process exists, but belongs to another user
+            pass
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cls(address)
+
+    def __init__(self, address, timeout=TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+
+    def ping(self):
+        return self._call('/ping', {})
+
+    def cite(self, identifier, style='bibtex', render='remote'):
+        """
+        @return: (dict) the raw `citation` and its plain `text`
+
+        """
+        return self._call('/cite', {'doi': identifier, 'style': style,
+            'render': render})
+
+    def search(self, query, sort='score', order='desc', year=None,
+            type_=None, rows=20, offline=False, select=None):
+        """
+        @return: (dict) message with the work JSON of a single page of results
+            as `items`
+
+        """
+        return self._call('/search', {'query': query, 'sort': sort, 'order':
+            order, 'year': year, 'type': type_, 'rows': rows, 'offline':
+            offline, 'select': ",".join(select) if select is not None else
+            None})
+
+    def get_download_links(self, identifier):
+        """
+        @return: (dict) the full text links as `links`, each with `url` and
+            `license`
+
+        """
+        return self._call('/links', {'doi': identifier})
+
+    def _call(self, path, params):
+        query = urllib.parse.urlencode({key: int(value) if
+            isinstance(value, bool) else value for key, value in
+            params.items() if value is not None})
+        request = "GET {}?{} HTTP/1.0\r\nHost: localhost\r\n\r\n".format(
+                path, query).encode('ascii')
+
+        if 'socket' in self.address:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            connection.connect(self.address['socket'])
+        else:
+            connection = socket.create_connection((self.address['host'],
+                self.address['port']), timeout=self.timeout)
+        with connection:
+            connection.sendall(request)
+            chunks = []
+            try:
+                while True:
+                    chunk = connection.recv(self.BUFFER_SIZE)
+                    if not chunk: break
+                    chunks.append(chunk)
+            except socket.timeout:
+                raise RuntimeError("The daemon did not respond within {} \
+seconds".format(self.timeout))
+
+        head, _, body = b''.join(chunks).partition(b'\r\n\r\n')
+        try:
+            status = int(head.split(b' ', 2)[1])
+            content = json.loads(body.decode('utf-8'))
+        except (IndexError, ValueError):
+            raise RuntimeError("Invalid response of the daemon")
+        if status == 200:
+            return content
+        if status == 400:
+            raise ValueError(content.get('error'))
+        raise RuntimeError(content.get('error', "The daemon responded with \
+code {:d}".format(status)))
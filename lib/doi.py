@@ -9,16 +9,20 @@ class DOI(object):
     """
     URL_PROTOCOL = "http"
     URL_DOMAIN   = "dx.doi.org"
+    URL_PREFIX   = "{}://{}/".format(URL_PROTOCOL, URL_DOMAIN)
 
     UNKNOWN_IDENTIFIER = 'unknown_identifier'
 
+    REGEX_DOI = re.compile(r"(http\:\/\/dx\.doi\.org/)?10\.[\d\.]+(/*)?")
+
+    # DOIs are created for every search result, so they are kept small
+    __slots__ = ('identifier',)
+
     def __init__(self, identifier=None):
         self.identifier = self.UNKNOWN_IDENTIFIER
-        self.url = None
 
         if identifier is not None:
             self.identifier = self.__parse_DOI_identifier(identifier)
-            self.url = self.__generate_DOI_URL(self.identifier)
 
     def __parse_DOI_identifier(self, identifier):
         if not self.__is_valid_doi(identifier):
@@ -26,20 +30,24 @@ class DOI(object):
 {}".format(identifier))
         if identifier.startswith("http"):
             #raise DOIError("DOI identifier cannot be URLs!")
-            return identifier[len("{}://{}/".format(self.URL_PROTOCOL, \
-                self.URL_DOMAIN)):]
+            return identifier[len(self.URL_PREFIX):]
         return identifier
 
     def __is_valid_doi(self, identifier):
-        regex = re.compile("(http\:\/\/dx\.doi\.org/)?10\.[\d\.]+(/*)?")
-        return regex.match(identifier) is not None
-
-    def __generate_DOI_URL(self, identifier):
-        return "{}://{}/{}".format(self.URL_PROTOCOL, self.URL_DOMAIN, \
-                identifier)
+        return self.REGEX_DOI.match(identifier) is not None
 
     def get_URL(self):
-        return self.url
+        if self.identifier == self.UNKNOWN_IDENTIFIER:
+            return None
+        return self.URL_PREFIX + self.identifier
 
     def get_identifier(self):
         return self.identifier
+
+    def get_normalized_identifier(self):
+        """
+        DOIs are case insensitive, so the lower-cased identifier can be used
+        to compare or look up DOIs.
+
+        """
+        return self.identifier.lower()
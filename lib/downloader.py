@@ -1,34 +1,232 @@
 import sys
 import os
-import httplib2
-import urllib.request as urllib2
+import re
+import email.message
+import http.client
 import logging
+import collections
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from lib.transport import Transport
+from lib.profiler import Profiler
 
 class Downloader(object):
-    def __init__(self):
+    """
+    Downloads files in chunks using the shared transport.
+
+    Files are written to a temporary `.part` file, which is renamed once the
+    download is complete. If a `.part` file is found, the download is resumed
+    from its end using a HTTP range request, so interrupted downloads do not
+    start over again. Unless `server_filenames` is disabled, the file is
+    named as proposed by the server.
+
+    """
+    CHUNK_SIZE     = 64 * 1024
+    MAX_ATTEMPTS   = 3
+    PART_EXTENSION = '.part'
+    # jobs read ahead of the running downloads per worker, and at most while
+    # the jobs read ahead are all waiting for busy hosts
+    LOOKAHEAD      = 2
+    MAX_LOOKAHEAD  = 32
+
+    REGEX_CONTENT_RANGE = re.compile(r'^bytes (\d+)-\d+/(\d+|\*)$')
+
+    def __init__(self, chunk_size=CHUNK_SIZE, server_filenames=True):
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be at least 1 byte.")
         self.filepath = None
+        self.chunk_size = chunk_size
+        self.server_filenames = server_filenames
 
     def get_filepath(self):
         return self.filepath
 
     def download(self, url, path, fallback_filename):
+        """
+        Downloads `url` into the directory `path`. The filename is taken from
+        the server response or `fallback_filename` otherwise, or always if
+        `server_filenames` is disabled.
+
+        @return: (str) path of the downloaded file or None on failure
+
+        """
+        with Profiler.get_instance().measure('download', url=url):
+            return self._download(url, path, fallback_filename)
+
+    def _download(self, url, path, fallback_filename):
         logging.debug("Downloading URL {}".format(url))
-        try:
-            remotefile = urllib2.urlopen(url)
-        except URLError:
-            logging.error("URL could not be opened. Aborting.")
-            return None
-        filename = remotefile.info()['Content-Disposition']
-        if filename is None:
-            filename = fallback_filename
-        logging.debug("Filename is {}".format(filename))
-
-        self.filepath = os.path.join(path, filename)
-        CHUNK = 16 * 1024
-        with open(self.filepath, "wb") as fp:
+        partpath = os.path.join(path, fallback_filename + self.PART_EXTENSION)
+
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                filename = self._download_part(url, partpath)
+            except (OSError, ValueError, RuntimeError,
+                    http.client.HTTPException) as e:
+                logging.error("Download of URL {} failed in attempt {:d}: \
+{}".format(url, attempt, e))
+                continue
+            if filename is None:
+                return None
+            if filename == '' or not self.server_filenames:
+                filename = fallback_filename
+            logging.debug("Filename is {}".format(filename))
+
+            self.filepath = os.path.join(path, filename)
+            os.replace(partpath, self.filepath)
+            return self.filepath
+
+        logging.error("URL could not be downloaded. Aborting.")
+        return None
+
+    def download_all(self, jobs, workers=4, per_host=None):
+        """
+        Downloads several files in parallel, see `download_iter`.
+
+        @return: (list) paths of the downloaded files in the order of the jobs;
+            failed downloads are None
+
+        """
+        jobs = list(jobs)
+        filepaths = {}
+        for entry, filepath in self.download_iter(enumerate(jobs), workers,
+                per_host, job=lambda entry: entry[1]):
+            filepaths[entry[0]] = filepath
+        return [filepaths[i] for i in range(len(jobs))]
+
+    def download_iter(self, jobs, workers=4, per_host=None, job=None,
+            server_filenames=True):
+        """
+        Downloads several files in parallel. Every job is a tuple of the
+        arguments of `download`; if `job` is given, it is called to get these
+        arguments from an entry of `jobs`. With `server_filenames` disabled,
+        files are always saved under the filename of their job.
+
+        Jobs are consumed lazily. At most `workers` files are downloaded at
+        the same time and at most `per_host` of them from the same host. If
+        all jobs read ahead are waiting for busy hosts while workers are idle,
+        further jobs are read, so jobs of other hosts are not held up.
+
+        @return: (generator) tuples of the entry and the path of the
+            downloaded file, or None on failure, in order of completion
+
+        """
+        if workers < 1:
+            raise ValueError("Number of workers must be at least 1.")
+        if per_host is not None and per_host < 1:
+            raise ValueError("Number of downloads per host must be at least \
+1.")
+        if job is None:
+            job = lambda entry: entry
+        download = lambda entry: type(self)(self.chunk_size,
+                server_filenames).download(*job(entry))
+
+        entries = iter(jobs)
+        exhausted = False
+        waiting = collections.OrderedDict()
+        num_waiting = 0
+        active = {}
+        active_hosts = collections.Counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
             while True:
-                chunk = remotefile.read(CHUNK)
-                if not chunk: break
-                fp.write(chunk)
+                # only read a few jobs ahead of the running downloads, unless
+                # the jobs read are held up by busy hosts
+                startable = sum(self._get_startable(len(queue),
+                    active_hosts[host], per_host) for host, queue in
+                    waiting.items())
+                while not exhausted and (num_waiting < self.LOOKAHEAD *
+                        workers or (len(active) + startable < workers and
+                        num_waiting < self.MAX_LOOKAHEAD * workers)):
+                    try:
+                        entry = next(entries)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    host = urllib.parse.urlsplit(job(entry)[0]).netloc
+                    queue = waiting.setdefault(host, collections.deque())
+                    queue.append(entry)
+                    num_waiting += 1
+                    startable += self._get_startable(len(queue),
+                            active_hosts[host], per_host) - \
+                            self._get_startable(len(queue) - 1,
+                            active_hosts[host], per_host)
 
-        return self.filepath
+                for host in list(waiting.keys()):
+                    queue = waiting[host]
+                    while len(queue) > 0 and len(active) < workers and \
+                            (per_host is None or active_hosts[host] < per_host):
+                        entry = queue.popleft()
+                        num_waiting -= 1
+                        active[executor.submit(download, entry)] = \
+                                (entry, host)
+                        active_hosts[host] += 1
+                    if len(queue) == 0:
+                        del waiting[host]
+
+                if len(active) == 0:
+                    if exhausted and num_waiting == 0:
+                        break
+                    continue
+
+                done, _ = wait(active.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry, host = active.pop(future)
+                    active_hosts[host] -= 1
+                    yield (entry, future.result())
+
+    def _get_startable(self, queued, active, per_host):
+        """
+        @return: (int) number of `queued` jobs of a host, which can be
+            started while `active` downloads of it are running
+
+        """
+        if per_host is None:
+            return queued
+        return max(0, min(queued, per_host - active))
+
+    def _download_part(self, url, partpath):
+        """
+        Continues the download into the part file.
+
+        @return: (str) filename proposed by the server, an empty string if
+            there is none, or None if the server refused the download
+
+        """
+        offset = os.path.getsize(partpath) if os.path.isfile(partpath) else 0
+        headers = {}
+        if offset > 0:
+            headers['Range'] = 'bytes={:d}-'.format(offset)
+            logging.debug("Resuming download at byte {:d}".format(offset))
+
+        transport = Transport.get_instance()
+        with transport.open(url, headers=headers) as remotefile:
+            if remotefile.status == 416 and offset > 0:
+                # the part file is already complete
+                return self._get_filename(remotefile)
+            if remotefile.status == 206:
+                match = self.REGEX_CONTENT_RANGE.match(
+                        remotefile.get_header('Content-Range', ''))
+                if match is None or int(match.group(1)) != offset:
+                    raise ValueError("Unexpected range in response")
+                mode = "ab"
+            elif remotefile.status == 200:
+                mode = "wb"
+            else:
+                logging.error("The server responded with code {:d}. \
+Aborting.".format(remotefile.status))
+                return None
+
+            with open(partpath, mode) as fp:
+                while True:
+                    chunk = remotefile.read(self.chunk_size)
+                    if not chunk: break
+                    fp.write(chunk)
+            return self._get_filename(remotefile)
+
+    def _get_filename(self, remotefile):
+        header = remotefile.get_header('Content-Disposition')
+        if header is None:
+            return ''
+        message = email.message.Message()
+        message['Content-Disposition'] = header
+        return os.path.basename(message.get_filename() or '')
@@ -0,0 +1,167 @@
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+from lib.index import WorkIndex
+
+def parse_records(task):
+    """
+    Parses the records of a task into rows of the work index. Runs in a
+    worker process.
+
+    @return: (tuple) rows and number of skipped records
+
+    """
+    kind, payload = task
+    if kind == DumpImporter.TASK_FILE:
+        with DumpImporter.open_file(payload) as f:
+            content = json.load(f)
+        records = content.get('items', ()) if isinstance(content, dict) else \
+                content
+    else:
+        records = []
+        for line in payload:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+
+    rows = []
+    skipped = 0
+    for record in records:
+        row = WorkIndex.get_row(record) if isinstance(record, dict) else None
+        if row is None:
+            skipped += 1
+        else:
+            rows.append(row)
+    return rows, skipped
+
+class DumpImporter(object):
+    """
+    Imports Crossref metadata dumps into the work index.
+
+    A dump is a single file or a directory of files. Files may be gzipped and
+    contain either one JSON record per line (`.jsonl`) or a JSON object with
+    the records as `items` (`.json`), like the public Crossref snapshot.
+
+    Lines of JSONL files are streamed in chunks, JSON files are handed to the
+    workers as a whole, so the memory use only depends on the chunk size and
+    the size of the single files. Records are parsed by a pool of processes
+    and written to the index by the main process.
+
+    """
+    CHUNK_SIZE = 1000
+    EXTENSIONS = ('.json', '.jsonl', '.json.gz', '.jsonl.gz')
+
+    TASK_FILE  = 'file'
+    TASK_LINES = 'lines'
+
+    def __init__(self, index, workers=None, chunk_size=CHUNK_SIZE):
+        if workers is not None and workers < 1:
+            raise ValueError("Number of workers must be at least 1.")
+        self.index = index
+        self.workers = workers if workers is not None else \
+                (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.stats = {}
+
+    def get_stats(self):
+        """
+        @return: (dict) number of records, imported and skipped records,
+            duration in seconds and import rate in records per second of the
+            last run
+
+        """
+        return self.stats
+
+    def run(self, path):
+        """
+        Imports all records of the dump at `path`.
+
+        @return: (int) number of imported works
+
+        """
+        files = self.get_files(path)
+        if len(files) == 0:
+            raise ValueError("No dump files found at {}".format(path))
+        self.stats = {'files': len(files), 'records': 0, 'imported': 0,
+                'skipped': 0, 'seconds': 0.0, 'rate': 0.0}
+        start = time.perf_counter()
+
+        tasks = self._get_tasks(files)
+        if self.workers == 1:
+            self._write_all(map(parse_records, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                self._write_all(self._map_bounded(executor, tasks))
+
+        seconds = time.perf_counter() - start
+        self.stats['seconds'] = seconds
+        self.stats['rate'] = self.stats['records'] / seconds if seconds > 0 \
+                else 0.0
+        return self.stats['imported']
+
+    def get_files(self, path):
+        """
+        @return: (list) sorted paths of all dump files at `path`
+
+        """
+        if os.path.isfile(path):
+            return [path]
+        files = []
+        for root, _, names in os.walk(path):
+            for name in names:
+                if name.endswith(self.EXTENSIONS):
+                    files.append(os.path.join(root, name))
+        return sorted(files)
+
+    @staticmethod
+    def open_file(path):
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8')
+        return open(path, 'r', encoding='utf-8')
+
+    def _get_tasks(self, files):
+        for path in files:
+            if not path.endswith(('.jsonl', '.jsonl.gz')):
+                yield (self.TASK_FILE, path)
+                continue
+            with self.open_file(path) as f:
+                lines = []
+                for line in f:
+                    if len(line.strip()) == 0:
+                        continue
+                    lines.append(line)
+                    if len(lines) >= self.chunk_size:
+                        yield (self.TASK_LINES, lines)
+                        lines = []
+                if len(lines) > 0:
+                    yield (self.TASK_LINES, lines)
+
+    def _map_bounded(self, executor, tasks):
+        """
+        Like `executor.map`, but only keeps a few pending tasks per worker in
+        memory instead of consuming the whole dump upfront.
+
+        """
+        pending = collections.deque()
+        for task in tasks:
+            if len(pending) >= 2 * self.workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(parse_records, task))
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+    def _write_all(self, results):
+        for rows, skipped in results:
+            self.index.add_rows(rows)
+            self.stats['records'] += len(rows) + skipped
+            self.stats['imported'] += len(rows)
+            self.stats['skipped'] += skipped
+            logging.debug("Imported {:d} records".format(
+                self.stats['records']))
@@ -4,21 +4,56 @@ import sys
 from lib.validator import Validator
 
 class Filters(object):
+    """
+    List of filters for queries to the works endpoint. A key can be added
+    several times; the API combines different keys with AND and repeated keys
+    with OR semantics.
 
-    def __init__(self):
-        self.filters = {}
+    """
+
+    def __init__(self, validator=None):
+        self.validator = validator if validator is not None else Validator()
+        self.filters = []
 
     def add(self, key, value):
-        v = Validator()
-        if not v.is_valid(key, value):
+        if not self.validator.is_valid(key, value):
             raise ValueError("Formatting for key {} is not valid.".format(key))
-        self.filters[key] = value
+        self.filters.append((key, value))
+        return self.filters
+
+    def add_all(self, filters):
+        """
+        Adds many filters at once. `filters` is either a mapping of keys to a
+        value or a list of values, which adds the key repeatedly, or an
+        iterable of (key, value) tuples. If any filter is invalid, a
+        `ValueError` is raised and none of them is added.
+
+        @return: (list) all filters
+
+        """
+        if hasattr(filters, 'items'):
+            pairs = []
+            for key, value in filters.items():
+                if isinstance(value, (list, tuple, set, frozenset)):
+                    pairs.extend((key, v) for v in value)
+                else:
+                    pairs.append((key, value))
+        else:
+            pairs = list(filters)
+        self.validator.validate_all(pairs)
+        self.filters.extend(pairs)
         return self.filters
 
     def get_filters(self):
         return self.filters
 
     def get_formatted_filters(self):
-        return ",".join(["{}:{}".format(key, value) for key, value in
-            self.filters.items()])
+        return ",".join(["{}:{}".format(key, self.format_value(value)) for
+            key, value in self.filters])
 
+    @staticmethod
+    def format_value(value):
+        # the API expects lower case booleans
+        if type(value) is bool:
+            return 'true' if value else 'false'
+        return value
@@ -1,10 +1,14 @@
 import os
 import sys
-from colorama import Fore
+import math
 
 class Helper(object):
     @staticmethod
     def get_fg_colorcode_by_identifier(identifier):
+        # colorama is only needed for colored output, so it is not loaded on
+        # startup
+        from colorama import Fore
+
         if identifier == 'black':
             return Fore.BLACK
         elif identifier == 'cyan':
@@ -24,3 +28,16 @@ class Helper(object):
         elif identifier == 'reset':
             return Fore.RESET
         raise ValueError("Color identifier {} is unknown.".format(identifier))
+
+    @staticmethod
+    def percentile(values, p):
+        """
+        @return: (float) the `p`-th percentile (nearest rank) of `values` or
+            None if there are no values
+
+        """
+        if len(values) == 0:
+            return None
+        values = sorted(values)
+        rank = max(1, int(math.ceil(p / 100. * len(values))))
+        return values[min(rank, len(values)) - 1]
@@ -0,0 +1,276 @@
+import os
+import sys
+import re
+import json
+import logging
+import sqlite3
+import threading
+
+from lib.search.result import SearchResult
+
+class WorkIndex(object):
+    """
+    Local full-text index of the works seen in API responses, which allows
+    searching without network access.
+
+    Works are stored in SQLite together with a FTS5 index over their title,
+    authors and publisher. Searches take the same options as
+    `Request.prepare_search_query`; relevance is ranked by BM25 instead of
+    the score of the API.
+
+    Search results, which only contain some fields of the works, can be
+    indexed as long as they contain all `FIELDS`. They update the fields of
+    works already stored and are never returned by `get_work`, which only
+    returns complete records.
+
+    """
+    DEFAULT_PATH = os.path.join('~', '.doimgr', 'index.sqlite')
+
+    # columns used for sorting, see `Request.prepare_search_query`; the API
+    # treats `updated` the same as `deposited`
+    SORT_COLUMNS = {
+        'score'     : 'score',
+        'updated'   : 'deposited',
+        'deposited' : 'deposited',
+        'indexed'   : 'indexed',
+        'published' : 'published',
+    }
+
+    # fields of the work JSON, which are read to index a work
+    FIELDS = ('author', 'deposited', 'indexed', 'issued', 'published-online',
+            'published-print', 'publisher', 'title', 'type', 'URL')
+
+    REGEX_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = os.path.expanduser(path)
+        self.lock = threading.Lock()
+        self.db = None
+
+    def add_work(self, work):
+        return self.add_works([work])
+
+    @classmethod
+    def is_indexable(cls, fields):
+        """
+        @return: (bool) True if works reduced to the given `fields` can be
+            indexed
+
+        """
+        return set(cls.FIELDS).issubset(fields)
+
+    def add_works(self, works, complete=True):
+        """
+        Adds or updates the given works. Works without a valid DOI are
+        skipped. Unless `complete` is set, the works only contain some of
+        their fields, see `is_indexable`.
+
+        @return: (int) number of added or updated works
+
+        """
+        rows = []
+        for work in works:
+            row = self.get_row(work)
+            if row is not None:
+                rows.append(row)
+        return self.add_rows(rows, complete)
+
+    def add_rows(self, rows, complete=True):
+        """
+        Adds or updates works given as rows, see `get_row` and `add_works`.
+
+        @return: (int) number of added or updated works
+
+        """
+        if len(rows) == 0:
+            return 0
+        with self.lock:
+            db = self._get_db()
+            with db:
+                db.execute("BEGIN")
+                for row in rows:
+                    self._upsert(db, row, complete)
+        return len(rows)
+
+    def get_work(self, doi):
+        """
+        @return: (dict) work JSON of the normalized `doi` or None if it is not
+            indexed as a complete record
+
+        """
+        with self.lock:
+            row = self._get_db().execute("SELECT work FROM works WHERE \
+doi = ? AND complete", (doi,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def search(self, string, sort='score', order='desc', year=None,
+            type_=None, rows=20, offset=0):
+        """
+        Searches the indexed works. `year` selects works published in or
+        after the given year. With `rows` set to None, all matching works are
+        returned.
+
+        @return: (dict) message like the one of the API with the matching
+            works as `items` and their number as `total-results`
+
+        """
+        if sort not in self.SORT_COLUMNS:
+            raise ValueError("Sort method not supported. Valid values are: \
+{}".format(", ".join(self.SORT_COLUMNS.keys())))
+        if order not in ('asc', 'desc'):
+            raise ValueError("Order method not supported. Valid values are: \
+asc, desc")
+
+        where = []
+        params = []
+        tokens = self.REGEX_TOKEN.findall(string.lower())
+        if len(tokens) > 0:
+            where.append("works_fts MATCH ?")
+            params.append(" OR ".join('"{}"'.format(t) for t in tokens))
+        if year is not None:
+            where.append("works.year >= ?")
+            params.append(int(year))
+        if type_ is not None:
+            where.append("works.type = ?")
+            params.append(type_)
+        condition = " AND ".join(where) if len(where) > 0 else "1"
+
+        # bm25() is lower for better matches
+        score = "-bm25(works_fts)" if len(tokens) > 0 else "0.0"
+        column = self.SORT_COLUMNS[sort]
+        if column == 'score':
+            column = score
+
+        query = "SELECT works.work, {score} FROM works_fts JOIN works ON \
+works.id = works_fts.rowid WHERE {condition} ORDER BY {column} {order}, \
+works.id ASC".format(score=score, condition=condition, column=column,
+            order=order.upper())
+        if rows is not None:
+            query += " LIMIT {:d} OFFSET {:d}".format(int(rows), int(offset))
+
+        with self.lock:
+            db = self._get_db()
+            total, = db.execute("SELECT COUNT(*) FROM works_fts JOIN works ON \
+works.id = works_fts.rowid WHERE {}".format(condition), params).fetchone()
+            results = db.execute(query, params).fetchall()
+
+        items = []
+        for work, rank in results:
+            work = json.loads(work)
+            work['score'] = rank
+            items.append(work)
+        return {'total-results': total, 'items': items}
+
+    def get_stats(self):
+        """
+        @return: (dict) path and number of indexed works
+
+        """
+        with self.lock:
+            works, = self._get_db().execute("SELECT COUNT(*) FROM works")\
+                    .fetchone()
+        return {'path': self.path, 'works': works}
+
+    def purge(self):
+        """
+        Removes all works from the index.
+
+        @return: (int) number of removed works
+
+        """
+        with self.lock:
+            db = self._get_db()
+            with db:
+                db.execute("BEGIN")
+                db.execute("DELETE FROM works_fts")
+                return db.execute("DELETE FROM works").rowcount
+
+    @classmethod
+    def get_row(cls, work):
+        """
+        Extracts the indexed fields of a work using the logic of
+        `SearchResult`. This does not access the index, so rows can be
+        prepared in other processes.
+
+        @return: (tuple) row of the works table or None if the work has no
+            valid DOI
+
+        """
+        try:
+            sr = SearchResult(work)
+        except (ValueError, TypeError, AttributeError):
+            return None
+        if sr.get_doi().get_identifier() == sr.get_doi().UNKNOWN_IDENTIFIER:
+            return None
+        doi = sr.get_doi().get_normalized_identifier()
+        year = sr.get_year()
+        return (doi, sr.get_title(), sr.get_authors(), sr.get_type(),
+                sr.get_publisher() or '',
+                year if year != sr.UNKNOWN_YEAR else None,
+                cls._get_date(work), cls._get_timestamp(work, 'deposited'),
+                cls._get_timestamp(work, 'indexed'), json.dumps(work))
+
+    @staticmethod
+    def _get_date(work):
+        # dates are stored as YYYYMMDD to sort by publication date
+        for key in ('published-print', 'published-online', 'issued'):
+            try:
+                parts = list(work[key]['date-parts'][0]) + [1, 1]
+                return int(parts[0]) * 10000 + int(parts[1]) * 100 + \
+                        int(parts[2])
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+        return None
+
+    @staticmethod
+    def _get_timestamp(work, key):
+        try:
+            return work[key]['timestamp']
+        except (KeyError, TypeError):
+            return None
+
+    def _upsert(self, db, row, complete=True):
+        doi, title, authors, type_, publisher = row[:5]
+        existing = db.execute("SELECT id, work, complete FROM works WHERE \
+doi = ?", (doi,)).fetchone()
+        if existing is not None:
+            id_ = existing[0]
+            if not complete:
+                # keep the fields, which have not been selected
+                work = json.loads(existing[1])
+                work.update(json.loads(row[-1]))
+                row = row[:-1] + (json.dumps(work),)
+                complete = existing[2]
+            db.execute("DELETE FROM works_fts WHERE rowid = ?", (id_,))
+            db.execute("UPDATE works SET title = ?, authors = ?, type = ?, \
+publisher = ?, year = ?, published = ?, deposited = ?, indexed = ?, work = ?, \
+complete = ? WHERE id = ?", row[1:] + (int(complete), id_))
+        else:
+            id_ = db.execute("INSERT INTO works (doi, title, authors, type, \
+publisher, year, published, deposited, indexed, work, complete) VALUES (?, ?, \
+?, ?, ?, ?, ?, ?, ?, ?, ?)", row + (int(complete),)).lastrowid
+        db.execute("INSERT INTO works_fts (rowid, title, authors, publisher) \
+VALUES (?, ?, ?, ?)", (id_, title, authors, publisher))
+
+    def _get_db(self):
+        if self.db is None:
+            directory = os.path.dirname(self.path)
+            if directory != '' and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.db = sqlite3.connect(self.path, isolation_level=None,
+                    check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode = WAL")
+            self.db.execute("PRAGMA synchronous = NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS works (id INTEGER \
+PRIMARY KEY, doi TEXT UNIQUE, title TEXT, authors TEXT, type TEXT, publisher \
+TEXT, year INTEGER, published INTEGER, deposited INTEGER, indexed INTEGER, \
+work TEXT, complete INTEGER NOT NULL DEFAULT 1)")
+            columns = [column[1] for column in self.db.execute(
+                "PRAGMA table_info(works)")]
+            if 'complete' not in columns:
+                # indexes created before partial works were indexed
+                self.db.execute("ALTER TABLE works ADD COLUMN complete \
+INTEGER NOT NULL DEFAULT 1")
+            self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS works_fts \
+USING fts5(title, authors, publisher)")
+        return self.db
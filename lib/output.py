@@ -0,0 +1,146 @@
+import os
+import sys
+import csv
+import json
+
+from lib.search.result import SearchResultPage
+
+class SearchResultWriter(object):
+    """
+    Writes search results in a machine readable format, one record per
+    result. Results are written as they arrive, so streamed searches can be
+    piped into other tools while later pages are still loading.
+
+    Use `get_writer` to create the writer of a format.
+
+    """
+    FIELDS = ('doi', 'score', 'year', 'title', 'authors', 'type', 'publisher',
+            'url')
+
+    def __init__(self, out_):
+        self.out = out_
+
+    @classmethod
+    def get_writer(cls, format_, out_):
+        """
+        @return: (SearchResultWriter) writer of `format_` writing to `out_`
+
+        """
+        if format_ not in FORMATS:
+            raise ValueError("Format {} is not supported. Valid formats are: \
+{}".format(format_, ", ".join(FORMATS)))
+        return FORMATS[format_](out_)
+
+    def write_all(self, content):
+        """
+        Writes all results of `content`, which is either a single response of
+        the API or a stream of SearchResult objects.
+
+        @return: (int) number of written results
+
+        """
+        if isinstance(content, dict):
+            content = SearchResultPage.from_message(content)
+        written = 0
+        for sr in content:
+            self.write(sr)
+            written += 1
+        self.out.flush()
+        return written
+
+    def write(self, sr):
+        raise NotImplementedError()
+
+    def get_values(self, sr):
+        """
+        @return: (tuple) values of `FIELDS` as given by the API, so the title
+            is not reformatted and the authors are a list of all names;
+            unknown values are None
+
+        """
+        year = sr.get_year()
+        return (sr.get_doi().get_identifier(), sr.get_score(),
+                year if year != sr.UNKNOWN_YEAR else None, sr.get_raw_title(),
+                sr.get_author_names(), sr.get_type(), sr.get_publisher(),
+                sr.get_url())
+
+    def get_flat_values(self, sr):
+        """
+        @return: (tuple) values of `FIELDS` like `get_values`, but lists of
+            names are joined by `; `
+
+        """
+        return tuple("; ".join(value) if isinstance(value, list) else value
+                for value in self.get_values(sr))
+
+class NDJSONWriter(SearchResultWriter):
+    """
+    Writes every result as JSON object on a line of its own.
+
+    """
+    def write(self, sr):
+        self.out.write(json.dumps(dict(zip(self.FIELDS, self.get_values(sr))),
+            ensure_ascii=False))
+        self.out.write("\n")
+
+class CSVWriter(SearchResultWriter):
+    """
+    Writes the results as CSV with a header row. Values are quoted where
+    necessary, unknown values are left empty.
+
+    """
+    DELIMITER = ','
+
+    def __init__(self, out_):
+        super().__init__(out_)
+        self.writer = csv.writer(out_, delimiter=self.DELIMITER,
+                lineterminator="\n")
+        self.writer.writerow(self.FIELDS)
+
+    def write(self, sr):
+        self.writer.writerow(self.get_flat_values(sr))
+
+class TSVWriter(SearchResultWriter):
+    """
+    Writes the results as tab separated values with a header row. Tabs, line
+    breaks and backslashes within values are escaped as `\\t`, `\\n`, `\\r`
+    and `\\\\`, so every result stays on a single line.
+
+    """
+    ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n',
+        '\r': '\\r'})
+
+    def __init__(self, out_):
+        super().__init__(out_)
+        self.out.write("\t".join(self.FIELDS) + "\n")
+
+    def write(self, sr):
+        self.out.write("\t".join('' if value is None else
+            str(value).translate(self.ESCAPES) for value in
+            self.get_flat_values(sr)) + "\n")
+
+FORMATS = {
+    'ndjson' : NDJSONWriter,
+    'csv'    : CSVWriter,
+    'tsv'    : TSVWriter,
+}
+
+def format_bulk_record(identifier, style, result, error, seconds,
+        duplicate=False):
+    """
+    @return: (str) NDJSON line of a converted DOI of a bulk run with its
+        `status`, the citation or the error and the time spent in seconds; a
+        `duplicate` DOI has neither citation nor error
+
+    """
+    if duplicate:
+        status = 'duplicate'
+    else:
+        status = 'ok' if error is None else 'error'
+    record = {'doi': identifier, 'style': style, 'status': status,
+            'seconds': round(seconds, 6)}
+    if status == 'ok':
+        record['citation'] = result
+    elif status == 'error':
+        record['error'] = error
+    return json.dumps(record, ensure_ascii=False) + "\n"
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import threading
+
+from lib.helper import Helper
+
+class Timer(object):
+    """
+    Measures the duration of a `with` block and records it in the profiler.
+
+    """
+    def __init__(self, profiler, phase, fields):
+        self.profiler = profiler
+        self.phase = phase
+        self.fields = fields
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.record(self.phase, time.perf_counter() - self.start,
+                **self.fields)
+
+class NullTimer(object):
+    """
+    Stands in for `Timer` while profiling is disabled, so timing hooks do not
+    cost more than a method call.
+
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+class Profiler(object):
+    """
+    Collects the durations of the phases of requests, parsing and downloads.
+
+    Phases are timed with `measure`, which does nothing unless the profiler
+    is enabled. The report contains the number of measurements, the total
+    time and the p50/p95/p99 durations per phase. If a metrics file is given,
+    every measurement is also written to it as a line of JSON.
+
+    """
+    PERCENTILES = (50, 95, 99)
+
+    _instance = None
+    _instance_lock = threading.Lock()
+    _null_timer = NullTimer()
+
+    @classmethod
+    def get_instance(cls):
+        """
+        @return: (Profiler) the profiler shared by the whole process
+
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        """
+        Replaces the profiler shared by the whole process.
+
+        @return: (Profiler) the new profiler
+
+        """
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    def __init__(self, enabled=False, metrics=None):
+        self.enabled = enabled or metrics is not None
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.durations = {}
+
+    def is_enabled(self):
+        return self.enabled
+
+    def measure(self, phase, **fields):
+        """
+        @return: (Timer) context manager, which records the duration of the
+            block as `phase`; additional `fields` go to the metrics file
+
+        """
+        if not self.enabled:
+            return self._null_timer
+        return Timer(self, phase, fields)
+
+    def record(self, phase, seconds, **fields):
+        with self.lock:
+            self.durations.setdefault(phase, []).append(seconds)
+            if self.metrics is not None:
+                fields.update({'time': time.time(), 'phase': phase,
+                    'duration_ms': seconds * 1000})
+                self.metrics.write(json.dumps(fields) + "\n")
+
+    def get_report(self):
+        """
+        @return: (dict) count, total and percentiles in seconds per phase
+
+        """
+        report = {}
+        with self.lock:
+            for phase, durations in self.durations.items():
+                report[phase] = {'count': len(durations), 'total':
+                        sum(durations)}
+                for p in self.PERCENTILES:
+                    report[phase]['p{:d}'.format(p)] = Helper.percentile(
+                            durations, p)
+        return report
+
+    def format_report(self):
+        """
+        @return: (str) table of the report with durations in milliseconds
+
+        """
+        lines = ["{:24} {:>7} {:>10} {:>9} {:>9} {:>9}".format('phase',
+            'count', 'total ms', 'p50 ms', 'p95 ms', 'p99 ms')]
+        for phase, stats in sorted(self.get_report().items()):
+            lines.append("{:24} {:7d} {:10.2f} {:9.2f} {:9.2f} {:9.2f}".format(
+                phase, stats['count'], stats['total'] * 1000,
+                stats['p50'] * 1000, stats['p95'] * 1000,
+                stats['p99'] * 1000))
+        return "\n".join(lines)
@@ -0,0 +1,280 @@
+import os
+import sys
+import re
+import time
+import logging
+import threading
+import collections
+
+class RateLimiter(object):
+    """
+    Client side rate limiter for the API, which is shared by all requests of
+    the process.
+
+    Requests are paced by a token bucket. The rate is taken from the
+    `X-Rate-Limit-Limit` and `X-Rate-Limit-Interval` headers of the API
+    responses. The number of requests in flight is derived from the rate and
+    the observed latency, so parallel workers use the permitted throughput
+    without exceeding it. If the API answers with code 429 anyway, the bucket
+    is emptied and requests pause for one interval.
+
+    `reserve` does not block, so the limiter can be used from code which has
+    to wait by other means than sleeping; `acquire_async` waits for a slot
+    and the rate limit in a coroutine.
+
+    """
+    DEFAULT_LIMIT    = 50
+    DEFAULT_INTERVAL = 1.0
+    LATENCY_WEIGHT   = 0.2
+
+    HEADER_LIMIT    = 'x-rate-limit-limit'
+    HEADER_INTERVAL = 'x-rate-limit-interval'
+
+    REGEX_INTERVAL = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*$')
+    INTERVAL_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """
+        @return: (RateLimiter) the rate limiter shared by the whole process
+
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        """
+        Replaces the rate limiter shared by the whole process.
+
+        @return: (RateLimiter) the new rate limiter
+
+        """
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    def __init__(self, limit=DEFAULT_LIMIT, interval=DEFAULT_INTERVAL,
+            clock=time.monotonic):
+        if limit < 1 or interval <= 0:
+            raise ValueError("Rate limit must allow at least one request per \
+interval.")
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.limit = limit
+        self.interval = interval
+        self.tokens = float(limit)
+        self.updated = clock()
+        self.latency = None
+        self.in_flight = 0
+        self.max_in_flight = limit
+        self.waiters = collections.deque()
+        self.stats = {'requests': 0, 'throttled': 0, 'waited': 0.0}
+
+    def get_rate(self):
+        """
+        @return: (float) permitted requests per second
+
+        """
+        return self.limit / self.interval
+
+    def get_max_in_flight(self):
+        return self.max_in_flight
+
+    def get_stats(self):
+        """
+        @return: (dict) current limits, number of requests and throttled
+            responses and the time spent waiting in seconds
+
+        """
+        with self.condition:
+            stats = dict(self.stats)
+            stats['limit'] = self.limit
+            stats['interval'] = self.interval
+            stats['max_in_flight'] = self.max_in_flight
+        return stats
+
+    def reserve(self):
+        """
+        Takes a token from the bucket without blocking.
+
+        @return: (float) seconds the caller has to wait before the request
+            may be sent
+
+        """
+        with self.condition:
+            self._refill()
+            self.tokens -= 1
+            delay = max(0.0, -self.tokens / self.get_rate())
+            self.stats['requests'] += 1
+            self.stats['waited'] += delay
+            return delay
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent.
+
+        @return: (float) start time of the request, which has to be passed to
+            `release`
+
+        """
+        with self.condition:
+            while self.in_flight >= self.max_in_flight:
+                self.condition.wait()
+            self.in_flight += 1
+        delay = self.reserve()
+        if delay > 0:
+            logging.debug("Waiting {:.3f} s for the rate limit".format(delay))
+            time.sleep(delay)
+        return self.clock()
+
+    async def acquire_async(self):
+        """
+        Like `acquire`, but suspends the calling coroutine instead of
+        blocking. If all slots are taken, the coroutine waits for a future,
+        which is handed a slot as soon as a request is released.
+
+        @return: (float) start time of the request, which has to be passed to
+            `release`
+
+        """
+        import asyncio
+
+        with self.condition:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                waiter = None
+            else:
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                self.waiters.append((loop, waiter))
+        if waiter is not None:
+            try:
+                await waiter
+            except BaseException:
+                with self.condition:
+                    if (loop, waiter) in self.waiters:
+                        self.waiters.remove((loop, waiter))
+                        raise
+                # the slot has been handed over already
+                if not waiter.cancelled():
+                    self.release()
+                raise
+        try:
+            delay = self.reserve()
+            if delay > 0:
+                logging.debug("Waiting {:.3f} s for the rate limit".format(
+                    delay))
+                await asyncio.sleep(delay)
+        except BaseException:
+            self.release()
+            raise
+        return self.clock()
+
+    def release(self, start=None):
+        """
+        Marks a request as finished. The latency of the request is used to
+        adjust the number of requests in flight.
+
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if start is not None:
+                latency = self.clock() - start
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency += self.LATENCY_WEIGHT * (latency -
+                            self.latency)
+                self._adjust()
+            self._wake()
+            self.condition.notify_all()
+
+    def update(self, headers):
+        """
+        Adopts the rate limit announced in the response `headers`, a mapping
+        with lower case header names.
+
+        """
+        try:
+            limit = int(headers[self.HEADER_LIMIT])
+            interval = self.parse_interval(headers[self.HEADER_INTERVAL])
+        except (KeyError, ValueError):
+            return
+        if limit < 1 or interval <= 0:
+            return
+        with self.condition:
+            if limit == self.limit and interval == self.interval:
+                return
+            logging.debug("Rate limit is {:d} requests per {:g} s".format(
+                limit, interval))
+            self._refill()
+            self.limit = limit
+            self.interval = interval
+            self.tokens = min(self.tokens, float(limit))
+            self._adjust()
+            self._wake()
+            self.condition.notify_all()
+
+    def throttle(self):
+        """
+        Backs off after the API responded with code 429.
+
+        """
+        with self.condition:
+            logging.warning("Requests are throttled by the server")
+            self.stats['throttled'] += 1
+            self._refill()
+            self.tokens = min(self.tokens, -float(self.limit))
+
+    @classmethod
+    def parse_interval(cls, value):
+        """
+        @return: (float) seconds of an interval such as "1s" or "500ms"
+
+        """
+        match = cls.REGEX_INTERVAL.match(value)
+        if match is None:
+            raise ValueError("Invalid interval: {}".format(value))
+        return float(match.group(1)) * cls.INTERVAL_UNITS[match.group(2) or
+                's']
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(float(self.limit), self.tokens + (now -
+            self.updated) * self.get_rate())
+        self.updated = now
+
+    def _wake(self):
+        # hands free slots to waiting coroutines in the order of their arrival;
+        # the futures belong to their event loops, which may run in other
+        # threads
+        while self.waiters and self.in_flight < self.max_in_flight:
+            loop, waiter = self.waiters.popleft()
+            self.in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant, waiter)
+            except RuntimeError:
+                # the event loop has been closed
+                self.in_flight -= 1
+
+    def _grant(self, waiter):
+        if waiter.done():
+            # the coroutine has been cancelled in the meantime
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    def _adjust(self):
+        # requests in flight = throughput * latency (Little's law); one more
+        # request is allowed, so the bucket never idles while waiting
+        if self.latency is None:
+            self.max_in_flight = self.limit
+            return
+        self.max_in_flight = max(1, min(self.limit,
+            int(self.get_rate() * self.latency) + 1))
@@ -0,0 +1,131 @@
+import os
+import sys
+import bisect
+import difflib
+import logging
+import pickle
+import threading
+
+class Registry(object):
+    """
+    Set of valid API identifiers such as types or styles. Membership tests take
+    constant time and a sorted index is kept to find identifiers by prefix,
+    which is used to suggest close names for invalid identifiers.
+
+    Registries are loaded once per process via `Registry.load`. A binary
+    snapshot next to the plain text file is preferred, if it is up to date,
+    and otherwise written after the plain text file has been read.
+
+    """
+    SNAPSHOT_EXTENSION = '.snapshot'
+
+    _registries = {}
+    _registries_lock = threading.Lock()
+
+    def __init__(self, values):
+        self.index = sorted(set(v for v in values if len(v) > 0))
+        self.values = frozenset(self.index)
+
+    @classmethod
+    def load(cls, path):
+        """
+        @return: (Registry) registry of the identifiers listed in the plain
+            text file at `path`, shared by the whole process
+
+        """
+        with cls._registries_lock:
+            if path not in cls._registries:
+                cls._registries[path] = cls._load(path)
+            return cls._registries[path]
+
+    @classmethod
+    def _load(cls, path):
+        snapshot = cls.get_snapshot_path(path)
+        if os.path.isfile(snapshot) and \
+                os.path.getmtime(snapshot) >= os.path.getmtime(path):
+            try:
+                with open(snapshot, 'rb') as f:
+                    registry = cls.__new__(cls)
+                    registry.index = pickle.load(f)
+                    registry.values = frozenset(registry.index)
+                    return registry
+            except (OSError, pickle.UnpicklingError, EOFError):
+                logging.debug("Snapshot {} could not be read".format(
+                    snapshot))
+        with open(path, 'r') as f:
+            registry = cls(f.read().split('\n'))
+        try:
+            registry.save_snapshot(path)
+        except OSError:
+            logging.debug("Snapshot {} could not be written".format(
+                snapshot))
+        return registry
+
+    @classmethod
+    def get_snapshot_path(cls, path):
+        return os.path.splitext(path)[0] + cls.SNAPSHOT_EXTENSION
+
+    @classmethod
+    def invalidate(cls, path):
+        with cls._registries_lock:
+            cls._registries.pop(path, None)
+
+    def save_snapshot(self, path):
+        """
+        Writes a binary snapshot of the registry for the plain text file at
+        `path`.
+
+        @return: (str) path of the snapshot
+
+        """
+        snapshot = self.get_snapshot_path(path)
+        with open(snapshot, 'wb') as f:
+            pickle.dump(self.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return snapshot
+
+    def get_values(self):
+        """
+        @return: (list) all identifiers in sorted order
+
+        """
+        return self.index
+
+    def get_by_prefix(self, prefix):
+        """
+        @return: (list) all identifiers starting with `prefix` in sorted order
+
+        """
+        start = bisect.bisect_left(self.index, prefix)
+        end = bisect.bisect_left(self.index, prefix + '\uffff', start)
+        return self.index[start:end]
+
+    def suggest(self, value, limit=5):
+        """
+        @return: (list) up to `limit` identifiers which are close to `value`
+
+        """
+        suggestions = self.get_by_prefix(value)[:limit]
+        if len(suggestions) == 0:
+            suggestions = difflib.get_close_matches(value, self.index, limit)
+        return suggestions
+
+    def get_invalid_message(self, value, name):
+        """
+        @return: (str) message for the invalid `value`, which suggests close
+            identifiers; `name` is the kind of identifier, e.g. "style"
+
+        """
+        suggestions = self.suggest(value)
+        if len(suggestions) > 0:
+            return "Given {} \"{}\" is not valid. Did you mean {}?".format(
+                name, value, ", ".join(suggestions))
+        return "Given {} \"{}\" is not valid. Aborting.".format(name, value)
+
+    def __contains__(self, value):
+        return value in self.values
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,159 @@
+import os
+import sys
+import re
+
+from lib.search.result import SearchResult
+
+class Renderer(object):
+    """
+    Renders citations of common styles locally from the work metadata of the
+    API, which avoids a request to the transform service for every citation.
+
+    """
+    STYLES = ('bibtex', 'apa', 'harvard1', 'ieee')
+
+    BIBTEX_TYPES = {
+        'journal-article'     : 'article',
+        'book'                : 'book',
+        'edited-book'         : 'book',
+        'monograph'           : 'book',
+        'reference-book'      : 'book',
+        'book-chapter'        : 'inbook',
+        'book-section'        : 'incollection',
+        'book-part'           : 'incollection',
+        'proceedings-article' : 'inproceedings',
+        'dissertation'        : 'phdthesis',
+        'report'              : 'techreport',
+    }
+
+    REGEX_HTML = re.compile(r'<(.*?)>(.*?)</\1>')
+    REGEX_SPACE = re.compile(r'\s+')
+
+    def supports(self, style):
+        return style in self.STYLES
+
+    def render(self, work, style):
+        """
+        @return: (str) citation of the work in the given style
+
+        """
+        if not self.supports(style):
+            raise ValueError("Style {} cannot be rendered locally. Valid \
+styles are {}".format(style, ", ".join(self.STYLES)))
+        return getattr(self, '_render_{}'.format(style))(work,
+                SearchResult(work))
+
+    def _render_bibtex(self, work, sr):
+        authors = self._get_authors(work)
+        year = self._get_year(sr, None)
+        key = "{}_{}".format(authors[0][0] if len(authors) > 0 else
+                'Unknown', year if year is not None else 'Unknown')
+        fields = [
+            ('title'     , self._get_title(work)),
+            ('volume'    , work.get('volume')),
+            ('ISSN'      , self._first(work.get('ISSN'))),
+            ('url'       , sr.get_url()),
+            ('DOI'       , sr.get_doi().get_identifier()),
+            ('number'    , work.get('issue')),
+            ('journal'   , self._first(work.get('container-title'))),
+            ('publisher' , work.get('publisher')),
+            ('author'    , " and ".join("{}, {}".format(family, given)
+                if given else family for family, given in authors)),
+            ('year'      , year),
+            ('pages'     , work.get('page')),
+        ]
+        return "@{}{{{}, {}}}".format(
+            self.BIBTEX_TYPES.get(work.get('type'), 'misc'),
+            self.REGEX_SPACE.sub('_', key),
+            ", ".join("{}={{{}}}".format(name, value) for name, value in
+                fields if value))
+
+    def _render_apa(self, work, sr):
+        authors = ["{}, {}".format(family, self._initials(given)) if given
+                else family for family, given in self._get_authors(work)]
+        if len(authors) > 1:
+            authors = ", ".join(authors[:-1]) + ", & " + authors[-1]
+        else:
+            authors = "".join(authors)
+        output = "{} ({}). {}.".format(authors, self._get_year(sr, 'n.d.'),
+                self._get_title(work))
+        source = self._get_source(work, "{volume}({issue})", "{volume}")
+        if source:
+            output += " {}.".format(source)
+        return "{} doi:{}".format(output, sr.get_doi().get_identifier())
+
+    def _render_harvard1(self, work, sr):
+        authors = ["{}, {}".format(family, self._initials(given,
+            spaced=False)) if given else family for family, given in
+            self._get_authors(work)]
+        if len(authors) > 1:
+            authors = ", ".join(authors[:-1]) + " & " + authors[-1]
+        else:
+            authors = "".join(authors)
+        output = "{}, {}. {}.".format(authors, self._get_year(sr, 'n.d.'),
+                self._get_title(work))
+        source = self._get_source(work, "{volume}({issue})", "{volume}",
+                page_prefix="p.")
+        if source:
+            output += " {}.".format(source)
+        return output
+
+    def _render_ieee(self, work, sr):
+        authors = ["{} {}".format(self._initials(given), family).strip() for
+                family, given in self._get_authors(work)]
+        if len(authors) > 2:
+            authors = ", ".join(authors[:-1]) + ", and " + authors[-1]
+        else:
+            authors = " and ".join(authors)
+        parts = ["“{},”".format(self._get_title(work))]
+        container = self._first(work.get('container-title'))
+        if container:
+            parts.append("{},".format(container))
+        if work.get('volume'):
+            parts.append("vol. {},".format(work['volume']))
+        if work.get('issue'):
+            parts.append("no. {},".format(work['issue']))
+        if work.get('page'):
+            prefix = 'pp.' if '-' in work['page'] else 'p.'
+            parts.append("{} {},".format(prefix, work['page']))
+        parts.append("{}.".format(self._get_year(sr, 'n.d.')))
+        return "[1]{}, {}".format(authors, " ".join(parts))
+
+    def _get_source(self, work, volume_issue, volume_only, page_prefix=''):
+        container = self._first(work.get('container-title'))
+        if not container:
+            return ''
+        parts = [container]
+        if work.get('volume') and work.get('issue'):
+            parts.append(volume_issue.format(volume=work['volume'],
+                issue=work['issue']))
+        elif work.get('volume'):
+            parts.append(volume_only.format(volume=work['volume']))
+        if work.get('page'):
+            parts.append(page_prefix + work['page'])
+        return ", ".join(parts)
+
+    def _get_authors(self, work):
+        return [(author.get('family', ''), author.get('given', '')) for
+                author in work.get('author', ()) if 'family' in author]
+
+    def _get_title(self, work):
+        title = self._first(work.get('title'))
+        if not title:
+            return SearchResult.UNKNOWN_TITLE
+        return self.REGEX_SPACE.sub(' ', self.REGEX_HTML.sub(r"\2", title))\
+                .strip()
+
+    def _get_year(self, sr, unknown):
+        year = sr.get_year()
+        return year if year != sr.UNKNOWN_YEAR else unknown
+
+    def _initials(self, given, spaced=True):
+        initials = ["{}.".format(name[0]) for name in
+                given.replace('-', ' ').split() if len(name) > 0]
+        return (" " if spaced else "").join(initials)
+
+    def _first(self, values):
+        if isinstance(values, (list, tuple)):
+            return values[0] if len(values) > 0 else None
+        return values
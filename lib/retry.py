@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import random
+import logging
+import threading
+
+class TransientError(RuntimeError):
+    """
+    Error of a request which may succeed if it is sent again, such as a
+    connection error or a response with code 429 or 5xx.
+
+    """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker(object):
+    """
+    Pauses all requests of the process once too many of them failed in a row,
+    since the API is most likely down then. After the pause a single request
+    is let through to probe the API; all others wait for its result.
+
+    """
+    FAILURE_THRESHOLD = 5
+    PAUSE             = 30.0
+    PROBE_INTERVAL    = 0.1
+
+    STATE_CLOSED    = 'closed'
+    STATE_OPEN      = 'open'
+    STATE_HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, pause=PAUSE,
+            clock=time.monotonic, sleep=time.sleep):
+        if threshold < 1:
+            raise ValueError("Failure threshold must be at least 1.")
+        self.threshold = threshold
+        self.pause = pause
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.state = self.STATE_CLOSED
+        self.failures = 0
+        self.reopen_at = 0.0
+        self.stats = {'trips': 0, 'paused': 0.0}
+
+    def get_state(self):
+        return self.state
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def wait(self):
+        """
+        Blocks as long as the circuit is open.
+
+        """
+        delay = self.poll()
+        while delay > 0:
+            self.sleep(delay)
+            delay = self.poll()
+
+    async def wait_async(self):
+        """
+        Like `wait`, but suspends the calling coroutine instead of blocking.
+
+        """
+        import asyncio
+
+        delay = self.poll()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.poll()
+
+    def poll(self):
+        """
+        Checks without blocking whether a request may be sent.
+
+        @return: (float) seconds to wait before polling again or 0.0 if the
+            request may be sent now
+
+        """
+        with self.lock:
+            if self.state == self.STATE_CLOSED:
+                return 0.0
+            now = self.clock()
+            if self.state == self.STATE_OPEN and now >= self.reopen_at:
+                # this request probes whether the API is back
+                self.state = self.STATE_HALF_OPEN
+                return 0.0
+            delay = self.PROBE_INTERVAL
+            if self.state == self.STATE_OPEN:
+                delay = max(delay, self.reopen_at - now)
+            self.stats['paused'] += delay
+            return delay
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.STATE_CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.STATE_OPEN:
+                return
+            if self.state == self.STATE_HALF_OPEN or \
+                    self.failures >= self.threshold:
+                self._trip()
+
+    def record_error(self):
+        """
+        Records a request, which failed with an error other than a
+        `TransientError` or was cancelled. Such errors do not count as
+        failures, but if the request was the probe, it did not show that the
+        API is back, so the circuit is opened again instead of staying
+        half-open.
+
+        """
+        with self.lock:
+            if self.state == self.STATE_HALF_OPEN:
+                self._trip()
+
+    def _trip(self):
+        logging.warning("The API seems to be down, pausing requests for {:g} \
+s".format(self.pause))
+        self.state = self.STATE_OPEN
+        self.reopen_at = self.clock() + self.pause
+        self.stats['trips'] += 1
+
+class RetryPolicy(object):
+    """
+    Retries requests that failed with a `TransientError`. The delay between
+    two attempts grows exponentially and is randomized (full jitter), so
+    parallel workers do not retry in lockstep. A delay requested by the
+    server via `Retry-After` is respected.
+
+    The policy is shared by all requests of the process, see `get_instance`
+    and `configure`.
+
+    """
+    MAX_ATTEMPTS = 4
+    BASE_DELAY   = 0.5
+    MAX_DELAY    = 30.0
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """
+        @return: (RetryPolicy) the retry policy shared by the whole process
+
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        """
+        Replaces the retry policy shared by the whole process.
+
+        @return: (RetryPolicy) the new retry policy
+
+        """
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY,
+            max_delay=MAX_DELAY, breaker=None, sleep=time.sleep,
+            random=random.random):
+        if max_attempts < 1:
+            raise ValueError("Number of attempts must be at least 1.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.sleep = sleep
+        self.random = random
+        self.lock = threading.Lock()
+        self.stats = {'retries': 0, 'backoff': 0.0, 'given_up': 0}
+
+    def get_stats(self):
+        """
+        @return: (dict) number of retries, requests given up, time spent
+            backing off and paused by the circuit breaker in seconds and the
+            number of times the circuit breaker tripped
+
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        stats.update(self.breaker.get_stats())
+        return stats
+
+    def get_delay(self, attempt, retry_after=None):
+        """
+        @return: (float) seconds to wait after the `attempt`-th attempt failed
+
+        """
+        delay = self.random() * min(self.max_delay,
+                self.base_delay * 2 ** (attempt - 1))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def call(self, func):
+        """
+        Calls `func` until it does not raise a `TransientError` anymore or
+        the maximum number of attempts is reached.
+
+        @return: result of `func`
+
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.wait()
+            try:
+                result = func()
+            except TransientError as e:
+                self.sleep(self._record_failure(attempt, e))
+                continue
+            except BaseException:
+                self.breaker.record_error()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, func):
+        """
+        Like `call` for a coroutine function `func`; waiting suspends the
+        calling coroutine instead of blocking.
+
+        @return: result of `func`
+
+        """
+        import asyncio
+
+        for attempt in range(1, self.max_attempts + 1):
+            await self.breaker.wait_async()
+            try:
+                result = await func()
+            except TransientError as e:
+                await asyncio.sleep(self._record_failure(attempt, e))
+                continue
+            except BaseException:
+                # also a cancelled probe must not leave the circuit half-open
+                self.breaker.record_error()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _record_failure(self, attempt, error):
+        """
+        Records the failed `attempt` and re-raises `error` if it was the last
+        one.
+
+        @return: (float) seconds to wait before the next attempt
+
+        """
+        self.breaker.record_failure()
+        if attempt == self.max_attempts:
+            with self.lock:
+                self.stats['given_up'] += 1
+            raise error
+        delay = self.get_delay(attempt, error.retry_after)
+        logging.warning("{} Retrying in {:.1f} s.".format(error, delay))
+        with self.lock:
+            self.stats['retries'] += 1
+            self.stats['backoff'] += delay
+        return delay
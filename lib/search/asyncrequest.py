@@ -0,0 +1,181 @@
+import os
+import sys
+import asyncio
+import logging
+
+from lib.search.request import Request
+from lib.search.result import SearchResult, SearchResultPage
+from lib.doi import DOI
+from lib.asynctransport import AsyncTransport
+from lib.transport import Transport
+from lib.ratelimiter import RateLimiter
+from lib.retry import RetryPolicy, TransientError
+from lib.profiler import Profiler
+
+class AsyncRequest(Request):
+    """
+    Asynchronous variant of `Request` for use in an asyncio event loop.
+
+    `search`, `citation`, `get_work`, `get_works`, `get_download_links` and
+    their batched variants are coroutines, `search_item_pages`,
+    `search_pages` and `search_all` are asynchronous generators. URL
+    building, validation and parsing of the results are shared with
+    `Request`, as are the process wide rate limiter and retry policy.
+
+    Requests use an `AsyncTransport`, which bounds the number of connections
+    per host, so thousands of lookups can be in flight at once. The cache and
+    the work index are SQLite based and accessed synchronously; both only
+    take a moment per lookup.
+
+    The transport has to be closed by `close` before the event loop ends,
+    or the request is used as asynchronous context manager.
+
+    """
+    def __init__(self, cache=None, render=Request.RENDER_REMOTE, index=None,
+            transport=None, index_lookups=False):
+        super().__init__(cache=cache, render=render, index=index,
+                index_lookups=index_lookups)
+        # only the default timeout is shared with the synchronous transport,
+        # whose instance would create an HTTP pool and a cache directory
+        self.transport = transport if transport is not None else \
+                AsyncTransport(timeout=Transport.TIMEOUT)
+
+    async def close(self):
+        await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def search(self, query):
+        url = self.get_search_url(query)
+        logging.debug("Search URL: {}".format(url))
+        response = await self._request(url)
+        self._index_search_results(query, response.get('items', ()))
+        return response
+
+    async def search_item_pages(self, query, max_results=None):
+        """
+        Asynchronous generator over the work JSON of all result pages, see
+        `Request.search_item_pages`.
+
+        """
+        cursor = '*'
+        remaining = max_results
+        while remaining is None or remaining > 0:
+            response = await self.search(self.get_cursor_query(query, cursor))
+            items = response.get('items', ())
+            if remaining is not None:
+                items = items[:remaining]
+                remaining -= len(items)
+            if len(items) == 0:
+                break
+            yield items
+
+            cursor = response.get('next-cursor', None)
+            if cursor is None:
+                break
+
+    async def search_pages(self, query, max_results=None):
+        async for items in self.search_item_pages(query, max_results):
+            yield SearchResultPage(items)
+
+    async def search_all(self, query, max_results=None):
+        async for page in self.search_pages(query, max_results):
+            for result in page:
+                yield result
+
+    async def citation(self, query, style='bibtex'):
+        identifier = query[:-len(self.CITATION_SUFFIX)]
+        if self.renders_locally(style):
+            return self.render_citation(await self.get_work(identifier),
+                    style)
+
+        result = self._get_cached_citation(identifier, style)
+        if result is not None:
+            return result
+
+        url = self.get_citation_url(query)
+        logging.debug("Cite URL: {}".format(url))
+        response = (await self._request(url,
+            self.get_citation_headers(style), json_message=False)).strip()
+        self._cache_citation(identifier, style, response)
+        return response
+
+    async def get_download_links(self, identifier):
+        return self._parse_download_links(await self.get_work(identifier))
+
+    async def get_work(self, identifier):
+        doi = DOI(identifier)
+        work = self._get_stored_work(doi.get_normalized_identifier())
+        if work is not None:
+            return work
+
+        url = self.get_work_url(doi)
+        logging.debug("Query URL: {}".format(url))
+
+        work = await self._request(url)
+        self._store_work(doi.get_normalized_identifier(), work)
+        return work
+
+    async def get_works(self, identifiers, batch_size=Request.BATCH_SIZE):
+        """
+        See `Request.get_works`; all batches are requested concurrently.
+
+        """
+        works, dois = self._split_stored_works(identifiers)
+        responses = await asyncio.gather(*(self.search(
+            self._get_batch_query(batch)) for batch in self._get_batches(
+                dois, batch_size)))
+        for response in responses:
+            self._add_batch_works(works, response)
+        return works
+
+    async def get_search_results(self, identifiers,
+            batch_size=Request.BATCH_SIZE):
+        works = await self.get_works(identifiers, batch_size)
+        return {doi: SearchResult(work) for doi, work in works.items()}
+
+    async def get_download_links_batch(self, identifiers,
+            batch_size=Request.BATCH_SIZE):
+        works = await self.get_works(identifiers, batch_size)
+        return {doi: self._parse_download_links(work) for doi, work in
+                works.items()}
+
+    async def _request(self, url,
+            headers={'content-type': 'application/json'}, method="GET",
+            json_message=True):
+
+        resp, content = await RetryPolicy.get_instance().call_async(
+                lambda: self._send(url, headers, method))
+        return self._decode(resp, content, json_message)
+
+    async def _send(self, url, headers, method):
+        """
+        Sends a single request, paced by the rate limiter. Requests in
+        flight count towards the limit of the limiter, like those of
+        `Request`.
+
+        @return: (tuple) response headers and content, see
+            `AsyncTransport.request`
+
+        """
+        limiter = RateLimiter.get_instance()
+        profiler = Profiler.get_instance()
+        with profiler.measure('request.wait'):
+            start = await limiter.acquire_async()
+        try:
+            with profiler.measure('request.http', method=method):
+                resp, content = await self.transport.request(url, method,
+                        headers=headers)
+        except (OSError, asyncio.TimeoutError,
+                asyncio.IncompleteReadError) as e:
+            raise TransientError("Request to {} failed: {}.".format(url,
+                str(e) or type(e).__name__))
+        finally:
+            limiter.release(start)
+        self._check_response(resp)
+        return resp, content
+
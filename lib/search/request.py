@@ -2,17 +2,20 @@ import os
 import sys
 import json
 import urllib.parse
-import httplib2
 import logging
 import re
 
-from colorama import Fore, Back, Style
-
-from lib.search.result import SearchResult
+from lib.search.result import SearchResult, SearchResultPage
 from lib.doi import DOI
 from lib.fulltexturl import FullTextURL
 from lib.helper import Helper
 from lib.filter import Filters
+from lib.transport import Transport
+from lib.ratelimiter import RateLimiter
+from lib.retry import RetryPolicy, TransientError
+from lib.coalescer import Coalescer
+from lib.profiler import Profiler
+from lib.renderer import Renderer
 
 class Request(object):
     """
@@ -23,9 +26,61 @@ class Request(object):
     URL_PROTOCOL     = "http"
     URL_API_BASE     = "api.crossref.org"
     URL_SERVICE_DOIS = "api.crossref.org/works"
-
-    def __init__(self):
+    CITATION_SUFFIX  = "/transform"
+    BATCH_SIZE       = 50
+    RETRY_STATUS     = (429, 500, 502, 503, 504)
+
+    REGEX_HTML       = re.compile(r'<(.*?)>(.*?)</\1>')
+
+    # fields of works, which can be selected in search queries
+    SELECT_FIELDS    = ('abstract', 'accepted', 'alternative-id', 'approved',
+            'archive', 'article-number', 'assertion', 'author', 'chair',
+            'clinical-trial-number', 'container-title', 'content-created',
+            'content-domain', 'created', 'degree', 'deposited', 'DOI',
+            'editor', 'event', 'funder', 'group-title', 'indexed',
+            'is-referenced-by-count', 'ISBN', 'ISSN', 'issn-type', 'issue',
+            'issued', 'license', 'link', 'member', 'original-title', 'page',
+            'posted', 'prefix', 'published-online', 'published-print',
+            'publisher', 'publisher-location', 'reference',
+            'references-count', 'relation', 'score', 'short-container-title',
+            'short-title', 'standards-body', 'subject', 'subtitle', 'title',
+            'translator', 'type', 'update-policy', 'update-to', 'updated-by',
+            'URL', 'volume')
+
+    # facets of search results and the names of their counts in the API
+    FACETS           = {
+        'year'      : 'published',
+        'type'      : 'type-name',
+        'publisher' : 'publisher-name',
+    }
+    # facets whose values are ordered by value instead of by count
+    FACETS_BY_VALUE  = ('year',)
+    # all values of a facet, which the API caps at 1000
+    FACET_LIMIT      = '*'
+
+    RENDER_LOCAL     = "local"
+    RENDER_REMOTE    = "remote"
+
+    def __init__(self, cache=None, render=RENDER_REMOTE, index=None,
+            index_lookups=False):
+        """
+        Works received from the API are added to the work `index`. With
+        `index_lookups` set, the metadata of DOIs is also looked up in it
+        before requesting it. Works in the index do not expire, so this is
+        meant for offline use, e.g. of an imported dump.
+
+        """
+        if render not in (self.RENDER_LOCAL, self.RENDER_REMOTE):
+            raise ValueError("Render mode {} is not supported.".format(render))
         self.colored_output = False
+        self.color_doi = None
+        self.color_title = None
+        self.color_more = None
+        self.cache = cache
+        self.index = index
+        self.index_lookups = index_lookups
+        self.render = render
+        self.renderer = Renderer()
 
     def set_colored_output(self, value, doi=None, title=None, more=None):
         if type(value) != type(True):
@@ -38,7 +93,15 @@ value")
         return True
 
     def prepare_search_query(self, string, sort='score', order='desc', \
-            year=None, type_=None, rows=20):
+            year=None, type_=None, rows=20, select=None):
+        """
+        Builds the query of a search. With `select` given, only these fields
+        of the works are requested instead of the complete records, see
+        `SearchResult.get_api_fields`.
+
+        @return: (str) the query string
+
+        """
         valid_sort_methods = ('score', 'updated', 'deposited', 'indexed',
                 'published')
         if sort not in valid_sort_methods:
@@ -60,19 +123,186 @@ value")
         # load all filter values
         payload['filter'] = filters.get_formatted_filters()
 
+        if select is not None:
+            invalid = [field for field in select if field not in
+                    self.SELECT_FIELDS]
+            if len(invalid) > 0:
+                raise ValueError("Fields {} cannot be selected.".format(
+                    ", ".join(invalid)))
+            payload['select'] = ",".join(select)
+
         return urllib.parse.urlencode(payload)
 
+    def prepare_facet_query(self, string, facets, year=None, type_=None,
+            limit=FACET_LIMIT):
+        """
+        Builds the query of a search, which only counts the results for each
+        value of the `facets`, e.g. `year` or `publisher`, instead of
+        returning them. At most `limit` values are counted per facet.
+
+        @return: (str) the query string
+
+        """
+        invalid = [facet for facet in facets if facet not in self.FACETS]
+        if len(invalid) > 0:
+            raise ValueError("Facets {} are not supported. Valid facets are: \
+{}".format(", ".join(invalid), ", ".join(self.FACETS)))
+        if len(facets) == 0:
+            raise ValueError("At least one facet is required.")
+        if limit != self.FACET_LIMIT and (type(limit) is not int or limit < 1):
+            raise ValueError("Facet limit must be a positive integer.")
+
+        query = self.prepare_search_query(string, year=year, type_=type_,
+                rows=0)
+        return "{}&{}".format(query, urllib.parse.urlencode({'facet':
+            ",".join("{}:{}".format(self.FACETS[facet], limit) for facet in
+                facets)}))
+
     def prepare_citation_query(self, doi_identifier):
         doi = DOI(doi_identifier)
-        return doi.get_identifier() + '/transform'
+        return doi.get_identifier() + self.CITATION_SUFFIX
+
+    def get_search_url(self, query):
+        return "{}://{}?{}".format(self.URL_PROTOCOL, self.URL_SERVICE_DOIS,
+                query)
+
+    def get_citation_url(self, query):
+        return "{}://{}/{}".format(self.URL_PROTOCOL, self.URL_SERVICE_DOIS,
+                query)
+
+    def get_citation_headers(self, style):
+        return {'Accept': 'text/x-bibliography; style={}'.format(style)}
+
+    def get_work_url(self, doi):
+        return "{}://{}/{}".format(self.URL_PROTOCOL, self.URL_SERVICE_DOIS,
+                doi.get_identifier())
 
     def search(self, query):
-        url = "{}://{}?{}".format(self.URL_PROTOCOL, \
-                self.URL_SERVICE_DOIS, query)
+        url = self.get_search_url(query)
         logging.debug("Search URL: {}".format(url))
         response = self._request(url)
+        self._index_search_results(query, response.get('items', ()))
         return response
 
+    def search_facets(self, query):
+        """
+        Runs a facet query, see `prepare_facet_query`.
+
+        @return: (dict) tuples of (value, number of results) for each facet,
+            ordered by the number of results or, for years, by value
+
+        """
+        return self.get_facet_counts(self.search(query))
+
+    def get_facet_counts(self, message):
+        """
+        @return: (dict) tuples of (value, number of results) for each facet
+            of the search response `message`
+
+        """
+        names = {name: facet for facet, name in self.FACETS.items()}
+        counts = {}
+        for name, content in message.get('facets', {}).items():
+            facet = names.get(name, name)
+            values = content.get('values', {}).items()
+            if facet in self.FACETS_BY_VALUE:
+                counts[facet] = sorted(values)
+            else:
+                counts[facet] = sorted(values, key=lambda item: (-item[1],
+                    item[0]))
+        return counts
+
+    def is_projected(self, query):
+        """
+        @return: (bool) True if the search `query` only selects some fields of
+            the works, so the results are not complete records
+
+        """
+        return self.get_selected_fields(query) is not None
+
+    def get_selected_fields(self, query):
+        """
+        @return: (list) fields of the works selected by the search `query` or
+            None if complete records are requested
+
+        """
+        select = urllib.parse.parse_qs(query).get('select')
+        return select[0].split(',') if select is not None else None
+
+    def get_cursor_query(self, query, cursor):
+        """
+        @return: (str) query of the result page at the deep paging `cursor`
+
+        """
+        return "{}&{}".format(query, urllib.parse.urlencode({'cursor':
+            cursor}))
+
+    def search_pages(self, query, max_results=None):
+        """
+        Generator over all result pages of a search. Pages are requested one
+        after another using the deep paging cursor of the API, the page size
+        is given by the `rows` value of the query.
+
+        @return: (generator) SearchResultPage objects
+
+        """
+        for items in self.search_item_pages(query, max_results):
+            yield SearchResultPage(items)
+
+    def search_item_pages(self, query, max_results=None):
+        """
+        Like `search_pages`, but yields the work JSON of the results.
+
+        @return: (generator) lists of work JSON
+
+        """
+        cursor = '*'
+        remaining = max_results
+        while remaining is None or remaining > 0:
+            response = self.search(self.get_cursor_query(query, cursor))
+            items = response.get('items', ())
+            if remaining is not None:
+                items = items[:remaining]
+                remaining -= len(items)
+            if len(items) == 0:
+                break
+            yield items
+
+            cursor = response.get('next-cursor', None)
+            if cursor is None:
+                break
+
+    def search_all(self, query, max_results=None):
+        """
+        Generator over all results of a search, see `search_pages`.
+
+        @return: (generator) SearchResult objects
+
+        """
+        for page in self.search_pages(query, max_results):
+            for result in page:
+                yield result
+
+    def print_facet_content(self, counts, facets=None):
+        """
+        Prints the number of results for each value of the facets in `counts`,
+        see `search_facets`, in the order of `facets`.
+
+        """
+        if facets is None:
+            facets = list(counts)
+        color = Helper.get_fg_colorcode_by_identifier(self.color_more) if \
+                self.colored_output else ''
+        end = Helper.get_fg_colorcode_by_identifier('reset') if \
+                self.colored_output else ''
+        for facet in facets:
+            values = counts.get(facet, [])
+            print("{}{}{}".format(color, facet.upper(), end))
+            width = max([len("{:d}".format(count)) for _, count in values] +
+                    [1])
+            for value, count in values:
+                print("  {:>{width}d}  {}".format(count, value, width=width))
+
     def print_search_content(self, content, show_authors=False,
             show_type=False, show_publisher=False, show_url=False):
         base_template = "{score:.2f} - {year:4d} - {cfg_doi}{doi:40}{cfg_end} \
@@ -88,89 +318,315 @@ value")
         if show_url:
             template += "\n  {cfg_more}URL{cfg_end}       : {url}"
 
-        for result in content.get('items', ()):
-            sr = SearchResult(result)
-            payload = {
-                "score"     : sr.get_score(),
-                "year"      : sr.get_year(),
-                "doi"       : sr.get_doi().get_identifier(),
-                "title"     : sr.get_title(),
-                "authors"   : sr.get_authors(),
-                "type"      : sr.get_type(),
-                "publisher" : sr.get_publisher(),
-                "url"       : sr.get_url(),
-                "cfg_more"  : '',
-                "cfg_end"   : '',
-                "cfg_doi"   : '',
-                "cfg_title" : '',
-            }
-
-            if self.colored_output:
-                color_options = [
-                    ("cfg_doi", self.color_doi),
-                    ("cfg_title", self.color_title),
-                    ("cfg_more", self.color_more),
-                    ("cfg_end", 'reset'),
-                ]
-                for key, value in color_options:
-                    payload[key] = Helper.get_fg_colorcode_by_identifier(value)
-
-            print(template.format(**payload))
+        # the colors are the same for every result, so they are put into the
+        # template upfront
+        colors = [
+            ("cfg_doi", self.color_doi),
+            ("cfg_title", self.color_title),
+            ("cfg_more", self.color_more),
+            ("cfg_end", 'reset'),
+        ]
+        for key, value in colors:
+            code = Helper.get_fg_colorcode_by_identifier(value) if \
+                    self.colored_output else ''
+            template = template.replace("{" + key + "}", code)
+
+        # content is either a single response of the API or a stream of
+        # results, which should be shown as soon as they arrive
+        streamed = not isinstance(content, dict)
+        if not streamed:
+            content = SearchResultPage.from_message(content)
+
+        for sr in content:
+            print(template.format(score=sr.get_score(), year=sr.get_year(),
+                doi=sr.get_doi().get_identifier(), title=sr.get_title(),
+                authors=sr.get_authors(), type=sr.get_type(),
+                publisher=sr.get_publisher(), url=sr.get_url()),
+                flush=streamed)
+
+    def renders_locally(self, style):
+        """
+        @return: (bool) True if citations of this style are rendered from the
+            work metadata instead of using the transform service
+
+        """
+        return self.render == self.RENDER_LOCAL and \
+                self.renderer.supports(style)
+
+    def render_citation(self, work, style='bibtex'):
+        return self.renderer.render(work, style)
 
     def citation(self, query, style='bibtex'):
-        url = "{}://{}/{}".format(self.URL_PROTOCOL, self.URL_SERVICE_DOIS,
-                query)
-        headers={'Accept':'text/x-bibliography; style={}'.format(style)}
+        identifier = query[:-len(self.CITATION_SUFFIX)]
+        if self.renders_locally(style):
+            return self.render_citation(self.get_work(identifier), style)
+
+        result = self._get_cached_citation(identifier, style)
+        if result is not None:
+            return result
+
+        url = self.get_citation_url(query)
+        headers = self.get_citation_headers(style)
 
         logging.debug("Cite URL: {}".format(url))
         logging.debug("Query headers: {}".format(headers))
         logging.debug("Style: {}".format(style))
 
-        response = self._request(url, headers, json_message=False)
+        response = self._request(url, headers, json_message=False).strip()
+        self._cache_citation(identifier, style, response)
+        return response
+
+    def _get_cached_citation(self, identifier, style):
+        if self.cache is None:
+            return None
+        key = DOI(identifier).get_normalized_identifier()
+        result = self.cache.get(key, style)
+        if result is not None:
+            logging.debug("Citation for {} found in cache".format(key))
+        return result
 
-        return response.strip()
+    def _cache_citation(self, identifier, style, citation):
+        if self.cache is not None:
+            self.cache.put(DOI(identifier).get_normalized_identifier(), style,
+                    citation)
 
     def print_citation(self, content):
-        print(self.__clean_html(content))
+        print(self.clean_citation(content))
+
+    def clean_citation(self, content):
+        """
+        @return: (str) citation without HTML markup
+
+        """
+        return self.__clean_html(content)
 
     def get_download_links(self, identifier):
-        url = "{}://{}/{}".format(self.URL_PROTOCOL, self.URL_SERVICE_DOIS,
-                identifier)
+        return self._parse_download_links(self.get_work(identifier))
+
+    def get_work(self, identifier):
+        """
+        Looks up the metadata of a single DOI. If a cache is used, the
+        metadata is served from and stored in it; the work index is used if
+        `index_lookups` is set.
+
+        @return: (dict) work JSON
+
+        """
+        doi = DOI(identifier)
+        work = self._get_stored_work(doi.get_normalized_identifier())
+        if work is not None:
+            return work
+
+        url = self.get_work_url(doi)
         logging.debug("Query URL: {}".format(url))
 
-        response = self._request(url)
+        work = self._request(url)
+        self._store_work(doi.get_normalized_identifier(), work)
+        return work
+
+    def get_works(self, identifiers, batch_size=BATCH_SIZE):
+        """
+        Looks up the metadata of many DOIs at once. Up to `batch_size` DOIs
+        are combined into a single request using repeated `doi` filters. If a
+        cache or the work index is used for lookups, only DOIs missing in
+        them are requested.
+
+        @return: (dict) work JSON keyed by the normalized DOI; DOIs which are
+            unknown to the API are missing
+
+        """
+        works, dois = self._split_stored_works(identifiers)
+        for batch in self._get_batches(dois, batch_size):
+            response = self.search(self._get_batch_query(batch))
+            self._add_batch_works(works, response)
+        return works
+
+    def _split_stored_works(self, identifiers):
+        """
+        @return: (tuple) dict of the works stored locally keyed by the
+            normalized DOI and a list of the DOI objects to request
+
+        """
+        works = {}
+        dois = {}
+        for identifier in identifiers:
+            doi = DOI(identifier)
+            key = doi.get_normalized_identifier()
+            if key in works or key in dois:
+                continue
+            work = self._get_stored_work(key)
+            if work is not None:
+                works[key] = work
+            else:
+                dois[key] = doi
+        return works, list(dois.values())
+
+    def _get_batches(self, dois, batch_size):
+        for start in range(0, len(dois), batch_size):
+            yield dois[start:start + batch_size]
+
+    def _get_batch_query(self, batch):
+        filters = Filters()
+        filters.add_all(('doi', doi.get_identifier()) for doi in batch)
+        return urllib.parse.urlencode({'filter':
+            filters.get_formatted_filters(), 'rows': len(batch)})
+
+    def _add_batch_works(self, works, response):
+        # the works are indexed by `search` already
+        for item in response.get('items', ()):
+            key = item.get('DOI', '').lower()
+            works[key] = item
+            if self.cache is not None:
+                self.cache.put_work(key, item)
+
+    def _store_work(self, key, work):
+        if self.cache is not None:
+            self.cache.put_work(key, work)
+        if self.index is not None:
+            self.index.add_work(work)
+
+    def _index_search_results(self, query, works):
+        # projected results are indexed as long as they contain the fields of
+        # the index
+        if self.index is None:
+            return
+        select = self.get_selected_fields(query)
+        if select is None:
+            self.index.add_works(works)
+        elif self.index.is_indexable(select):
+            self.index.add_works(works, complete=False)
+
+    def _get_stored_work(self, key):
+        """
+        @return: (dict) work JSON of the normalized DOI from the cache or,
+            with `index_lookups` set, the work index, or None if it is not
+            stored locally
+
+        """
+        if self.cache is not None:
+            work = self.cache.get_work(key)
+            if work is not None:
+                return work
+        if self.index is not None and self.index_lookups:
+            return self.index.get_work(key)
+        return None
+
+    def get_search_results(self, identifiers, batch_size=BATCH_SIZE):
+        """
+        Batched variant of looking up search results, see `get_works`.
+
+        @return: (dict) SearchResult objects keyed by the normalized DOI
 
+        """
+        works = self.get_works(identifiers, batch_size)
+        return {doi: SearchResult(work) for doi, work in works.items()}
+
+    def get_download_links_batch(self, identifiers, batch_size=BATCH_SIZE):
+        """
+        Batched variant of `get_download_links`, see `get_works`.
+
+        @return: (dict) lists of FullTextURL objects keyed by the normalized
+            DOI
+
+        """
+        works = self.get_works(identifiers, batch_size)
+        return {doi: self._parse_download_links(work) for doi, work in
+                works.items()}
+
+    def _parse_download_links(self, work):
         links = []
-        for link in response.get('link', ()):
-            content_version = link['content-version']
-            license = self._find_license(response, content_version)
+        for link in work.get('link', ()):
+            content_version = link.get('content-version', '')
+            license = self._find_license(work, content_version)
             links.append(FullTextURL(link.get("URL", ""), license.get("URL",
                 None)))
-
         return links
 
     def _find_license(self, response, content_version):
         for license in response.get('license', ()):
             if license.get("content-version", "") == content_version:
                 return license
-        return None
+        return {}
 
     def _request(self, url, 
             headers={'content-type': 'application/json'}, method="GET",
             json_message=True):
 
-        h = httplib2.Http(".cache")
-        resp, content = h.request(url, method, headers=headers)
-
+        send = lambda: RetryPolicy.get_instance().call(
+                lambda: self._send(url, headers, method))
+        if method == "GET":
+            # identical requests of concurrent callers share the response,
+            # which every caller decodes on its own
+            key = (url, tuple(sorted((headers or {}).items())))
+            resp, content = Coalescer.get_instance().call(key, send)
+        else:
+            resp, content = send()
+        return self._decode(resp, content, json_message)
+
+    def _decode(self, resp, content, json_message):
+        """
+        @return: (dict) message of a JSON response or (str) the plain content
+
+        """
         request_status = int(resp['status'])
         if request_status != 200:
             raise RuntimeError("The server responded with code {:d}, which the \
 script cannot deal with. Aborting.".format(request_status))
 
-        if json_message:
-            return json.loads(content.decode('utf-8'))['message']
-        return content.decode('utf-8')
+        with Profiler.get_instance().measure('request.decode'):
+            if json_message:
+                return json.loads(content.decode('utf-8'))['message']
+            return content.decode('utf-8')
+
+    def _send(self, url, headers, method):
+        """
+        Sends a single request, paced by the rate limiter.
+
+        @return: (tuple) response and content as returned by httplib2
+
+        """
+        import httplib2
+        import http.client
+
+        transport = Transport.get_instance()
+        limiter = RateLimiter.get_instance()
+        profiler = Profiler.get_instance()
+        with profiler.measure('request.wait'):
+            start = limiter.acquire()
+        try:
+            with profiler.measure('request.http', method=method):
+                resp, content = transport.request(url, method,
+                        headers=headers)
+        except (OSError, http.client.HTTPException,
+                httplib2.HttpLib2Error) as e:
+            raise TransientError("Request to {} failed: {}.".format(url, e))
+        finally:
+            limiter.release(start)
+        self._check_response(resp)
+        return resp, content
+
+    def _check_response(self, resp):
+        """
+        Adopts the rate limit of the response `resp`, a mapping with lower
+        case header names and the `status`, and raises a `TransientError` if
+        the request should be retried.
+
+        """
+        limiter = RateLimiter.get_instance()
+        limiter.update(resp)
+
+        request_status = int(resp['status'])
+        if request_status == 429:
+            limiter.throttle()
+        if request_status in self.RETRY_STATUS:
+            raise TransientError("The server responded with code {:d}.".format(
+                request_status), self._get_retry_after(resp))
+
+    def _get_retry_after(self, resp):
+        try:
+            return float(resp['retry-after'])
+        except (KeyError, ValueError):
+            return None
 
     def __clean_html(self, raw_html):
-        regex = re.compile(r'<(.*?)>(.*?)</\1>')
-        return re.sub(regex, r"\2", raw_html)
+        return self.REGEX_HTML.sub(r"\2", raw_html)
@@ -4,50 +4,109 @@ import re
 from datetime import datetime
 
 from lib.doi import DOI
+from lib.profiler import Profiler
 
 class SearchResult(object):
     """
     Representation of an individual search result.
 
+    Only the raw title and authors are kept while parsing; they are
+    formatted when they are requested for the first time, so results whose
+    title or authors are never shown do not pay for it.
+
     """
     UNKNOWN_TITLE = "Unknown title"
     UNKNOWN_YEAR = 0
     UNKNOWN_AUTHORS = ''
+    AUTHOR_LIMIT = 3
+
+    REGEX_HTML = re.compile(r'<(.*?)>(.*?)</\1>')
+    REGEX_WORD_START = re.compile(r'(^|\s)(\S)')
+
+    # fields of the work JSON read for each value of a result
+    API_FIELDS = {
+        'doi'       : ('URL',),
+        'score'     : ('score',),
+        'year'      : ('issued',),
+        'title'     : ('title',),
+        'authors'   : ('author',),
+        'type'      : ('type',),
+        'publisher' : ('publisher',),
+        'url'       : ('URL',),
+    }
+
+    __slots__ = ('doi', 'publisher', 'score', 'subtitle', 'type', 'year',
+            'url', '_title', '_raw_title', '_authors', '_raw_authors')
 
     def __init__(self, json=None):
-        self.authors   = None
-        self.doi       = None
-        self.publisher = None
-        self.score     = None
-        self.subtitle  = None
-        self.title     = None
-        self.type      = None
-        self.year      = None
-        self.url       = None
+        self.doi         = None
+        self.publisher   = None
+        self.score       = None
+        self.subtitle    = None
+        self.type        = None
+        self.year        = None
+        self.url         = None
+        self._title      = None
+        self._raw_title  = None
+        self._authors    = None
+        self._raw_authors = None
 
         if json is not None:
             self.parse_json(json)
 
+    @property
+    def title(self):
+        return self.get_title()
+
+    @property
+    def authors(self):
+        return self.get_authors()
+
+    @classmethod
+    def get_api_fields(cls, names):
+        """
+        @return: (list) sorted fields of the work JSON, which are needed for
+            the values `names` of a result, e.g. `title` or `authors`
+
+        """
+        fields = set()
+        for name in names:
+            if name not in cls.API_FIELDS:
+                raise ValueError("Value {} of search results is unknown. \
+Valid values are: {}".format(name, ", ".join(cls.API_FIELDS)))
+            fields.update(cls.API_FIELDS[name])
+        return sorted(fields)
+
     def parse_json(self, json):
-        self.doi = DOI(json.get('URL', None))
+        with Profiler.get_instance().measure('searchresult.parse'):
+            self._parse_json(json)
+
+    def _parse_json(self, json):
+        # sets every slot, so results of a page can skip `__init__`
+        self.subtitle = None
+        self.url = json.get('URL', None)
+        self.doi = DOI(self.url)
         self.score = float(json.get('score', 0.))
+        self._title = None
         try:
-            self.title = self.format_title(json['title'][0])
+            self._raw_title = json['title'][0]
         except (IndexError, KeyError):
-            self.title = self.UNKNOWN_TITLE
+            self._raw_title = None
+        if not isinstance(self._raw_title, str):
+            self._raw_title = None
+            self._title = self.UNKNOWN_TITLE
 
         #self.timestamp = float(json['deposited']['timestamp'])/1000.
         try:
             self.year = int(json['issued']['date-parts'][0][0])
         except (TypeError, KeyError, IndexError):
             self.year = self.UNKNOWN_YEAR
-        try:
-            self.authors = self.__format_authors(json['author'])
-        except KeyError:
-            self.authors = self.UNKNOWN_AUTHORS
+        self._authors = None
+        self._raw_authors = json.get('author', None)
+        if self._raw_authors is None:
+            self._authors = self.UNKNOWN_AUTHORS
         self.type = json.get('type', None)
         self.publisher = json.get('publisher', None)
-        self.url = json.get('URL', None)
 
     def format_title(self, title):
         def repl_func(m):
@@ -66,7 +125,7 @@ class SearchResult(object):
             title = title.lower()
 
         title = self.__clean_html(title).strip()
-        return re.sub("(^|\s)(\S)", repl_func, title)
+        return self.REGEX_WORD_START.sub(repl_func, title)
 
     def get_doi(self):
         return self.doi
@@ -75,14 +134,43 @@ class SearchResult(object):
         return self.score
 
     def get_title(self):
-        return self.title
+        if self._title is None:
+            self._title = self.format_title(self._raw_title)
+        return self._title
+
+    def get_raw_title(self):
+        """
+        @return: (str) title as given by the API or None if it is unknown
+
+        """
+        return self._raw_title
 
     def get_year(self):
         #return datetime.fromtimestamp(self.timestamp).year
         return self.year
 
     def get_authors(self):
-        return self.authors
+        if self._authors is None:
+            try:
+                self._authors = self.__format_authors(self._raw_authors)
+            except KeyError:
+                self._authors = self.UNKNOWN_AUTHORS
+        return self._authors
+
+    def get_author_names(self):
+        """
+        @return: (list) names of all authors as "family, given" or the name
+            of an organization, or None if the authors are unknown
+
+        """
+        if self._raw_authors is None:
+            return None
+        names = []
+        for author in self._raw_authors:
+            name = ", ".join(author[key] for key in ('family', 'given') if
+                    key in author)
+            names.append(name or author.get('name', ''))
+        return names
 
     def get_type(self):
         return self.type
@@ -100,10 +188,9 @@ class SearchResult(object):
         return self.doi.get_identifier()
 
     def __clean_html(self, raw_html):
-        regex = re.compile(r'<(.*?)>(.*?)</\1>')
-        return re.sub(regex, r"\2", raw_html)
+        return self.REGEX_HTML.sub(r"\2", raw_html)
 
-    def __format_authors(self, author_list, limit=3):
+    def __format_authors(self, author_list, limit=AUTHOR_LIMIT):
         author_temp = []
         for i, author in enumerate(author_list):
             if i >= limit: break
@@ -112,3 +199,49 @@ class SearchResult(object):
         if len(author_list) > limit:
             output += " et al."
         return output
+
+class SearchResultPage(object):
+    """
+    A page of search results, which parses the `items` of an API response in
+    a single pass. It behaves like a list of SearchResult objects.
+
+    """
+    __slots__ = ('results', 'total_results', 'next_cursor')
+
+    def __init__(self, items=(), total_results=None, next_cursor=None):
+        with Profiler.get_instance().measure('searchresult.parse_page',
+                items=len(items)):
+            results = []
+            append = results.append
+            new = SearchResult.__new__
+            for item in items:
+                sr = new(SearchResult)
+                sr._parse_json(item)
+                append(sr)
+        self.results = results
+        self.total_results = total_results
+        self.next_cursor = next_cursor
+
+    @classmethod
+    def from_message(cls, message):
+        """
+        @return: (SearchResultPage) results of a search response `message`
+
+        """
+        return cls(message.get('items', ()), message.get('total-results',
+            None), message.get('next-cursor', None))
+
+    def get_total_results(self):
+        return self.total_results
+
+    def get_next_cursor(self):
+        return self.next_cursor
+
+    def __len__(self):
+        return len(self.results)
+
+    def __getitem__(self, index):
+        return self.results[index]
+
+    def __iter__(self):
+        return iter(self.results)
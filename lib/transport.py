@@ -0,0 +1,259 @@
+import os
+import sys
+import logging
+import queue
+import threading
+import urllib.parse
+
+from lib.profiler import Profiler
+
+# httplib2 and http.client are imported on first use, since loading them
+# takes a considerable part of the startup time and commands served from the
+# cache do not need them at all
+
+class StreamedResponse(object):
+    """
+    Response of a streamed request. The body has to be consumed via `read()`,
+    afterwards `close()` hands the connection back to the transport, so it
+    can be reused by the next request to the same host.
+
+    """
+    def __init__(self, transport, key, connection, response, url):
+        self.transport = transport
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.url = url
+        self.status = response.status
+
+    def get_header(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def read(self, amt=None):
+        return self.response.read(amt)
+
+    def close(self):
+        if self.connection is None:
+            return
+        reusable = self.response.isclosed() and not self.response.will_close
+        if not reusable:
+            self.response.close()
+            self.connection.close()
+        self.transport._release_connection(self.key, self.connection,
+                reusable)
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class Transport(object):
+    """
+    Process wide HTTP transport. Connections are kept alive and shared between
+    all requests, so that a series of requests to the same host only pays once
+    for the DNS lookup and the TCP handshake.
+
+    API requests are handled by a pool of `httplib2.Http` clients which share
+    one response cache. Downloads use streamed connections, which are pooled
+    per host as well.
+
+    """
+    CACHE_PATH = ".cache"
+    TIMEOUT = 30
+    MAX_IDLE_CONNECTIONS = 8
+    MAX_REDIRECTIONS = 5
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """
+        @return: (Transport) the transport shared by the whole process
+
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def configure(cls, *args, **kwargs):
+        """
+        Replaces the transport shared by the whole process.
+
+        @return: (Transport) the new transport
+
+        """
+        with cls._instance_lock:
+            cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+    def __init__(self, cache=CACHE_PATH, timeout=TIMEOUT,
+            max_idle_connections=MAX_IDLE_CONNECTIONS):
+        self.cache_path = cache
+        self.cache = None
+        self.timeout = timeout
+        self.max_idle_connections = max_idle_connections
+        self.lock = threading.Lock()
+        self.clients = queue.LifoQueue()
+        self.connections = {}
+        self.connection_types = {}
+        self.stats = {
+            'pool_size'          : 0,
+            'requests'           : 0,
+            'connections_opened' : 0,
+            'connections_reused' : 0,
+        }
+
+    def get_stats(self):
+        """
+        @return: (dict) counters about the pool size and connection reuse
+
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats['idle_connections'] = sum(len(idle) for idle in
+                    self.connections.values())
+        return stats
+
+    def request(self, url, method="GET", headers=None, body=None):
+        """
+        Performs a request using one of the pooled `httplib2.Http` clients.
+
+        @return: (tuple) response and content as returned by httplib2
+
+        """
+        import httplib2
+
+        client = self._acquire_client()
+        try:
+            scheme, authority, _, _ = httplib2.urlnorm(url)
+            connection = client.connections.get(
+                    "{}:{}".format(scheme, authority))
+            self._count_connection(connection is not None and
+                    connection.sock is not None)
+            return client.request(url, method, body=body, headers=headers,
+                    connection_type=self._get_connection_type(scheme))
+        finally:
+            self.clients.put(client)
+
+    def open(self, url, headers=None, method="GET"):
+        """
+        Performs a streamed request and follows redirections.
+
+        @return: (StreamedResponse) response, whose body is not read yet
+
+        """
+        import http.client
+
+        for _ in range(self.MAX_REDIRECTIONS + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise ValueError("URL scheme {} is not supported.".format(
+                    parts.scheme))
+            key = (parts.scheme, parts.netloc)
+            path = urllib.parse.urlunsplit(('', '', parts.path or '/',
+                parts.query, ''))
+
+            connection, reused = self._acquire_connection(key)
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+            except (OSError, http.client.HTTPException):
+                self._release_connection(key, connection, False)
+                if not reused:
+                    raise
+                # the server has closed the idle connection in the meantime
+                connection, _ = self._acquire_connection(key, reuse=False)
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+
+            streamed = StreamedResponse(self, key, connection, response, url)
+            location = response.getheader('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                response.read()
+                streamed.close()
+                url = urllib.parse.urljoin(url, location)
+                logging.debug("Redirected to {}".format(url))
+                continue
+            return streamed
+        raise RuntimeError("Too many redirections for URL {}".format(url))
+
+    def _acquire_client(self):
+        import httplib2
+
+        try:
+            return self.clients.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                self.stats['pool_size'] += 1
+                if self.cache is None and self.cache_path is not None:
+                    self.cache = httplib2.FileCache(self.cache_path)
+            return httplib2.Http(self.cache, timeout=self.timeout)
+
+    def _acquire_connection(self, key, reuse=True):
+        import http.client
+
+        with self.lock:
+            idle = self.connections.get(key, [])
+            if reuse and len(idle) > 0:
+                self.stats['requests'] += 1
+                self.stats['connections_reused'] += 1
+                return idle.pop(), True
+        self._count_connection(False)
+        scheme, netloc = key
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(netloc,
+                    timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(netloc,
+                    timeout=self.timeout)
+        with Profiler.get_instance().measure('connect', host=netloc):
+            connection.connect()
+        return connection, False
+
+    def _get_connection_type(self, scheme):
+        """
+        @return: (type) httplib2 connection class, which records the time of
+            the DNS lookup and connection setup in the profiler, or None if
+            profiling is disabled
+
+        """
+        profiler = Profiler.get_instance()
+        if not profiler.is_enabled():
+            return None
+        import httplib2
+
+        with self.lock:
+            if scheme not in self.connection_types:
+                base = httplib2.HTTPConnectionWithTimeout
+                if scheme == 'https':
+                    base = httplib2.HTTPSConnectionWithTimeout
+
+                class TimedConnection(base):
+                    def connect(self):
+                        with Profiler.get_instance().measure('connect',
+                                host=self.host):
+                            super().connect()
+
+                self.connection_types[scheme] = TimedConnection
+            return self.connection_types[scheme]
+
+    def _release_connection(self, key, connection, reusable):
+        with self.lock:
+            idle = self.connections.setdefault(key, [])
+            if reusable and len(idle) < self.max_idle_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _count_connection(self, reused):
+        with self.lock:
+            self.stats['requests'] += 1
+            if reused:
+                self.stats['connections_reused'] += 1
+            else:
+                self.stats['connections_opened'] += 1
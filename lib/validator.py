@@ -4,7 +4,12 @@ import logging
 import re
 
 class Validator(object):
+    """
+    Checks the values of filters for the works endpoint. Every filter key has
+    a data type, which selects the check of its values; the checks of all
+    keys are looked up in a table built once per process.
 
+    """
     UNKNOWN   = 0
     BOOLEAN   = 1
     INTEGER   = 2
@@ -20,90 +25,151 @@ class Validator(object):
     DIRECTORY = 12
     DOI       = 13
 
-    def __init__(self):
-        pass
-
-    def __get_valid_values(self):
-        valid_values = [
-            ('has-funder'               , self.BOOLEAN   ),
-            ('funder'                   , self.FUNDER_ID ),
-            ('prefix'                   , self.DOI       ),
-            ('member'                   , self.MEMBER_ID ),
-            ('from-index-date'          , self.DATE      ),
-            ('until-index-date'         , self.DATE      ),
-            ('from-deposition-date'     , self.DATE      ),
-            ('until-deposition-date'    , self.DATE      ),
-            ('from-frist-deposit-date'  , self.DATE      ),
-            ('until-first-deposit-date' , self.DATE      ),
-            ('from-pub-date'            , self.DATE      ),
-            ('until-pub-date'           , self.DATE      ),
-            ('has-license'              , self.BOOLEAN   ),
-            ('license.url'              , self.URL       ),
-            ('license.version'          , self.STRING    ),
-            ('license.delay'            , self.INTEGER   ),
-            ('has-full-text'            , self.BOOLEAN   ),
-            ('full-text.version'        , self.STRING    ),
-            ('full-text.type'           , self.MIME_TYPE ),
-            ('public-references'        , self.UNKNOWN   ),
-            ('has-references'           , self.BOOLEAN   ),
-            ('has-archive'              , self.BOOLEAN   ),
-            ('archive'                  , self.STRING    ),
-            ('has-orcid'                , self.BOOLEAN   ),
-            ('orcid'                    , self.ORCID     ),
-            ('issn'                     , self.ISSN      ),
-            ('type'                     , self.TYPE      ),
-            ('directory'                , self.DIRECTORY ),
-            ('doi'                      , self.DOI       ),
-            ('updates'                  , self.DOI       ),
-            ('is-update'                , self.BOOLEAN   ),
-            ('has-update-policy'        , self.BOOLEAN   ),
-        ]
-        return valid_values
+    RULES = (
+        ('has-funder'               , BOOLEAN   ),
+        ('funder'                   , FUNDER_ID ),
+        ('prefix'                   , DOI       ),
+        ('member'                   , MEMBER_ID ),
+        ('from-index-date'          , DATE      ),
+        ('until-index-date'         , DATE      ),
+        ('from-deposition-date'     , DATE      ),
+        ('until-deposition-date'    , DATE      ),
+        ('from-frist-deposit-date'  , DATE      ),
+        ('until-first-deposit-date' , DATE      ),
+        ('from-pub-date'            , DATE      ),
+        ('until-pub-date'           , DATE      ),
+        ('has-license'              , BOOLEAN   ),
+        ('license.url'              , URL       ),
+        ('license.version'          , STRING    ),
+        ('license.delay'            , INTEGER   ),
+        ('has-full-text'            , BOOLEAN   ),
+        ('full-text.version'        , STRING    ),
+        ('full-text.type'           , MIME_TYPE ),
+        ('public-references'        , UNKNOWN   ),
+        ('has-references'           , BOOLEAN   ),
+        ('has-archive'              , BOOLEAN   ),
+        ('archive'                  , STRING    ),
+        ('has-orcid'                , BOOLEAN   ),
+        ('orcid'                    , ORCID     ),
+        ('issn'                     , ISSN      ),
+        ('type'                     , TYPE      ),
+        ('directory'                , DIRECTORY ),
+        ('doi'                      , DOI       ),
+        ('updates'                  , DOI       ),
+        ('is-update'                , BOOLEAN   ),
+        ('has-update-policy'        , BOOLEAN   ),
+    )
+
+    REGEX_DATE      = re.compile(r"^\d{4}((-\d{2}){1,2})?$")
+    REGEX_MIME_TYPE = re.compile(r"^.+/.+$")
+    REGEX_ORCID     = re.compile(r"(http\:\/\/orcid\.org/)?\d{4}-\d{4}-\d{4}-\d{4}")
+    REGEX_ISSN      = re.compile(r"^.{4}-.{4}$")
+    REGEX_DOI       = re.compile(r"(http\:\/\/dx\.doi\.org/)?10\.[\d\.]+(/*)?")
+
+    _checks = None
+
+    def __init__(self, types=None):
+        """
+        `types` is the registry of valid types; by default the registry of
+        the API is loaded when a type is checked for the first time.
+
+        """
+        self.types = types
+
+    @classmethod
+    def get_checks(cls):
+        """
+        @return: (dict) check of each filter key; a check is called with the
+            validator and the value
+
+        """
+        if cls._checks is None:
+            checks = {
+                cls.UNKNOWN   : cls._is_unknown,
+                cls.DIRECTORY : cls._is_unknown,
+                cls.BOOLEAN   : cls._is_boolean,
+                cls.INTEGER   : cls._is_integer,
+                cls.STRING    : cls._is_string,
+                cls.DATE      : cls._is_date,
+                cls.URL       : cls._is_url,
+                cls.MIME_TYPE : cls._is_mime_type,
+                cls.ORCID     : cls._is_orcid,
+                cls.ISSN      : cls._is_issn,
+                cls.TYPE      : cls._is_type,
+                cls.DOI       : cls._is_doi,
+                cls.FUNDER_ID : cls._is_doi,
+                cls.MEMBER_ID : cls._is_doi,
+            }
+            cls._checks = {key: checks[type_] for key, type_ in cls.RULES}
+        return cls._checks
 
     def is_valid(self, key, value):
-        valid_values = self.__get_valid_values()
-        if key not in [v[0] for v in valid_values]:
+        try:
+            check = self.get_checks()[key]
+        except KeyError:
             raise ValueError("Key {} is invalid an cannot be added to the \
 filter list.".format(key))
+        return check(self, value)
+
+    def validate_all(self, filters):
+        """
+        Checks all (key, value) tuples of `filters` and raises a `ValueError`
+        for the first invalid one.
+
+        """
+        checks = self.get_checks()
+        for key, value in filters:
+            try:
+                check = checks[key]
+            except KeyError:
+                raise ValueError("Key {} is invalid an cannot be added to the \
+filter list.".format(key))
+            if not check(self, value):
+                raise ValueError("Formatting for key {} is not valid.".format(
+                    key))
+
+    def _is_unknown(self, value):
+        logging.debug("Datatype handling is unkown. Assuming it is valid.")
+        return True
+
+    def _is_boolean(self, value):
+        return type(value) is bool
+
+    def _is_integer(self, value):
+        return type(value) is int
+
+    def _is_string(self, value):
+        return type(value) is str
+
+    def _is_date(self, value):
+        if type(value) is int:
+            # convert to string if necessary
+            value = str(value)
+        return isinstance(value, str) and \
+                self.REGEX_DATE.match(value) is not None
+
+    def _is_url(self, value):
+        return type(value) is str and value.startswith('http://')
+
+    def _is_mime_type(self, value):
+        return isinstance(value, str) and \
+                self.REGEX_MIME_TYPE.match(value) is not None
+
+    def _is_orcid(self, value):
+        return isinstance(value, str) and \
+                self.REGEX_ORCID.match(value) is not None
+
+    def _is_issn(self, value):
+        return isinstance(value, str) and \
+                self.REGEX_ISSN.match(value) is not None
+
+    def _is_type(self, value):
+        if self.types is None:
+            # lib.api depends on this module via the request
+            from lib.api import API
+            self.types = API().get_valid_types()
+        return value in self.types
 
-        for k, t in valid_values:
-            if k == key:
-                if not self.__is_valid(value, t):
-                    return False
-                return True
-        return False
-
-    def __is_valid(self, value, type_):
-        if type_ in (self.UNKNOWN, self.DIRECTORY):
-            logging.debug("Datatype handling is unkown. Assuming it is valid.")
-            return True
-        elif type_ == self.BOOLEAN:
-            return type(value) is type(True)
-        elif type_ == self.INTEGER:
-            return type(value) == type(0)
-        elif type_ == self.STRING:
-            return type(value) == type("string")
-        elif type_ == self.DATE:
-            if type(value) == type(0):
-                # convert to string if necessary
-                value = str(value)
-            regex = re.compile("^\d{4}((-\d{2}){1,2})?$")
-            return regex.match(value) is not None
-        elif type_ == self.URL:
-            return type(value) == type("string") and value.startswith('http://')
-        elif type_ == self.MIME_TYPE:
-            regex = re.compile("^.+/.+$")
-            return regex.match(value) is not None
-        elif type_ == self.ORCID:
-            regex = re.compile("(http\:\/\/orcid\.org/)?\d{4}-\d{4}-\d{4}-\d{4}")
-            return regex.match(value) is not None
-        elif type_ == self.ISSN:
-            regex = re.compile("^.{4}-.{4}$")
-            return regex.match(value) is not None
-        elif type_ == self.TYPE:
-            # TODO: Wed Jun  4 21:04:32 CEST 2014, @fabi, comment:
-            # implementation missing
-            raise NotImplemented("Sanity check needs to be implemented")
-        elif type_ in (self.DOI, self.FUNDER_ID, self.MEMBER_ID):
-            regex = re.compile("(http\:\/\/dx\.doi\.org/)?10\.[\d\.]+(/*)?")
-            return regex.match(value) is not None
+    def _is_doi(self, value):
+        return isinstance(value, str) and \
+                self.REGEX_DOI.match(value) is not None
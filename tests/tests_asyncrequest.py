@@ -0,0 +1,116 @@
+import unittest
+import asyncio
+
+from benchmarks.server import CrossrefServer
+from lib.search.asyncrequest import AsyncRequest
+from lib.search.request import Request
+from lib.asynctransport import AsyncTransport
+from lib.ratelimiter import RateLimiter
+from lib.retry import RetryPolicy, TransientError
+
+class LocalAsyncRequest(AsyncRequest):
+    """
+    AsyncRequest which uses a local `CrossrefServer` instead of the API.
+
+    """
+    def __init__(self, address, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.URL_API_BASE = address
+        self.URL_SERVICE_DOIS = "{}/works".format(address)
+
+class TestAsyncRequest(unittest.TestCase):
+    def setUp(self):
+        self.server = CrossrefServer().start()
+        RateLimiter.configure(limit=self.server.rate_limit)
+        RetryPolicy.configure(base_delay=0.0)
+
+    def tearDown(self):
+        self.server.stop()
+        RateLimiter._instance = None
+        RetryPolicy._instance = None
+
+    def run_request(self, func, **kwargs):
+        async def run():
+            async with LocalAsyncRequest(self.server.get_address(),
+                    **kwargs) as req:
+                return await func(req), req.transport.get_stats()
+        return asyncio.run(run())
+
+    def test_citation(self):
+        async def cite(req):
+            return await req.citation(req.prepare_citation_query(
+                '10.1000/1'), style='apa')
+        result, _ = self.run_request(cite)
+        self.assertTrue(result.startswith("Lovelace, A., & Babbage, C."))
+        self.assertTrue(result.endswith("10.1000/1 (apa)"))
+
+    def test_citation_local(self):
+        async def cite(req):
+            return await req.citation(req.prepare_citation_query(
+                '10.1000/1'), style='bibtex')
+        result, stats = self.run_request(cite, render=Request.RENDER_LOCAL)
+        self.assertTrue(result.startswith("@"))
+        self.assertIn("Benchmark work 10.1000/1", result)
+
+    def test_concurrent(self):
+        dois = ['10.1000/{:d}'.format(i) for i in range(500)]
+
+        async def cite_all(req):
+            return await asyncio.gather(*(req.citation(
+                req.prepare_citation_query(doi)) for doi in dois))
+        results, stats = self.run_request(cite_all,
+                transport=AsyncTransport(max_connections=8))
+        self.assertEqual(len(results), len(dois))
+        for doi, result in zip(dois, results):
+            self.assertTrue(result.endswith("{} (bibtex)".format(doi)))
+        # all requests share a few keep-alive connections
+        self.assertLessEqual(stats['connections_opened'], 8)
+        self.assertEqual(stats['requests'], len(dois))
+
+    def test_search(self):
+        async def search(req):
+            query = req.prepare_search_query("foo", rows=10)
+            first = await req.search(query)
+            pages = [page async for page in req.search_pages(query,
+                max_results=25)]
+            return first, pages
+        (first, pages), _ = self.run_request(search)
+        self.assertEqual(len(first['items']), 10)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(pages[2][4].get_doi().get_identifier(),
+                '10.5555/bench.24')
+
+    def test_download_links(self):
+        async def links(req):
+            single = await req.get_download_links('10.1000/1')
+            batch = await req.get_download_links_batch(['10.1000/{:d}'.format(
+                i) for i in range(7)], batch_size=3)
+            return single, batch
+        (single, batch), _ = self.run_request(links)
+        self.assertEqual(len(single), 1)
+        self.assertTrue(single[0].get_url().endswith('/files/10.1000/1.pdf'))
+        self.assertEqual(len(batch), 7)
+
+    def test_retry(self):
+        self.server.error_rate = 0.3
+
+        async def cite_all(req):
+            return await asyncio.gather(*(req.citation(
+                req.prepare_citation_query('10.1000/{:d}'.format(i))) for i in
+                range(20)))
+        results, _ = self.run_request(cite_all)
+        self.assertEqual(len(results), 20)
+        self.assertGreater(RetryPolicy.get_instance().get_stats()['retries'],
+                0)
+
+    def test_connection_error(self):
+        RetryPolicy.configure(max_attempts=2, base_delay=0.0)
+        self.server.stop()
+
+        async def cite(req):
+            return await req.citation(req.prepare_citation_query('10.1000/1'))
+        self.assertRaises(TransientError, self.run_request, cite)
+        self.server = CrossrefServer().start()
+
+if __name__ == "__main__":
+    unittest.main()
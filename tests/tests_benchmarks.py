@@ -0,0 +1,45 @@
+import unittest
+
+from benchmarks.server import CrossrefServer
+from benchmarks.runner import BenchmarkRunner
+from lib.helper import Helper
+from lib.transport import Transport
+from lib.ratelimiter import RateLimiter
+from lib.retry import RetryPolicy
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.server = CrossrefServer(file_size=1024).start()
+        self.runner = BenchmarkRunner(self.server, retry_delay=0.0)
+
+    def tearDown(self):
+        self.server.stop()
+        Transport._instance = None
+        RateLimiter._instance = None
+        RetryPolicy._instance = None
+
+    def test_scenarios(self):
+        for scenario in BenchmarkRunner.SCENARIOS:
+            result = self.runner.run(scenario, 3, 2)
+            self.assertEqual(result['scenario'], scenario)
+            self.assertEqual(result['errors'], 0)
+            self.assertGreater(result['requests'], 0)
+            self.assertIsNotNone(result['latency_ms']['p99'])
+
+    def test_error_injection(self):
+        self.server.error_rate = 0.5
+        result = self.runner.run('cite', 10, 1)
+        self.assertGreater(result['retries'], 0)
+
+    def test_unknown_scenario(self):
+        self.assertRaises(ValueError, self.runner.run, 'foo', 1, 1)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(Helper.percentile(values, 50), 50)
+        self.assertEqual(Helper.percentile(values, 99), 99)
+        self.assertEqual(Helper.percentile([3], 95), 3)
+        self.assertIsNone(Helper.percentile([], 50))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+import unittest
+import io
+import os
+import json
+import time
+import tempfile
+import shutil
+
+from lib.bulkconverter import BulkConverter
+from lib.search.request import Request
+from lib.doi import DOI
+
+class FakeRequest(Request):
+    """
+    Request replacement which answers citation queries without using the
+    network.
+
+    """
+    def citation(self, query, style='bibtex'):
+        identifier = query[:-len('/transform')]
+        if identifier.endswith('9'):
+            raise RuntimeError("The server responded with code 404")
+        # delay the first DOIs the longest to provoke out of order results
+        time.sleep(0.01 / int(identifier[-1]))
+        return "{} ({})".format(identifier, style)
+
+class FakeWorksRequest(Request):
+    """
+    Request replacement which looks up work metadata without using the
+    network.
+
+    """
+    def __init__(self):
+        super().__init__(render=Request.RENDER_LOCAL)
+        self.lookups = []
+
+    def citation(self, query, style='bibtex'):
+        raise RuntimeError("Citations have to be rendered locally")
+
+    def get_works(self, identifiers, batch_size=Request.BATCH_SIZE):
+        self.lookups.append(identifiers)
+        # like `Request.get_works`, an invalid DOI fails the whole lookup
+        for i in identifiers:
+            DOI(i)
+        return {i: {'URL': 'http://dx.doi.org/' + i, 'title': [i]} for i in
+                identifiers if not i.endswith('9')}
+
+class TestBulkConverter(unittest.TestCase):
+    def setUp(self):
+        self.input = "# comment\n10.1000/1\n10.1000/2\n\n10.1000/3\n"
+        self.output = "10.1000/1 (apa)\n10.1000/2 (apa)\n10.1000/3 (apa)\n"
+
+    def test_run_sequential(self):
+        out = io.StringIO()
+        b = BulkConverter(FakeRequest())
+        self.assertTrue(b.run(io.StringIO(self.input), out, style='apa'))
+        self.assertEqual(out.getvalue(), self.output)
+
+    def test_run_parallel_keeps_input_order(self):
+        out = io.StringIO()
+        b = BulkConverter(FakeRequest())
+        self.assertTrue(b.run(io.StringIO(self.input), out, style='apa',
+            workers=3))
+        self.assertEqual(out.getvalue(), self.output)
+
+    def test_run_reports_failures(self):
+        out = io.StringIO()
+        b = BulkConverter(FakeRequest())
+        result = b.run(io.StringIO("10.1000/9\n" + self.input), out,
+                style='apa', workers=2)
+        self.assertFalse(result)
+        self.assertEqual(out.getvalue(), self.output)
+        self.assertEqual([f[0] for f in b.get_failed()], ['10.1000/9'])
+
+    def test_run_ndjson(self):
+        out = io.StringIO()
+        b = BulkConverter(FakeRequest())
+        result = b.run(io.StringIO("10.1000/9\n" + self.input), out,
+                style='apa', workers=2, format_='ndjson')
+        self.assertFalse(result)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r['doi'] for r in records], ['10.1000/9',
+            '10.1000/1', '10.1000/2', '10.1000/3'])
+        self.assertEqual([r['status'] for r in records], ['error', 'ok', 'ok',
+            'ok'])
+        self.assertIn('404', records[0]['error'])
+        self.assertEqual(records[1]['citation'], '10.1000/1 (apa)')
+        self.assertEqual(records[1]['style'], 'apa')
+        self.assertGreater(records[1]['seconds'], 0)
+        self.assertRaises(ValueError, b.run, io.StringIO(self.input), out,
+                style='apa', format_='xml')
+
+    def test_run_invalid_number_of_workers(self):
+        b = BulkConverter(FakeRequest())
+        self.assertRaises(ValueError, b.run, io.StringIO(self.input),
+                io.StringIO(), 'apa', 0)
+
+    def test_run_streams_input(self):
+        b = BulkConverter(FakeRequest())
+        lines = ("10.1000/{:d}{:d}\n".format(i, i % 8 + 1) for i in
+                range(100))
+        out = io.StringIO()
+        self.assertTrue(b.run(lines, out, style='apa', workers=4))
+        self.assertEqual(len(out.getvalue().splitlines()), 100)
+
+    def test_run_renders_locally_with_invalid_doi(self):
+        req = FakeWorksRequest()
+        out = io.StringIO()
+        b = BulkConverter(req)
+        result = b.run(io.StringIO(self.input + "bad\n"), out, style='bibtex')
+        self.assertFalse(result)
+        # only the invalid line fails, the others are looked up
+        self.assertEqual(req.lookups, [['10.1000/1', '10.1000/2',
+            '10.1000/3']])
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertEqual([f[0] for f in b.get_failed()], ['bad'])
+
+    def test_run_skips_duplicates(self):
+        out = io.StringIO()
+        b = BulkConverter(FakeRequest())
+        self.assertTrue(b.run(io.StringIO(self.input + "10.1000/2\n\
+http://dx.doi.org/10.1000/1\n10.1000/3\n"), out, style='apa', workers=2,
+            dedupe=True))
+        self.assertEqual(out.getvalue(), self.output)
+        self.assertEqual(b.get_duplicates(), 3)
+
+    def test_run_without_dedupe(self):
+        out = io.StringIO()
+        b = BulkConverter(FakeRequest())
+        # duplicates are only skipped on request, see `--dedupe`
+        self.assertTrue(b.run(io.StringIO(self.input + "10.1000/2\n"), out,
+            style='apa'))
+        self.assertEqual(out.getvalue(), self.output + "10.1000/2 (apa)\n")
+        self.assertEqual(b.get_duplicates(), 0)
+
+    def test_run_ndjson_reports_duplicates(self):
+        for req in (FakeRequest(), FakeWorksRequest()):
+            out = io.StringIO()
+            b = BulkConverter(req)
+            self.assertTrue(b.run(io.StringIO(self.input + "10.1000/2\n"), out,
+                style='bibtex', workers=2, format_='ndjson', dedupe=True))
+            records = [json.loads(line) for line in
+                    out.getvalue().splitlines()]
+            # every DOI of the input has a record
+            self.assertEqual([r['doi'] for r in records], ['10.1000/1',
+                '10.1000/2', '10.1000/3', '10.1000/2'])
+            self.assertEqual([r['status'] for r in records], ['ok', 'ok',
+                'ok', 'duplicate'])
+            self.assertNotIn('citation', records[3])
+
+    def test_run_skips_duplicates_after_resume(self):
+        directory = tempfile.mkdtemp()
+        try:
+            output = os.path.join(directory, 'out.txt')
+            journal = output + '.journal'
+            with open(output, 'w') as f:
+                f.write("10.1000/1 (apa)\n")
+            with open(journal, 'w') as f:
+                json.dump({'lines': 2, 'offset': 16, 'style': 'apa'}, f)
+
+            b = BulkConverter(FakeRequest())
+            with open(output, 'a') as f:
+                self.assertTrue(b.run(io.StringIO(self.input + "10.1000/1\n"),
+                    f, style='apa', journal=journal, resume=True,
+                    dedupe=True))
+            with open(output, 'r') as f:
+                self.assertEqual(f.read(), self.output)
+            self.assertEqual(b.get_duplicates(), 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_run_resumes_from_checkpoint(self):
+        directory = tempfile.mkdtemp()
+        try:
+            output = os.path.join(directory, 'out.txt')
+            journal = output + '.journal'
+            # an interrupted run, which has written the first two citations
+            # and a third one after its last checkpoint
+            with open(output, 'w') as f:
+                f.write("10.1000/1 (apa)\n10.1000/2 (apa)\nincomplete")
+            with open(journal, 'w') as f:
+                json.dump({'lines': 3, 'offset': 32, 'style': 'apa'}, f)
+
+            b = BulkConverter(FakeRequest())
+            with open(output, 'a') as f:
+                self.assertTrue(b.run(io.StringIO(self.input), f,
+                    style='apa', journal=journal, resume=True))
+            with open(output, 'r') as f:
+                self.assertEqual(f.read(), self.output)
+            self.assertFalse(os.path.isfile(journal))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_run_renders_locally_in_batches(self):
+        req = FakeWorksRequest()
+        req.BATCH_SIZE = 2
+        out = io.StringIO()
+        b = BulkConverter(req)
+        result = b.run(io.StringIO(self.input + "10.1000/9\n"), out,
+                style='bibtex', workers=2)
+        self.assertFalse(result)
+        self.assertEqual(len(req.lookups), 2)
+        self.assertEqual(out.getvalue().splitlines()[2],
+                "@misc{Unknown_Unknown, title={10.1000/3}, \
+url={http://dx.doi.org/10.1000/3}, DOI={10.1000/3}}")
+        self.assertEqual([f[0] for f in b.get_failed()], ['10.1000/9'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import io
+import os
+import threading
+import tempfile
+import shutil
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lib.bulkdownloader import BulkDownloader
+from lib.search.request import Request
+
+class FileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    content = b'%PDF' * 256
+    paths = []
+    filename = None
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.content)))
+        if self.filename is not None:
+            self.send_header('Content-Disposition',
+                    'attachment; filename="{}"'.format(self.filename))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
+
+class FakeLinksRequest(Request):
+    """
+    Request replacement which looks up work metadata without using the
+    network. The full texts of all works are served by a local server.
+
+    """
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.lookups = []
+
+    def get_works(self, identifiers, batch_size=Request.BATCH_SIZE):
+        self.lookups.append(identifiers)
+        works = {}
+        for i in identifiers:
+            if i.endswith('unknown'):
+                continue
+            path = '/missing' if i.endswith('9') else '/' + i
+            works[i] = {'link': [{'URL': self.url + path}]}
+        return works
+
+class TestBulkDownloader(unittest.TestCase):
+    def setUp(self):
+        FileHandler.paths = []
+        FileHandler.filename = None
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.request = FakeLinksRequest("http://127.0.0.1:{:d}".format(
+            self.server.server_port))
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_run(self):
+        in_ = io.StringIO("# reading list\n10.1000/1\n\n10.1000/2\n")
+        b = BulkDownloader(self.request)
+        self.assertTrue(b.run(in_, self.directory, workers=2))
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                ['10.1000_1.pdf', '10.1000_2.pdf'])
+        self.assertEqual(self.request.lookups, [['10.1000/1', '10.1000/2']])
+        summary = b.get_summary()
+        self.assertEqual(summary['dois'], 2)
+        self.assertEqual(summary['downloaded'], 2)
+        self.assertEqual(summary['bytes'], 2 * len(FileHandler.content))
+        self.assertIn("2 files downloaded", b.format_summary())
+
+    def test_skip_existing_files(self):
+        with open(os.path.join(self.directory, '10.1000_1.pdf'), 'wb') as f:
+            f.write(b'')
+        in_ = io.StringIO("10.1000/1\n10.1000/2\n")
+        b = BulkDownloader(self.request)
+        self.assertTrue(b.run(in_, self.directory))
+        self.assertEqual(FileHandler.paths, ['/10.1000/2'])
+        self.assertEqual(b.get_summary()['skipped'], 1)
+        self.assertEqual(b.get_summary()['downloaded'], 1)
+
+    def test_ignore_server_filenames(self):
+        FileHandler.filename = 'fulltext.pdf'
+        b = BulkDownloader(self.request)
+        self.assertTrue(b.run(io.StringIO("10.1000/1\n10.1000/2\n"),
+            self.directory))
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                ['10.1000_1.pdf', '10.1000_2.pdf'])
+        FileHandler.paths = []
+        b = BulkDownloader(self.request)
+        self.assertTrue(b.run(io.StringIO("10.1000/1\n10.1000/2\n"),
+            self.directory))
+        self.assertEqual(FileHandler.paths, [])
+        self.assertEqual(b.get_summary()['skipped'], 2)
+
+    def test_failures(self):
+        in_ = io.StringIO("10.1000/1\n10.1000/9\n10.1000/unknown\nfoo\n")
+        b = BulkDownloader(self.request)
+        self.assertFalse(b.run(in_, self.directory))
+        self.assertEqual(sorted(i for i, _ in b.get_failed()),
+                ['10.1000/9', '10.1000/unknown', 'foo'])
+        self.assertEqual(os.listdir(self.directory), ['10.1000_1.pdf'])
+        self.assertEqual(b.get_summary()['failed'], 3)
+
+if __name__ == "__main__":
+    unittest.main()
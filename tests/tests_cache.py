@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from lib.cache import CitationCache
+from lib.search.request import Request
+
+class TestCitationCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache', 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_unknown_entry(self):
+        cache = CitationCache(self.path)
+        self.assertIsNone(cache.get('10.1063/1.3458497', 'bibtex'))
+        self.assertEqual(cache.get_stats()['misses'], 1)
+
+    def test_put_and_get_entry(self):
+        cache = CitationCache(self.path)
+        cache.put('10.1063/1.3458497', 'bibtex', '@article{...}')
+        self.assertEqual(cache.get('10.1063/1.3458497', 'bibtex'),
+                '@article{...}')
+        self.assertIsNone(cache.get('10.1063/1.3458497', 'apa'))
+        self.assertEqual(CitationCache(self.path).get_stats()['entries'], 1)
+
+    def test_expired_entry(self):
+        cache = CitationCache(self.path, ttl=-1)
+        cache.put('10.1063/1.3458497', 'bibtex', '@article{...}')
+        self.assertIsNone(cache.get('10.1063/1.3458497', 'bibtex'))
+
+    def test_eviction_of_least_recently_used_entries(self):
+        cache = CitationCache(self.path, max_size=20)
+        cache.put('10.1000/1', 'apa', 'a' * 8)
+        cache.put('10.1000/2', 'apa', 'b' * 8)
+        cache.get('10.1000/1', 'apa')
+        cache.put('10.1000/3', 'apa', 'c' * 8)
+        self.assertIsNotNone(cache.get('10.1000/1', 'apa'))
+        self.assertIsNone(cache.get('10.1000/2', 'apa'))
+        self.assertIsNotNone(cache.get('10.1000/3', 'apa'))
+        self.assertEqual(cache.get_stats()['size'], 16)
+
+    def test_purge(self):
+        cache = CitationCache(self.path)
+        cache.put('10.1000/1', 'apa', 'a')
+        cache.put('10.1000/1', 'bibtex', 'b')
+        self.assertEqual(cache.purge(), 2)
+        self.assertEqual(cache.get_stats()['entries'], 0)
+
+    def test_request_uses_cache_with_normalized_doi(self):
+        cache = CitationCache(self.path)
+        cache.put('10.1088/0004-637x/763/2/91', 'apa', 'Jardel et al.')
+        req = Request(cache=cache)
+        result = req.citation(req.prepare_citation_query(
+            'http://dx.doi.org/10.1088/0004-637X/763/2/91'), style='apa')
+        self.assertEqual(result, 'Jardel et al.')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import threading
+
+from lib.coalescer import Coalescer
+
+class TestCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.coalescer = Coalescer()
+
+    def run_concurrently(self, func, callers=8, key='key'):
+        """
+        Calls `func` from `callers` threads at once; the first call is held
+        until all other callers are waiting for it.
+
+        @return: (list) results or errors of all callers
+
+        """
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def held():
+            calls.append(None)
+            started.set()
+            release.wait()
+            return func()
+
+        results = [None] * callers
+
+        def call(i):
+            try:
+                results[i] = self.coalescer.call(key, held)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(0,))]
+        threads[0].start()
+        started.wait()
+        threads.extend(threading.Thread(target=call, args=(i,)) for i in
+                range(1, callers))
+        for thread in threads[1:]:
+            thread.start()
+        while self.coalescer.get_stats()['coalesced'] < callers - 1:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        return results
+
+    def test_concurrent_calls_share_result(self):
+        results = self.run_concurrently(lambda: 42)
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(self.coalescer.get_stats(), {'calls': 1,
+            'coalesced': 7})
+
+    def test_concurrent_calls_share_error(self):
+        def fail():
+            raise RuntimeError("The server responded with code 404")
+        results = self.run_concurrently(fail, callers=3)
+        for result in results:
+            self.assertIsInstance(result, RuntimeError)
+
+    def test_finished_calls_are_not_cached(self):
+        values = iter(range(3))
+        self.assertEqual(self.coalescer.call('key', lambda: next(values)), 0)
+        self.assertEqual(self.coalescer.call('key', lambda: next(values)), 1)
+        self.assertRaises(ValueError, self.coalescer.call, 'key',
+                lambda: int('x'))
+        self.assertEqual(self.coalescer.call('key', lambda: next(values)), 2)
+        self.assertEqual(self.coalescer.get_stats()['coalesced'], 0)
+
+    def test_different_keys(self):
+        self.assertEqual(self.coalescer.call('a', lambda: 1), 1)
+        self.assertEqual(self.coalescer.call('b', lambda: 2), 2)
+        self.assertEqual(self.coalescer.get_stats()['calls'], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import os
+import json
+import tempfile
+import shutil
+import threading
+
+from lib.daemon import Daemon, DaemonService
+from lib.daemonclient import DaemonClient
+from lib.search.request import Request
+
+class FakeRequest(Request):
+    """
+    Request replacement which answers queries without using the network and
+    counts the calls.
+
+    """
+    def __init__(self, render=Request.RENDER_REMOTE):
+        super().__init__(render=render)
+        self.calls = 0
+
+    def citation(self, query, style='bibtex'):
+        self.calls += 1
+        identifier = query[:-len(self.CITATION_SUFFIX)]
+        if identifier.endswith('9'):
+            raise RuntimeError("The server responded with code 404")
+        return "<i>{}</i> ({})".format(identifier, style)
+
+    def search(self, query):
+        self.calls += 1
+        return {'items': [{'DOI': '10.1000/1', 'title': ['First']},
+            {'DOI': '10.1000/2', 'title': ['Second']}]}
+
+    def get_work(self, identifier):
+        self.calls += 1
+        return {'DOI': identifier, 'link': [{'URL': 'http://example.org/a.pdf',
+            'content-version': 'vor'}], 'license': [{'URL':
+                'http://example.org/license', 'content-version': 'vor'}]}
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.address_file = os.path.join(self.directory, 'daemon.json')
+        self.service = DaemonService()
+        self.service.requests = {render: FakeRequest(render) for render in
+                (Request.RENDER_LOCAL, Request.RENDER_REMOTE)}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def start(self, **kwargs):
+        daemon = Daemon(self.service, address_file=self.address_file,
+                **kwargs).start()
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+
+        def stop():
+            daemon.server.shutdown()
+            thread.join()
+            daemon.stop()
+        self.addCleanup(stop)
+        return DaemonClient.find(self.address_file)
+
+    def test_cite(self):
+        client = self.start()
+        self.assertEqual(client.ping()['status'], 'ok')
+        result = client.cite('10.1000/1', 'apa')
+        self.assertEqual(result['citation'], '<i>10.1000/1</i> (apa)')
+        self.assertEqual(result['text'], '10.1000/1 (apa)')
+
+        # repeated calls are answered from memory
+        client.cite('10.1000/1', 'apa')
+        self.assertEqual(self.service.requests['remote'].calls, 1)
+
+    def test_search_and_links(self):
+        client = self.start()
+        items = client.search('foo', rows=2)['items']
+        self.assertEqual([item['DOI'] for item in items], ['10.1000/1',
+            '10.1000/2'])
+        links = client.get_download_links('10.1000/1')['links']
+        self.assertEqual(links, [{'url': 'http://example.org/a.pdf',
+            'license': 'http://example.org/license'}])
+
+    def test_errors(self):
+        client = self.start()
+        self.assertRaises(ValueError, client.cite, '10.1000/1', 'foo-style')
+        self.assertRaises(ValueError, client.search, 'foo', type_='foo-type')
+        self.assertRaises(ValueError, client.search, 'foo', offline=True)
+        self.assertRaises(RuntimeError, client.cite, '10.1000/9')
+        self.assertRaises(RuntimeError, client._call, '/foo', {})
+        # harvests of all results are streamed by the command itself
+        self.assertRaises(ValueError, client._call, '/search', {'query': 'foo',
+            'all': 1})
+
+    def test_timeout(self):
+        release = threading.Event()
+        self.service.ping = lambda: release.wait(5) and {'status': 'ok'}
+        client = self.start()
+        self.addCleanup(release.set)
+        client.timeout = 0.1
+        # a busy daemon must not be taken as unavailable
+        self.assertRaises(RuntimeError, client.ping)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "requires Unix sockets")
+    def test_unix_socket(self):
+        path = os.path.join(self.directory, 'daemon.sock')
+        client = self.start(socket_path=path)
+        self.assertEqual(client.address['socket'], path)
+        self.assertEqual(client.cite('10.1000/2')['text'],
+                '10.1000/2 (bibtex)')
+
+    def test_address_file(self):
+        self.assertIsNone(DaemonClient.find(self.address_file))
+
+        # stale address file of a process, which is not running anymore
+        with open(self.address_file, 'w') as f:
+            json.dump({'pid': 2**22 + 1, 'host': '127.0.0.1', 'port': 1}, f)
+        self.assertIsNone(DaemonClient.find(self.address_file))
+
+        daemon = Daemon(self.service, address_file=self.address_file).start()
+        self.assertEqual(DaemonClient.find(self.address_file).address,
+                daemon.get_address())
+        daemon.stop()
+        self.assertFalse(os.path.exists(self.address_file))
+
+if __name__ == "__main__":
+    unittest.main()
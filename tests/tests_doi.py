@@ -43,5 +43,10 @@ class TestDOI(unittest.TestCase):
         self.assertEqual(doi.get_URL(), "http://dx.doi.org/10.1063/1.3458497")
         self.assertEqual(doi.get_identifier(), "10.1063/1.3458497")
 
+    def test_normalized_identifier(self):
+        doi = DOI("http://dx.doi.org/10.1088/0004-637X/763/2/91")
+        self.assertEqual(doi.get_normalized_identifier(),
+                "10.1088/0004-637x/763/2/91")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import os
+import re
+import threading
+import time
+import tempfile
+import shutil
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lib.downloader import Downloader
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    content = bytes(range(256)) * 100
+    ranges = []
+
+    def do_GET(self):
+        header = self.headers.get('Range')
+        self.ranges.append(header)
+        start = 0
+        if header is not None:
+            start = int(re.match(r'bytes=(\d+)-', header).group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {:d}-{:d}/{:d}'.format(
+                start, len(self.content) - 1, len(self.content)))
+        else:
+            self.send_response(200)
+        if self.path == '/named':
+            self.send_header('Content-Disposition',
+                    'attachment; filename="paper.pdf"')
+        self.send_header('Content-Length', str(len(self.content) - start))
+        self.end_headers()
+        self.wfile.write(self.content[start:])
+
+    def log_message(self, *args):
+        pass
+
+class SlowDownloader(Downloader):
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def download(self, url, path, fallback_filename):
+        with self.lock:
+            SlowDownloader.running += 1
+            SlowDownloader.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            SlowDownloader.running -= 1
+        return fallback_filename
+
+class TestDownloader(unittest.TestCase):
+    def setUp(self):
+        RangeHandler.ranges = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:{:d}".format(self.server.server_port)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def _read(self, filepath):
+        with open(filepath, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        d = Downloader(chunk_size=1000)
+        filepath = d.download(self.url + '/file', self.directory, 'a.pdf')
+        self.assertEqual(filepath, os.path.join(self.directory, 'a.pdf'))
+        self.assertEqual(self._read(filepath), RangeHandler.content)
+        self.assertEqual(os.listdir(self.directory), ['a.pdf'])
+
+    def test_download_filename_of_server(self):
+        d = Downloader()
+        filepath = d.download(self.url + '/named', self.directory, 'a.pdf')
+        self.assertEqual(filepath, os.path.join(self.directory, 'paper.pdf'))
+
+    def test_resume_download(self):
+        with open(os.path.join(self.directory, 'a.pdf.part'), 'wb') as f:
+            f.write(RangeHandler.content[:1234])
+        filepath = Downloader().download(self.url + '/file', self.directory,
+                'a.pdf')
+        self.assertEqual(RangeHandler.ranges, ['bytes=1234-'])
+        self.assertEqual(self._read(filepath), RangeHandler.content)
+
+    def test_download_all(self):
+        jobs = [(self.url + '/file', self.directory, '{:d}.pdf'.format(i))
+                for i in range(4)]
+        filepaths = Downloader().download_all(jobs, workers=3)
+        self.assertEqual(filepaths, [os.path.join(self.directory,
+            '{:d}.pdf'.format(i)) for i in range(4)])
+        for filepath in filepaths:
+            self.assertEqual(self._read(filepath), RangeHandler.content)
+
+    def test_download_iter_per_host(self):
+        SlowDownloader.running = 0
+        SlowDownloader.max_running = 0
+        jobs = [('http://{}.example.org/{:d}'.format('ab'[i % 2], i),
+            self.directory, str(i)) for i in range(8)]
+        results = list(SlowDownloader().download_iter(jobs, workers=3,
+            per_host=1))
+        self.assertEqual(sorted(filepath for _, filepath in results),
+                sorted(str(i) for i in range(8)))
+        self.assertEqual(SlowDownloader.max_running, 2)
+
+    def test_download_iter_busy_host_does_not_block(self):
+        started = []
+
+        class RecordingDownloader(SlowDownloader):
+            def download(self, url, path, fallback_filename):
+                started.append(fallback_filename)
+                return super().download(url, path, fallback_filename)
+
+        # the job of host b is queued behind many jobs of the busy host a
+        jobs = [('http://a.example.org/{:d}'.format(i), self.directory,
+            str(i)) for i in range(12)]
+        jobs.append(('http://b.example.org/b', self.directory, 'b'))
+        results = list(RecordingDownloader().download_iter(jobs, workers=2,
+            per_host=1))
+        self.assertEqual(len(results), 13)
+        self.assertIn('b', started[:2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import gzip
+import json
+import tempfile
+import shutil
+
+from lib.dumpimporter import DumpImporter
+from lib.index import WorkIndex
+from lib.search.request import Request
+
+def make_work(doi, title):
+    return {
+        'DOI': doi,
+        'URL': 'http://dx.doi.org/{}'.format(doi),
+        'title': [title],
+        'issued': {'date-parts': [[2001]]},
+        'link': [{'URL': 'http://example.org/{}.pdf'.format(doi),
+            'content-version': 'vor'}],
+    }
+
+class OfflineRequest(Request):
+    """
+    Request replacement which fails on every access of the network.
+
+    """
+    def _request(self, *args, **kwargs):
+        raise RuntimeError("Network access is not allowed")
+
+class TestDumpImporter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dump = os.path.join(self.directory, 'dump')
+        os.makedirs(os.path.join(self.dump, 'part'))
+        with gzip.open(os.path.join(self.dump, '0.jsonl.gz'), 'wt') as f:
+            for i in range(25):
+                f.write(json.dumps(make_work('10.1000/l{:d}'.format(i),
+                    'Line record {:d}'.format(i))) + "\n")
+            f.write("not json\n\n")
+        with gzip.open(os.path.join(self.dump, 'part', '1.json.gz'),
+                'wt') as f:
+            json.dump({'items': [make_work('10.1000/f{:d}'.format(i),
+                'File record {:d}'.format(i)) for i in range(5)] +
+                [{'title': ['no DOI']}]}, f)
+        with open(os.path.join(self.dump, 'README'), 'w') as f:
+            f.write("not a dump file")
+        self.index = WorkIndex(os.path.join(self.directory, 'index.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check_import(self, importer):
+        self.assertEqual(importer.run(self.dump), 30)
+        stats = importer.get_stats()
+        self.assertEqual(stats['files'], 2)
+        self.assertEqual(stats['records'], 32)
+        self.assertEqual(stats['skipped'], 2)
+        self.assertGreater(stats['rate'], 0)
+        self.assertEqual(self.index.get_stats()['works'], 30)
+        self.assertEqual(self.index.search("record", rows=None)
+                ['total-results'], 30)
+
+    def test_import(self):
+        self._check_import(DumpImporter(self.index, workers=1, chunk_size=10))
+
+    def test_import_parallel(self):
+        self._check_import(DumpImporter(self.index, workers=2, chunk_size=4))
+
+    def test_no_dump_files(self):
+        empty = os.path.join(self.directory, 'empty')
+        os.makedirs(empty)
+        self.assertRaises(ValueError, DumpImporter(self.index).run, empty)
+
+    def test_lookups_served_from_index(self):
+        DumpImporter(self.index, workers=1).run(self.dump)
+        req = OfflineRequest(index=self.index, render=Request.RENDER_LOCAL,
+                index_lookups=True)
+        self.assertIn("File record 3", req.citation(
+            req.prepare_citation_query('10.1000/F3'), style='apa'))
+        links = req.get_download_links('10.1000/l7')
+        self.assertEqual([link.get_url() for link in links],
+                ['http://example.org/10.1000/l7.pdf'])
+        self.assertEqual(sorted(req.get_works(['10.1000/l1', '10.1000/f1'])),
+                ['10.1000/f1', '10.1000/l1'])
+
+    def test_lookups_not_served_from_index_by_default(self):
+        DumpImporter(self.index, workers=1).run(self.dump)
+        req = OfflineRequest(index=self.index, render=Request.RENDER_LOCAL)
+        # works in the index do not expire, so they are not used unless
+        # lookups are enabled
+        self.assertRaises(RuntimeError, req.get_work, '10.1000/l7')
+
+if __name__ == "__main__":
+    unittest.main()
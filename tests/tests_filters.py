@@ -1,6 +1,7 @@
 import unittest
 
 from lib.filter import Filters
+from lib.validator import Validator
 
 class TestDOI(unittest.TestCase):
     def setUp(self):
@@ -122,6 +123,48 @@ class TestDOI(unittest.TestCase):
         f = Filters()
         self.assertRaises(ValueError, f.add, 'full-text.version', 4)
 
+    ### TYPE TESTS
+
+    def test_add_valid_type_filter(self):
+        f = Filters()
+        f.add('type', 'journal-article')
+        self.assertEqual(f.get_formatted_filters(), "type:journal-article")
+
+    def test_add_invalid_type_filter(self):
+        f = Filters()
+        self.assertRaises(ValueError, f.add, 'type', 'journal-artcle')
+
+    def test_add_type_filter_custom_types(self):
+        f = Filters(Validator(types=['dataset']))
+        f.add('type', 'dataset')
+        self.assertRaises(ValueError, f.add, 'type', 'journal-article')
+
+    ### BULK TESTS
+
+    def test_add_all_mapping(self):
+        f = Filters()
+        f.add_all({'doi': [self.valid_doi, self.valid_doi_organization],
+            'has-funder': True})
+        self.assertEqual(f.get_formatted_filters(),
+                "doi:10.1063/1.3458497,doi:10.1000,has-funder:true")
+
+    def test_add_all_pairs(self):
+        f = Filters()
+        f.add_all(('doi', doi) for doi in (self.valid_doi,
+            self.valid_doi_organization))
+        self.assertEqual(f.get_formatted_filters(),
+                "doi:10.1063/1.3458497,doi:10.1000")
+
+    def test_add_all_invalid(self):
+        f = Filters()
+        f.add('from-pub-date', '2013')
+        self.assertRaises(ValueError, f.add_all, [('doi', self.valid_doi),
+            ('doi', self.invalid_doi)])
+        self.assertRaises(ValueError, f.add_all, [('doi', self.valid_doi),
+            ('unknown-key', 1)])
+        # nothing is added if a filter is invalid
+        self.assertEqual(f.get_filters(), [('from-pub-date', '2013')])
+
     ### OTHER TESTS
 
     def test_empty_filter(self):
@@ -136,5 +179,12 @@ class TestDOI(unittest.TestCase):
             self.assertIn(entry, ["doi:10.1063/1.3458497",
                 "from-pub-date:2013"])
 
+    def test_repeated_filter_entries(self):
+        f = Filters()
+        f.add('doi', self.valid_doi)
+        f.add('doi', self.valid_doi_organization)
+        self.assertEqual(f.get_formatted_filters(),
+                "doi:10.1063/1.3458497,doi:10.1000")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from lib.index import WorkIndex
+from lib.search.request import Request
+
+def make_work(doi, title, year, type_='journal-article', family='Hawking',
+        deposited=0):
+    return {
+        'DOI': doi,
+        'URL': 'http://dx.doi.org/{}'.format(doi),
+        'title': [title],
+        'author': [{'family': family, 'given': 'Stephen'}],
+        'issued': {'date-parts': [[year, 6]]},
+        'deposited': {'timestamp': deposited},
+        'type': type_,
+        'publisher': 'Nature Publishing Group',
+    }
+
+class IndexingRequest(Request):
+    """
+    Request replacement which answers searches without using the network.
+
+    """
+    def _request(self, url, *args, **kwargs):
+        return {'items': [make_work('10.1000/online', 'Online result', 2015)]}
+
+class TestWorkIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = WorkIndex(os.path.join(self.directory, 'index.sqlite'))
+        self.index.add_works([
+            make_work('10.1000/A', 'Black holes and baby universes', 1993,
+                type_='book', deposited=3),
+            make_work('10.1000/b', 'Particle creation by black holes', 1975,
+                deposited=1),
+            make_work('10.1000/c', 'The large scale structure of space-time',
+                1973, type_='book', family='Ellis', deposited=2),
+            {'title': ['Work without DOI']},
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _dois(self, message):
+        return [item['DOI'] for item in message['items']]
+
+    def test_search(self):
+        message = self.index.search("black holes")
+        self.assertEqual(message['total-results'], 2)
+        self.assertEqual(sorted(self._dois(message)), ['10.1000/A',
+            '10.1000/b'])
+        self.assertEqual(self._dois(self.index.search("ellis")),
+                ['10.1000/c'])
+
+    def test_filters(self):
+        self.assertEqual(self._dois(self.index.search("black", year=1980)),
+                ['10.1000/A'])
+        self.assertEqual(self._dois(self.index.search("hawking",
+            type_='book', sort='published', order='asc')), ['10.1000/A'])
+
+    def test_sort(self):
+        self.assertEqual(self._dois(self.index.search("", sort='published',
+            order='asc')), ['10.1000/c', '10.1000/b', '10.1000/A'])
+        self.assertEqual(self._dois(self.index.search("", sort='updated')),
+                ['10.1000/A', '10.1000/c', '10.1000/b'])
+        self.assertEqual(self._dois(self.index.search("", sort='deposited',
+            rows=1, offset=1)), ['10.1000/c'])
+        self.assertRaises(ValueError, self.index.search, "", sort='foo')
+
+    def test_update(self):
+        self.index.add_work(make_work('10.1000/b', 'Hawking radiation', 1975))
+        self.assertEqual(self.index.get_stats()['works'], 3)
+        self.assertEqual(self._dois(self.index.search("radiation")),
+                ['10.1000/b'])
+        self.assertEqual(self.index.search("particle")['total-results'], 0)
+
+    def test_get_work(self):
+        self.assertEqual(self.index.get_work('10.1000/a')['DOI'], '10.1000/A')
+        self.assertIsNone(self.index.get_work('10.1000/z'))
+
+    def test_search_results_are_indexed(self):
+        req = IndexingRequest(index=self.index)
+        req.search(req.prepare_search_query("online"))
+        self.assertEqual(self._dois(self.index.search("online")),
+                ['10.1000/online'])
+
+    def test_projected_search_results_are_indexed(self):
+        req = IndexingRequest(index=self.index)
+        req.search(req.prepare_search_query("online", select=['title',
+            'URL']))
+        self.assertEqual(self.index.search("online")['total-results'], 0)
+
+        req.search(req.prepare_search_query("online", select=sorted(
+            WorkIndex.FIELDS)))
+        self.assertEqual(self._dois(self.index.search("online")),
+                ['10.1000/online'])
+        # only complete records are looked up
+        self.assertIsNone(self.index.get_work('10.1000/online'))
+
+    def test_partial_update(self):
+        work = make_work('10.1000/b', 'Particle creation by black holes', 1975)
+        work['link'] = [{'URL': 'http://example.org/b.pdf'}]
+        self.index.add_work(work)
+        self.index.add_works([make_work('10.1000/b', 'Hawking radiation',
+            1975)], complete=False)
+        self.assertEqual(self._dois(self.index.search("radiation")),
+                ['10.1000/b'])
+        work = self.index.get_work('10.1000/b')
+        self.assertEqual(work['title'], ['Hawking radiation'])
+        self.assertEqual(work['link'], [{'URL': 'http://example.org/b.pdf'}])
+
+    def test_purge(self):
+        self.assertEqual(self.index.purge(), 3)
+        self.assertEqual(self.index.search("black")['total-results'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
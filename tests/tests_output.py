@@ -0,0 +1,81 @@
+import unittest
+import io
+import csv
+import json
+
+from lib.output import SearchResultWriter, NDJSONWriter, CSVWriter, TSVWriter
+from lib.search.result import SearchResult
+
+class TestOutput(unittest.TestCase):
+    def setUp(self):
+        self.message = {'items': [
+            {'URL': 'http://dx.doi.org/10.1000/1', 'score': 2.5,
+                'title': ['A <i>title</i>, with\ttabs and\nlines'],
+                'author': [{'given': 'Ada', 'family': 'Lovelace'},
+                    {'given': 'Charles', 'family': 'Babbage'},
+                    {'family': 'Menabrea'}, {'name': 'Analytical Society'}],
+                'issued': {'date-parts': [[1843]]}, 'type': 'journal-article',
+                'publisher': 'Taylor "Press"'},
+            {'URL': 'http://dx.doi.org/10.1000/2'},
+        ]}
+
+    def write(self, format_, content=None):
+        out = io.StringIO()
+        writer = SearchResultWriter.get_writer(format_, out)
+        written = writer.write_all(content if content is not None else
+                self.message)
+        self.assertEqual(written, 2)
+        return out.getvalue()
+
+    def test_get_writer(self):
+        self.assertIsInstance(SearchResultWriter.get_writer('ndjson',
+            io.StringIO()), NDJSONWriter)
+        self.assertIsInstance(SearchResultWriter.get_writer('tsv',
+            io.StringIO()), TSVWriter)
+        self.assertRaises(ValueError, SearchResultWriter.get_writer, 'xml',
+                io.StringIO())
+
+    def test_ndjson(self):
+        records = [json.loads(line) for line in self.write('ndjson')\
+                .splitlines()]
+        self.assertEqual(records[0]['doi'], '10.1000/1')
+        self.assertEqual(records[0]['year'], 1843)
+        # values are written as given by the API, with all authors
+        self.assertEqual(records[0]['title'],
+                'A <i>title</i>, with\ttabs and\nlines')
+        self.assertEqual(records[0]['authors'], ['Lovelace, Ada',
+            'Babbage, Charles', 'Menabrea', 'Analytical Society'])
+        self.assertEqual(records[0]['publisher'], 'Taylor "Press"')
+        self.assertEqual(list(records[0].keys()), list(
+            SearchResultWriter.FIELDS))
+        self.assertIsNone(records[1]['year'])
+        self.assertIsNone(records[1]['title'])
+        self.assertIsNone(records[1]['authors'])
+
+    def test_ndjson_streamed(self):
+        results = (SearchResult(item) for item in self.message['items'])
+        self.assertEqual(len(self.write('ndjson', results).splitlines()), 2)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.write('csv'))))
+        self.assertEqual(tuple(rows[0]), SearchResultWriter.FIELDS)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][0], '10.1000/1')
+        self.assertEqual(rows[1][3], self.message['items'][0]['title'][0])
+        self.assertEqual(rows[1][4], "Lovelace, Ada; Babbage, Charles; \
+Menabrea; Analytical Society")
+        self.assertEqual(rows[2][2], '')
+        self.assertEqual(rows[2][3], '')
+
+    def test_tsv(self):
+        lines = self.write('tsv').split("\n")
+        self.assertEqual(lines[0].split("\t"), list(SearchResultWriter.FIELDS))
+        # every result stays on a single line
+        self.assertEqual(len(lines), 4)
+        values = lines[1].split("\t")
+        self.assertEqual(len(values), len(SearchResultWriter.FIELDS))
+        self.assertIn("\\t", values[3])
+        self.assertIn("\\n", values[3])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import io
+import json
+
+from lib.profiler import Profiler
+from lib.search.result import SearchResult, SearchResultPage
+
+class TestProfiler(unittest.TestCase):
+    def tearDown(self):
+        Profiler._instance = None
+
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.measure('request.http'):
+            pass
+        self.assertFalse(profiler.is_enabled())
+        self.assertEqual(profiler.get_report(), {})
+
+    def test_report(self):
+        profiler = Profiler(enabled=True)
+        for i in range(1, 101):
+            profiler.record('request.http', i / 1000.)
+        with profiler.measure('request.decode'):
+            pass
+        report = profiler.get_report()
+        self.assertEqual(report['request.http']['count'], 100)
+        self.assertAlmostEqual(report['request.http']['total'], 5.05)
+        self.assertEqual(report['request.http']['p50'], 0.05)
+        self.assertEqual(report['request.http']['p95'], 0.095)
+        self.assertEqual(report['request.http']['p99'], 0.099)
+        self.assertEqual(report['request.decode']['count'], 1)
+        self.assertIn('request.http', profiler.format_report())
+
+    def test_metrics_file(self):
+        metrics = io.StringIO()
+        profiler = Profiler(metrics=metrics)
+        self.assertTrue(profiler.is_enabled())
+        with profiler.measure('download', url='http://example.org/a.pdf'):
+            pass
+        line = json.loads(metrics.getvalue())
+        self.assertEqual(line['phase'], 'download')
+        self.assertEqual(line['url'], 'http://example.org/a.pdf')
+        self.assertIn('duration_ms', line)
+        self.assertIn('time', line)
+
+    def test_parse_json_hook(self):
+        profiler = Profiler.configure(enabled=True)
+        SearchResult({'URL': 'http://dx.doi.org/10.1000/1', 'title': ['a']})
+        self.assertEqual(profiler.get_report()['searchresult.parse']['count'],
+                1)
+
+    def test_parse_page_phase(self):
+        profiler = Profiler.configure(enabled=True)
+        SearchResultPage([{'DOI': '10.1000/{:d}'.format(i), 'title': ['a']}
+            for i in range(3)])
+        report = profiler.get_report()
+        # pages do not skew the durations of single results
+        self.assertNotIn('searchresult.parse', report)
+        self.assertEqual(report['searchresult.parse_page']['count'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
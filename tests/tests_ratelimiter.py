@@ -0,0 +1,105 @@
+import unittest
+import asyncio
+
+from lib.ratelimiter import RateLimiter
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(limit=10, interval=1.0, clock=self.clock)
+
+    def test_reserve_burst(self):
+        delays = [self.limiter.reserve() for i in range(12)]
+        self.assertEqual(delays[:10], [0.0] * 10)
+        self.assertAlmostEqual(delays[10], 0.1)
+        self.assertAlmostEqual(delays[11], 0.2)
+
+    def test_reserve_refills(self):
+        for i in range(10):
+            self.limiter.reserve()
+        self.clock.now += 0.5
+        delays = [self.limiter.reserve() for i in range(6)]
+        self.assertEqual(delays[:5], [0.0] * 5)
+        self.assertAlmostEqual(delays[5], 0.1)
+
+    def test_update_from_headers(self):
+        self.limiter.update({'x-rate-limit-limit': '100',
+            'x-rate-limit-interval': '2s'})
+        self.assertEqual(self.limiter.get_rate(), 50.0)
+        self.limiter.update({'x-rate-limit-limit': 'foo',
+            'x-rate-limit-interval': '2s'})
+        self.limiter.update({})
+        self.assertEqual(self.limiter.get_rate(), 50.0)
+
+    def test_parse_interval(self):
+        self.assertEqual(RateLimiter.parse_interval('1s'), 1.0)
+        self.assertEqual(RateLimiter.parse_interval('500ms'), 0.5)
+        self.assertEqual(RateLimiter.parse_interval('1m'), 60.0)
+        self.assertEqual(RateLimiter.parse_interval('3'), 3.0)
+        self.assertRaises(ValueError, RateLimiter.parse_interval, 'soon')
+
+    def test_in_flight_follows_latency(self):
+        start = self.limiter.acquire()
+        self.clock.now += 0.25
+        self.limiter.release(start)
+        # 10 requests per second with a latency of 250 ms
+        self.assertEqual(self.limiter.get_max_in_flight(), 3)
+        self.limiter.update({'x-rate-limit-limit': '40',
+            'x-rate-limit-interval': '1s'})
+        self.assertEqual(self.limiter.get_max_in_flight(), 11)
+
+    def test_acquire_async_waits_for_slot(self):
+        start = self.limiter.acquire()
+        self.clock.now += 0.25
+        self.limiter.release(start)
+        self.assertEqual(self.limiter.get_max_in_flight(), 3)
+
+        async def run():
+            starts = [await self.limiter.acquire_async() for i in range(3)]
+            waiting = asyncio.ensure_future(self.limiter.acquire_async())
+            await asyncio.sleep(0.05)
+            # all slots are taken until a request is released
+            self.assertFalse(waiting.done())
+            self.limiter.release(starts[0])
+            await asyncio.wait_for(waiting, 1.0)
+            self.assertEqual(self.limiter.in_flight, 3)
+        asyncio.run(run())
+
+    def test_acquire_async_cancelled(self):
+        start = self.limiter.acquire()
+        self.clock.now += 0.1
+        self.limiter.release(start)
+        self.assertEqual(self.limiter.get_max_in_flight(), 2)
+
+        async def run():
+            starts = [await self.limiter.acquire_async() for i in range(2)]
+            waiting = [asyncio.ensure_future(self.limiter.acquire_async())
+                    for i in range(3)]
+            await asyncio.sleep(0)
+            self.assertEqual(len(self.limiter.waiters), 3)
+            waiting[0].cancel()
+            await asyncio.sleep(0)
+            self.assertEqual(len(self.limiter.waiters), 2)
+            # the slot handed to a cancelled waiter is passed on
+            self.clock.now += 0.1
+            self.limiter.release(starts[0])
+            waiting[1].cancel()
+            await asyncio.wait_for(waiting[2], 1.0)
+            self.assertTrue(waiting[1].cancelled())
+            self.assertEqual(self.limiter.in_flight, 2)
+        asyncio.run(run())
+
+    def test_throttle(self):
+        self.limiter.throttle()
+        self.assertAlmostEqual(self.limiter.reserve(), 1.1)
+        self.assertEqual(self.limiter.get_stats()['throttled'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
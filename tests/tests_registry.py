@@ -0,0 +1,53 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from lib.registry import Registry
+from lib.api import API
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry(['apa', 'apa-fr', 'bibtex', 'ieee', '',
+            'harvard1'])
+
+    def test_membership(self):
+        self.assertIn('apa', self.registry)
+        self.assertNotIn('', self.registry)
+        self.assertNotIn('ap', self.registry)
+        self.assertEqual(len(self.registry), 5)
+
+    def test_get_by_prefix(self):
+        self.assertEqual(self.registry.get_by_prefix('apa'),
+                ['apa', 'apa-fr'])
+        self.assertEqual(self.registry.get_by_prefix('x'), [])
+
+    def test_suggest(self):
+        self.assertEqual(self.registry.suggest('ap'), ['apa', 'apa-fr'])
+        self.assertEqual(self.registry.suggest('bibtx'), ['bibtex'])
+
+    def test_load_uses_snapshot(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'styles.txt')
+            with open(path, 'w') as f:
+                f.write("apa\nbibtex\n")
+            self.assertIn('apa', Registry.load(path))
+            self.assertIs(Registry.load(path), Registry.load(path))
+            self.assertTrue(os.path.isfile(Registry.get_snapshot_path(path)))
+
+            # the snapshot is preferred as long as it is up to date
+            Registry(['ieee']).save_snapshot(path)
+            Registry.invalidate(path)
+            self.assertEqual(Registry.load(path).get_values(), ['ieee'])
+        finally:
+            Registry.invalidate(path)
+            shutil.rmtree(directory)
+
+    def test_api_styles(self):
+        styles = API().get_valid_styles()
+        self.assertIn('bibtex', styles)
+        self.assertNotIn('', styles)
+
+if __name__ == "__main__":
+    unittest.main()
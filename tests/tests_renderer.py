@@ -0,0 +1,49 @@
+import unittest
+import json
+
+from lib.renderer import Renderer
+
+class TestRenderer(unittest.TestCase):
+    def setUp(self):
+        self.work = json.loads("""{"issued":{"date-parts":[[1989]]},"score":1.0,"author":[{"family":"Holyoke","given":"T. C."},{"family":"Hawkings","given":"Stephen"}],"container-title":["The Antioch Review"],"page":"363","issue":"3","title":["A Brief History of Time: From the Big Bang to Black Holes"],"type":"journal-article","DOI":"10.2307\\/4612083","ISSN":["0003-5769"],"URL":"http:\\/\\/dx.doi.org\\/10.2307\\/4612083","publisher":"JSTOR","volume":"47"}""")
+        self.renderer = Renderer()
+
+    def test_supported_styles(self):
+        self.assertTrue(self.renderer.supports('bibtex'))
+        self.assertFalse(self.renderer.supports('chicago-author-date'))
+        self.assertRaises(ValueError, self.renderer.render, self.work,
+                'chicago-author-date')
+
+    def test_render_bibtex(self):
+        self.assertEqual(self.renderer.render(self.work, 'bibtex'),
+                "@article{Holyoke_1989, title={A Brief History of Time: From \
+the Big Bang to Black Holes}, volume={47}, ISSN={0003-5769}, \
+url={http://dx.doi.org/10.2307/4612083}, DOI={10.2307/4612083}, number={3}, \
+journal={The Antioch Review}, publisher={JSTOR}, author={Holyoke, T. C. and \
+Hawkings, Stephen}, year={1989}, pages={363}}")
+
+    def test_render_apa(self):
+        self.assertEqual(self.renderer.render(self.work, 'apa'),
+                "Holyoke, T. C., & Hawkings, S. (1989). A Brief History of \
+Time: From the Big Bang to Black Holes. The Antioch Review, 47(3), 363. \
+doi:10.2307/4612083")
+
+    def test_render_ieee(self):
+        self.assertEqual(self.renderer.render(self.work, 'ieee'),
+                "[1]T. C. Holyoke and S. Hawkings, “A Brief History of Time: \
+From the Big Bang to Black Holes,” The Antioch Review, vol. 47, no. 3, p. 363, \
+1989.")
+
+    def test_render_harvard1(self):
+        self.assertEqual(self.renderer.render(self.work, 'harvard1'),
+                "Holyoke, T.C. & Hawkings, S., 1989. A Brief History of Time: \
+From the Big Bang to Black Holes. The Antioch Review, 47(3), p.363.")
+
+    def test_render_without_metadata(self):
+        work = {'URL': 'http://dx.doi.org/10.1000/1', 'type': 'other'}
+        self.assertEqual(self.renderer.render(work, 'bibtex'),
+                "@misc{Unknown_Unknown, title={Unknown title}, \
+url={http://dx.doi.org/10.1000/1}, DOI={10.1000/1}}")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,70 @@
 import unittest
+import urllib.parse
 
 from lib.search.request import Request
 from lib.doi import DOI
+from lib.search.result import SearchResult
+from lib.index import WorkIndex
+
+class PagedRequest(Request):
+    """
+    Request replacement which serves five pages of two results each.
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def _request(self, url, headers=None, method="GET", json_message=True):
+        self.urls.append(url)
+        cursor = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)\
+                ['cursor'][0]
+        page = 0 if cursor == '*' else int(cursor)
+        items = []
+        if page < 5:
+            items = [{'URL': 'http://dx.doi.org/10.1000/{:d}'.format(
+                2 * page + i)} for i in range(2)]
+        return {'items': items, 'next-cursor': str(page + 1)}
+
+class BatchRequest(Request):
+    """
+    Request replacement which answers `doi` filter queries.
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def _request(self, url, headers=None, method="GET", json_message=True):
+        self.urls.append(url)
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        items = []
+        for f in query['filter'][0].split(','):
+            key, doi = f.split(':', 1)
+            items.append({'DOI': doi.upper(),
+                'URL': 'http://dx.doi.org/{}'.format(doi),
+                'link': [{'URL': 'http://example.com/{}.pdf'.format(doi),
+                    'content-version': 'vor'}],
+                'license': [{'URL': 'http://example.com/license',
+                    'content-version': 'vor'}]})
+        return {'items': items}
+
+class FacetRequest(Request):
+    """
+    Request replacement which answers facet queries with fixed counts.
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def _request(self, url, headers=None, method="GET", json_message=True):
+        self.urls.append(url)
+        return {'total-results': 6, 'items': [], 'facets': {
+            'published': {'value-count': 3, 'values': {'2015': 1, '2013': 3,
+                '2014': 2}},
+            'type-name': {'value-count': 2, 'values': {'Book': 2,
+                'Journal Article': 4}}}}
 
 class TestRequest(unittest.TestCase):
     def setUp(self):
@@ -90,3 +153,96 @@ class TestRequest(unittest.TestCase):
         valid_doi_identifier = "10.1063/1.3458497"
         self.assertEqual(self.req.prepare_citation_query(valid_doi_identifier),
                 "10.1063/1.3458497/transform")
+
+    def test_search_all_follows_cursor(self):
+        req = PagedRequest()
+        results = req.search_all(req.prepare_search_query("query", rows=2))
+        self.assertEqual([r.get_doi().get_identifier() for r in results],
+                ["10.1000/{:d}".format(i) for i in range(10)])
+        self.assertEqual(len(req.urls), 6)
+        self.assertIn('cursor=%2A', req.urls[0])
+
+    def test_search_all_is_lazy_and_limited(self):
+        req = PagedRequest()
+        results = req.search_all(req.prepare_search_query("query", rows=2),
+                max_results=3)
+        self.assertEqual(len(req.urls), 0)
+        self.assertEqual(len(list(results)), 3)
+        self.assertEqual(len(req.urls), 2)
+
+    def test_prepare_search_query_select(self):
+        select = SearchResult.get_api_fields(['doi', 'score', 'year',
+            'title', 'url'])
+        self.assertEqual(select, ['URL', 'issued', 'score', 'title'])
+        query = self.req.prepare_search_query("foo", select=select)
+        self.assertEqual(urllib.parse.parse_qs(query)['select'],
+                ['URL,issued,score,title'])
+        self.assertTrue(self.req.is_projected(query))
+        self.assertFalse(self.req.is_projected(
+            self.req.prepare_search_query("foo")))
+        self.assertRaises(ValueError, self.req.prepare_search_query, "foo",
+                select=['URL', 'foo'])
+        self.assertRaises(ValueError, SearchResult.get_api_fields, ['foo'])
+
+    def test_search_indexes_projected_results(self):
+        class Index(WorkIndex):
+            def __init__(self):
+                self.works = []
+            def add_works(self, works, complete=True):
+                self.works.extend((work, complete) for work in works)
+        req = PagedRequest()
+        req.index = Index()
+        query = req.prepare_search_query("foo", rows=2)
+        req.search(req.get_cursor_query(query, '*'))
+        self.assertEqual([complete for _, complete in req.index.works],
+                [True, True])
+        # results without the fields of the index are not indexed
+        req.search(req.get_cursor_query(req.prepare_search_query("foo",
+            rows=2, select=['URL']), '*'))
+        self.assertEqual(len(req.index.works), 2)
+        req.search(req.get_cursor_query(req.prepare_search_query("foo",
+            rows=2, select=list(WorkIndex.FIELDS)), '*'))
+        self.assertEqual([complete for _, complete in req.index.works[2:]],
+                [False, False])
+
+    def test_get_works_in_batches(self):
+        req = BatchRequest()
+        identifiers = ["10.1000/{:d}".format(i) for i in range(5)]
+        works = req.get_works(identifiers + ["10.1000/0"], batch_size=2)
+        self.assertEqual(sorted(works.keys()), identifiers)
+        self.assertEqual(len(req.urls), 3)
+        self.assertIn('rows=2', req.urls[0])
+
+    def test_get_download_links_batch(self):
+        req = BatchRequest()
+        links = req.get_download_links_batch(["10.1000/A", "10.1000/b"])
+        self.assertEqual(len(req.urls), 1)
+        self.assertEqual(links['10.1000/a'][0].get_url(),
+                'http://example.com/10.1000/A.pdf')
+        self.assertEqual(links['10.1000/b'][0].get_license_url(),
+                'http://example.com/license')
+
+    def test_prepare_facet_query(self):
+        query = urllib.parse.parse_qs(self.req.prepare_facet_query("foo",
+            ['year', 'publisher'], year=2013))
+        self.assertEqual(query['rows'], ['0'])
+        self.assertEqual(query['facet'], ['published:*,publisher-name:*'])
+        self.assertEqual(query['filter'], ['from-pub-date:2013'])
+        query = urllib.parse.parse_qs(self.req.prepare_facet_query("foo",
+            ['type'], limit=10))
+        self.assertEqual(query['facet'], ['type-name:10'])
+        self.assertRaises(ValueError, self.req.prepare_facet_query, "foo",
+                ['year', 'foo'])
+        self.assertRaises(ValueError, self.req.prepare_facet_query, "foo", [])
+        self.assertRaises(ValueError, self.req.prepare_facet_query, "foo",
+                ['year'], limit=0)
+
+    def test_search_facets(self):
+        req = FacetRequest()
+        counts = req.search_facets(req.prepare_facet_query("foo", ['year',
+            'type']))
+        self.assertEqual(len(req.urls), 1)
+        # years are ordered by value, other facets by count
+        self.assertEqual(counts['year'], [('2013', 3), ('2014', 2),
+            ('2015', 1)])
+        self.assertEqual(counts['type'], [('Journal Article', 4), ('Book', 2)])
@@ -0,0 +1,167 @@
+import unittest
+import json
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lib.retry import RetryPolicy, CircuitBreaker, TransientError
+from lib.transport import Transport
+from lib.search.request import Request
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    responses = []
+
+    def do_GET(self):
+        status = self.responses.pop(0) if len(self.responses) > 0 else 200
+        body = json.dumps({'message': {'status': status}}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(threshold=3, pause=10.0,
+                clock=self.clock, sleep=self.clock.sleep)
+        self.policy = RetryPolicy(max_attempts=3, base_delay=1.0,
+                max_delay=5.0, breaker=self.breaker, sleep=self.clock.sleep,
+                random=lambda: 1.0)
+
+    def _failing(self, failures, result='ok'):
+        calls = []
+        def func():
+            calls.append(None)
+            if len(calls) <= failures:
+                raise TransientError("The server responded with code 503.")
+            return result
+        return func, calls
+
+    def test_retry_until_success(self):
+        func, calls = self._failing(2)
+        self.assertEqual(self.policy.call(func), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.clock.sleeps, [1.0, 2.0])
+        stats = self.policy.get_stats()
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['backoff'], 3.0)
+
+    def test_give_up(self):
+        func, calls = self._failing(5)
+        self.assertRaises(TransientError, self.policy.call, func)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.policy.get_stats()['given_up'], 1)
+
+    def test_other_errors_are_not_retried(self):
+        def func():
+            raise RuntimeError("The server responded with code 404")
+        self.assertRaises(RuntimeError, self.policy.call, func)
+        self.assertEqual(self.policy.get_stats()['retries'], 0)
+
+    def test_delay(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0,
+                random=lambda: 0.5)
+        self.assertEqual(policy.get_delay(1), 0.5)
+        self.assertEqual(policy.get_delay(3), 2.0)
+        self.assertEqual(policy.get_delay(10), 2.5)
+        self.assertEqual(policy.get_delay(1, retry_after=3), 3.0)
+        self.assertEqual(policy.get_delay(1, retry_after=60), 5.0)
+
+    def test_circuit_breaker(self):
+        for i in range(3):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.get_state(), CircuitBreaker.STATE_OPEN)
+        self.breaker.wait()
+        self.assertEqual(self.clock.sleeps, [10.0])
+        self.assertEqual(self.breaker.get_state(),
+                CircuitBreaker.STATE_HALF_OPEN)
+
+        # a failed probe opens the circuit again
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.get_state(), CircuitBreaker.STATE_OPEN)
+        self.breaker.wait()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.get_state(),
+                CircuitBreaker.STATE_CLOSED)
+        self.assertEqual(self.breaker.get_stats()['trips'], 2)
+
+    def test_probe_with_other_error(self):
+        for i in range(3):
+            self.breaker.record_failure()
+        def func():
+            raise RuntimeError("The server responded with code 404")
+        self.assertRaises(RuntimeError, self.policy.call, func)
+        # the probe did not show that the API is back
+        self.assertEqual(self.breaker.get_state(), CircuitBreaker.STATE_OPEN)
+        self.assertEqual(self.policy.call(lambda: 1), 1)
+        self.assertEqual(self.breaker.get_state(),
+                CircuitBreaker.STATE_CLOSED)
+
+    def test_cancelled_async_probe(self):
+        for i in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 10.0
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        async def ok():
+            return 1
+
+        async def run():
+            with self.assertRaises(asyncio.CancelledError):
+                await self.policy.call_async(cancelled)
+            self.assertEqual(self.breaker.get_state(),
+                    CircuitBreaker.STATE_OPEN)
+            self.clock.now += 10.0
+            return await self.policy.call_async(ok)
+        self.assertEqual(asyncio.run(run()), 1)
+
+class TestRequestRetries(unittest.TestCase):
+    def setUp(self):
+        FlakyHandler.responses = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:{:d}/works".format(
+                self.server.server_port)
+        Transport.configure(cache=None)
+        self.policy = RetryPolicy.configure(max_attempts=3,
+                sleep=lambda seconds: None)
+
+    def tearDown(self):
+        Transport._instance = None
+        RetryPolicy._instance = None
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retry_server_errors(self):
+        FlakyHandler.responses = [503, 500]
+        self.assertEqual(Request()._request(self.url), {'status': 200})
+        self.assertEqual(self.policy.get_stats()['retries'], 2)
+
+    def test_client_errors_are_not_retried(self):
+        FlakyHandler.responses = [404]
+        self.assertRaises(RuntimeError, Request()._request, self.url)
+        self.assertEqual(self.policy.get_stats()['retries'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
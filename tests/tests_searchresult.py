@@ -1,7 +1,7 @@
 import unittest
 import json
 
-from lib.search.result import SearchResult
+from lib.search.result import SearchResult, SearchResultPage
 
 class TestResponse(unittest.TestCase):
     def setUp(self):
@@ -57,3 +57,34 @@ Non-parametrically In Dwarf Spheroidals: An Application To Draco")
         j['author'] = []
         res.parse_json(j)
         self.assertEqual(res.get_authors(), res.UNKNOWN_AUTHORS)
+
+    def test_title_and_authors_are_formatted_lazily(self):
+        res = SearchResult(json.loads(self.search_result_json_huge_title)\
+                .get('message'))
+        self.assertIsNone(res._title)
+        self.assertIsNone(res._authors)
+        self.assertEqual(res.title, res.get_title())
+        self.assertEqual(res.get_authors(), 'Jardel, John R.; Gebhardt, \
+Karl; Fabricius, Maximilian H. et al.')
+        self.assertFalse(hasattr(res, '__dict__'))
+
+    def test_parse_json_with_invalid_authors(self):
+        res = SearchResult()
+        j = json.loads(self.search_result_json).get('message')
+        j['author'] = [{'family': 'Fabricius'}]
+        res.parse_json(j)
+        self.assertEqual(res.get_authors(), res.UNKNOWN_AUTHORS)
+
+    def test_result_page(self):
+        message = json.loads(self.search_result_json).get('message')
+        huge = json.loads(self.search_result_json_huge_title).get('message')
+        page = SearchResultPage.from_message({'items': [message, huge],
+            'total-results': 2, 'next-cursor': 'abc'})
+        self.assertEqual(len(page), 2)
+        self.assertEqual(page.get_total_results(), 2)
+        self.assertEqual(page.get_next_cursor(), 'abc')
+        self.assertEqual([str(res) for res in page], ['10.1063/1.3458497',
+            '10.1088/0004-637x/763/2/91'])
+        self.assertEqual(page[1].get_title(), SearchResult(huge).get_title())
+        self.assertEqual(page[0].get_year(), SearchResult(message).get_year())
+        self.assertEqual(len(SearchResultPage()), 0)
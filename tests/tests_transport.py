@@ -0,0 +1,64 @@
+import unittest
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lib.transport import Transport
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/file')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = b'{"message": {}}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:{:d}".format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_instance_is_shared(self):
+        self.assertIs(Transport.get_instance(), Transport.get_instance())
+
+    def test_request_reuses_connection(self):
+        t = Transport(cache=None)
+        for _ in range(3):
+            resp, content = t.request(self.url + "/works")
+            self.assertEqual(resp.status, 200)
+        stats = t.get_stats()
+        self.assertEqual(stats['pool_size'], 1)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['connections_reused'], 2)
+
+    def test_open_follows_redirect_and_reuses_connection(self):
+        t = Transport(cache=None)
+        with t.open(self.url + "/redirect") as response:
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.read(), b'{"message": {}}')
+        stats = t.get_stats()
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['connections_reused'], 1)
+        self.assertEqual(stats['idle_connections'], 1)
+
+if __name__ == "__main__":
+    unittest.main()